@@ -0,0 +1,69 @@
+#!/bin/python3
+"""
+Creating many shapes with :mod:`inkscape_scripting.bulk` against calling SimpInkScr's functions in a loop.
+
+For each count, the same circles (with a per-shape fill) and rectangles are created in an empty document,
+inside :class:`inkscape_scripting.daemon.OfflineExtensionRun`, and the time of the creation alone
+and of the whole run (including saving the document) is reported.
+
+Usage::
+
+	python benchmarks/bench_bulk_shapes.py [--counts 1000 10000 100000] [--repeat N]
+
+Requires inkex, SimpInkScr and NumPy to be importable.
+"""
+from __future__	import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import numpy as np
+
+from inkscape_scripting import bulk, daemon
+from bench_roundtrip import synthetic_svg
+
+def _loop(centers: np.ndarray, fills: list[str])->None:
+	from simpinkscr import circle, rect  # type: ignore
+	for (x, y), fill in zip(centers.tolist(), fills):
+		circle((x, y), 0.4, fill=fill)
+		rect((x, y), (x+0.5, y+0.5), fill="#00ff00")
+
+def _bulk(centers: np.ndarray, fills: list[str])->None:
+	bulk.circles(centers, 0.4, fill=fills)
+	bulk.rects(centers, centers+0.5, fill="#00ff00")
+
+def _measure(create: Callable[[np.ndarray, list[str]], None], count: int, document: bytes)->tuple[float, float]:
+	"""
+	Return the durations of the creation and of the whole run.
+	"""
+	centers=np.stack([np.arange(count)%1000, np.arange(count)//1000], axis=1).astype(float)
+	fills=["#ff0000" if i%2 else "#0000ff" for i in range(count)]
+	start=time.perf_counter()
+	with daemon.OfflineExtensionRun(input=document):
+		create_start=time.perf_counter()
+		create(centers, fills)
+		create_end=time.perf_counter()
+	return create_end-create_start, time.perf_counter()-start
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+	parser.add_argument("--repeat", type=int, default=3)
+	args=parser.parse_args()
+
+	daemon.warm_up()
+	document=synthetic_svg(0)
+	print(f"{'count':>8} {'method':<6}{'create ms':>12}{'run ms':>10}{'us/shape':>10}")
+	for count in args.counts:
+		for name, create in [("loop", _loop), ("bulk", _bulk)]:
+			create_time, run_time=min(_measure(create, count, document) for _ in range(args.repeat))
+			print(f"{count:>8} {name:<6}{create_time*1000:>12.1f}{run_time*1000:>10.1f}{create_time/(2*count)*1e6:>10.2f}")
+
+if __name__=="__main__":
+	main()
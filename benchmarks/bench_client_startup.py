@@ -0,0 +1,93 @@
+#!/bin/python3
+"""
+Startup budget of the Inkscape-side client (``inkscape_scripting/client.py``).
+
+Inkscape starts a new client process for every run, so its import time is part of the latency of every cell.
+This runs ``python -X importtime -c "import inkscape_scripting.client"`` a few times,
+prints the slowest modules of the best run, and exits with status 1 if the cumulative import time
+of ``inkscape_scripting.client`` exceeds the budget, or if it imports any of the forbidden modules
+(which used to dominate the startup time).
+
+Usage::
+
+	python benchmarks/bench_client_startup.py [--budget-ms 15] [--repeat N]
+
+Does not require inkex or SimpInkScr.
+"""
+from __future__	import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+_root=Path(__file__).resolve().parent.parent
+
+forbidden_modules=["multiprocessing", "pickle", "typing", "tempfile", "pathlib", "socket", "zlib", "inkex", "lxml"]
+"""
+Modules that the client must not import at startup. (``zlib`` is only imported when the daemon sends compressed data.)
+"""
+
+_line_pattern=re.compile(r"import time:\s*(\d+) \|\s*(\d+) \|( *)(\S+)")
+
+def _import_times()->list[tuple[str, int, int, int]]:
+	"""
+	Return ``(module, self_us, cumulative_us, depth)`` for each module imported by the client,
+	in the order of ``-X importtime`` output.
+	"""
+	process=subprocess.run(
+			[sys.executable, "-X", "importtime", "-c", "import inkscape_scripting.client"],
+			env={**os.environ, "PYTHONPATH": str(_root)},
+			stderr=subprocess.PIPE, check=True, universal_newlines=True)
+	result=[]
+	for line in process.stderr.splitlines():
+		match=_line_pattern.match(line)
+		if match:
+			self_us, cumulative_us, indent, module=match.groups()
+			result.append((module, int(self_us), int(cumulative_us), len(indent)//2))
+	return result
+
+def _client_subtree(times: list[tuple[str, int, int, int]])->list[tuple[str, int, int, int]]:
+	"""
+	The modules imported (directly or indirectly) because of ``inkscape_scripting.client``.
+	Children are printed before their parent, so walk backwards from the client's line.
+	"""
+	index=next(i for i, (module, *_rest) in enumerate(times) if module=="inkscape_scripting.client")
+	result=[times[index]]
+	for entry in reversed(times[:index]):
+		if entry[3]==0: break
+		result.append(entry)
+	return result
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--budget-ms", type=float, default=15)
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--top", type=int, default=10)
+	args=parser.parse_args()
+
+	best=min(
+			(_client_subtree(_import_times()) for _ in range(args.repeat)),
+			key=lambda subtree: subtree[0][2])
+	total_ms=best[0][2]/1000
+
+	print(f"{'module':<40}{'self ms':>10}{'cumul ms':>10}")
+	for module, self_us, cumulative_us, _depth in sorted(best, key=lambda entry: -entry[1])[:args.top]:
+		print(f"{module:<40}{self_us/1000:>10.2f}{cumulative_us/1000:>10.2f}")
+	print(f"import inkscape_scripting.client: {total_ms:.2f}ms (budget {args.budget_ms:g}ms)")
+
+	failed=False
+	imported={module for module, *_rest in best}
+	for module in forbidden_modules:
+		if module in imported:
+			print(f"FAIL: the client imports {module}")
+			failed=True
+	if total_ms>args.budget_ms:
+		print("FAIL: over budget")
+		failed=True
+	sys.exit(1 if failed else 0)
+
+if __name__=="__main__":
+	main()
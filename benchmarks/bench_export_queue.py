@@ -0,0 +1,102 @@
+#!/bin/python3
+"""
+Benchmark of :class:`inkscape_scripting.shell.ExportQueue` against sending one export per shell command
+on a single ``inkscape --shell`` process.
+
+By default, a fake ``inkscape`` executable that speaks the shell prompt protocol is used, which sleeps
+``--startup-delay`` seconds at startup, ``--command-delay`` seconds per command and ``--export-delay`` seconds per export,
+so that it runs without Inkscape. Pass ``--inkscape inkscape`` to measure the real one.
+
+Usage::
+
+	python benchmarks/bench_export_queue.py [--exports N] [--processes 1 2 4] [--inkscape PATH]
+"""
+from __future__	import annotations
+
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inkscape_scripting.shell import ExportQueue, InkscapeShell
+
+_fake_inkscape_source='''#!{python}
+import os, sys, time
+time.sleep(float(os.environ["FAKE_INKSCAPE_STARTUP_DELAY"]))
+out=sys.stdout
+out.write("Inkscape interactive shell mode. Type 'action-list' to list all actions. Type 'quit' to quit.\\n")
+out.write(" Input of the form:\\n action1:arg1; action2:arg2; ...\\n> ")
+out.flush()
+document=None
+options={{}}
+for line in sys.stdin:
+	time.sleep(float(os.environ["FAKE_INKSCAPE_COMMAND_DELAY"]))
+	for action in line.strip().split(";"):
+		name, _, argument=action.strip().partition(":")
+		if name=="quit": sys.exit(0)
+		elif name=="file-open": document=argument if os.path.exists(argument) else None
+		elif name=="file-close": document=None
+		elif name.startswith("export-") and name!="export-do": options[name]=argument
+		elif name=="export-do":
+			time.sleep(float(os.environ["FAKE_INKSCAPE_EXPORT_DELAY"]))
+			if document is None: print("No document to export", file=sys.stderr)
+			else:
+				with open(options["export-filename"], "w") as f:
+					f.write(repr(sorted(options.items())))
+	out.write("\\n> ")
+	out.flush()
+'''
+
+def _make_fake_inkscape(directory: Path)->Path:
+	path=directory/"inkscape"
+	path.write_text(_fake_inkscape_source.format(python=sys.executable))
+	path.chmod(path.stat().st_mode|stat.S_IXUSR)
+	return path
+
+def _sequential(executable: str, document: Path, output_dir: Path, count: int)->float:
+	start=time.perf_counter()
+	shell=InkscapeShell(active_window=False, executable=executable).__enter__()
+	try:
+		shell.send_command(f"file-open:{document}")
+		for i in range(count):
+			shell.send_command(f"export-id:rect{i}; export-id-only:true; export-filename:{output_dir/f'seq{i}.png'}; export-do")
+	finally:
+		shell._stop_shell()
+	return time.perf_counter()-start
+
+def _queue(executable: str, document: Path, output_dir: Path, count: int, processes: int)->str:
+	with ExportQueue(processes=processes, executable=executable) as queue:
+		for i in range(count):
+			queue.export(document, output_dir/f"queue{processes}-{i}.png", id=f"rect{i}", id_only=True)
+		report=queue.wait()
+	return str(report)
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--exports", type=int, default=200)
+	parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+	parser.add_argument("--inkscape", help="the Inkscape executable (default: a fake one)")
+	parser.add_argument("--startup-delay", type=float, default=1.)
+	parser.add_argument("--command-delay", type=float, default=0.02)
+	parser.add_argument("--export-delay", type=float, default=0.01)
+	args=parser.parse_args()
+	os.environ["FAKE_INKSCAPE_STARTUP_DELAY"]=str(args.startup_delay)
+	os.environ["FAKE_INKSCAPE_COMMAND_DELAY"]=str(args.command_delay)
+	os.environ["FAKE_INKSCAPE_EXPORT_DELAY"]=str(args.export_delay)
+	with tempfile.TemporaryDirectory() as directory:
+		executable=args.inkscape or str(_make_fake_inkscape(Path(directory)))
+		document=Path(directory)/"drawing.svg"
+		document.write_text('<svg xmlns="http://www.w3.org/2000/svg">'
+				+"".join(f'<rect id="rect{i}" x="{i}" width="1" height="1"/>' for i in range(args.exports))+"</svg>")
+		duration=_sequential(executable, document, Path(directory), args.exports)
+		print(f"{'one export per command':<28}{args.exports} exports in {duration:.1f} s: {args.exports/duration:.1f} exports/s")
+		for processes in args.processes:
+			print(f"{f'queue, {processes} processes':<28}{_queue(executable, document, Path(directory), args.exports, processes)}")
+
+if __name__=="__main__":
+	main()
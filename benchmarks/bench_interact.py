@@ -0,0 +1,95 @@
+#!/bin/python3
+"""
+Benchmark of the window automation in :mod:`inkscape_scripting.interact_xdotool`,
+using a fake ``xdotool`` executable so that it runs without a display.
+
+The fake executable logs each invocation, so the number of spawned processes per action is reported as well.
+
+Usage::
+
+	python benchmarks/bench_interact.py [--iterations N]
+"""
+from __future__	import annotations
+
+import argparse
+import os
+import stat
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from inkscape_scripting import interact_xdotool
+
+_fake_xdotool_source='''#!{python}
+import os, sys
+with open(os.environ["FAKE_XDOTOOL_LOG"], "a") as f:
+	f.write(" ".join(sys.argv[1:])+"\\n")
+windows={{"^Inkscape Scripting$": "101", " - Inkscape$": "102"}}
+valid={{"100", "101", "102"}}
+args=sys.argv[1:]
+i=0
+while i<len(args):
+	command=args[i]
+	if command=="search":
+		print(windows[args[i+2]])
+		i+=3
+	elif command=="getwindowfocus":
+		print("100")
+		i+=1
+	elif command=="windowfocus":
+		if args[i+1] not in valid and args[i+1]!="%1": sys.exit(1)
+		i+=2
+	elif command in ("key", "keyup"):
+		i+=1
+		while i<len(args) and args[i] not in ("windowfocus", "key", "keyup"): i+=1
+	else:
+		sys.exit(1)
+'''
+
+def _make_fake_xdotool(directory: Path)->Path:
+	path=directory/"xdotool"
+	path.write_text(_fake_xdotool_source.format(python=sys.executable))
+	path.chmod(path.stat().st_mode|stat.S_IXUSR)
+	return path
+
+def _count_spawns(log: Path)->int:
+	if not log.exists(): return 0
+	return len(log.read_text().splitlines())
+
+def _measure(name: str, log: Path, iterations: int, action, before=lambda: None)->None:
+	log.unlink(missing_ok=True)
+	latencies=[]
+	for _ in range(iterations):
+		before()
+		start=time.perf_counter()
+		action()
+		latencies.append(time.perf_counter()-start)
+	latencies.sort()
+	print(f"{name:<40} spawns/action={_count_spawns(log)/iterations:5.2f} "
+			f"p50={latencies[len(latencies)//2]*1000:7.2f}ms "
+			f"p95={latencies[int(len(latencies)*0.95)]*1000:7.2f}ms")
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--iterations", type=int, default=50)
+	args=parser.parse_args()
+	with tempfile.TemporaryDirectory() as directory:
+		log=Path(directory)/"log"
+		os.environ["FAKE_XDOTOOL_LOG"]=str(log)
+		interact_xdotool.xdotool_executable=str(_make_fake_xdotool(Path(directory)))
+		_measure("click (cold window id cache)", log, args.iterations,
+				interact_xdotool.click_extension_window_button, interact_xdotool.clear_window_id_cache)
+		_measure("click (warm window id cache)", log, args.iterations,
+				interact_xdotool.click_extension_window_button)
+		def make_stale()->None:
+			interact_xdotool._window_id_cache["^Inkscape Scripting$"]=999
+		_measure("click (stale window id)", log, args.iterations,
+				interact_xdotool.click_extension_window_button, make_stale)
+		_measure("press keys (warm window id cache)", log, args.iterations,
+				lambda: interact_xdotool._inkscape_press_keys_raw(["Ctrl+z", "Ctrl+z"]))
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,74 @@
+#!/bin/python3
+"""
+Micro-benchmark of the conversion of elements to SimpInkScr statements in :mod:`inkscape_scripting.object_repr`.
+
+It compares, on a synthetic document:
+
+* resolving the converter of each element by scanning the type table (what the ``isinstance`` chain did)
+  against the per-class cache,
+* converting the elements one at a time with the shared converter (as the IPython formatter does)
+  against :func:`object_repr.convert_objects`.
+
+Usage::
+
+	python benchmarks/bench_object_repr.py [--elements N] [--repeat N]
+
+Requires inkex and SimpInkScr to be importable.
+"""
+from __future__	import annotations
+
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import inkex  # type: ignore
+
+from inkscape_scripting import object_repr
+from bench_roundtrip import synthetic_svg
+
+def _best_of(repeat: int, f: Callable[[], object])->float:
+	best=float("inf")
+	for _ in range(repeat):
+		start=time.perf_counter()
+		f()
+		best=min(best, time.perf_counter()-start)
+	return best
+
+def _scan_table(nodes: list)->None:
+	for node in nodes:
+		next((convert for base, convert in object_repr._converter_table if isinstance(node, base)), None)
+
+def _cached_lookup(nodes: list)->None:
+	for node in nodes:
+		object_repr._converter_for_type(type(node))
+
+def _one_at_a_time(nodes: list)->None:
+	for node in nodes:
+		[str(stmt) for stmt in object_repr._repr_inkscape_object(node).code]
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--elements", type=int, default=10000)
+	parser.add_argument("--repeat", type=int, default=5)
+	args=parser.parse_args()
+
+	svg_root=inkex.load_svg(io.BytesIO(synthetic_svg(args.elements))).getroot()
+	nodes=list(svg_root[-1])
+	for name, f in [
+			("converter lookup: table scan", lambda: _scan_table(nodes)),
+			("converter lookup: per-class cache", lambda: _cached_lookup(nodes)),
+			("convert: one at a time", lambda: _one_at_a_time(nodes)),
+			("convert: convert_objects(sort=False)", lambda: object_repr.convert_objects(nodes, sort=False)),
+			("convert: convert_objects()", lambda: object_repr.convert_objects(nodes)),
+			]:
+		duration=_best_of(args.repeat, f)
+		print(f"{name:<40}{duration*1000:>10.1f}ms {duration/len(nodes)*1e6:>8.2f}us/element")
+
+if __name__=="__main__":
+	main()
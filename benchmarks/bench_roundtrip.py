@@ -0,0 +1,231 @@
+#!/bin/python3
+"""
+Headless benchmark of the full client/daemon round-trip, without Inkscape or an X session.
+
+A stand-in driver plays the role of Inkscape: it writes a synthetic SVG document, and "clicking" the extension
+window button launches ``inkscape_scripting/client.py`` with the same kind of argv as Inkscape would,
+capturing its stdout (which, if nonempty, becomes the input document of the next run).
+The client connects to a temporary socket, so that a running daemon is not disturbed.
+
+Each case is measured with a cold and with a warm :class:`inkscape_scripting.daemon.DocumentCache`:
+Inkscape serializes the document by itself before each run, so the output of a run that changed the document
+usually comes back with other bytes and the next run parses it again ("cold": the cache is emptied before each run).
+"warm" is the best case, where the input of each run is byte for byte the output of the previous one
+(as when the previous run did not change the document), so the parsed document is always reused.
+
+Each document size and cell type is run several times through :class:`inkscape_scripting.daemon.ExtensionRun`,
+and the latency (with the per-phase breakdown from :mod:`inkscape_scripting.timing`) and throughput are reported.
+
+Usage::
+
+	python benchmarks/bench_roundtrip.py --sizes 100 1000 10000 --output results.json
+	python benchmarks/bench_roundtrip.py --document-cache cold  # only measure the runs that parse the document
+	python benchmarks/bench_roundtrip.py --compare results.json  # report regressions against a previous result
+
+Requires inkex and SimpInkScr to be importable, same as the daemon.
+"""
+from __future__	import annotations
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+_root=Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root))
+
+from inkscape_scripting import constants, daemon, timing
+
+def synthetic_svg(num_elements: int)->bytes:
+	"""
+	Return an Inkscape-like SVG document with *num_elements* shapes in a layer.
+	"""
+	parts=[
+		'<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+		'<svg width="1000mm" height="1000mm" viewBox="0 0 1000 1000" version="1.1" id="svg1"\n'
+		'   xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"\n'
+		'   xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd"\n'
+		'   xmlns="http://www.w3.org/2000/svg" xmlns:svg="http://www.w3.org/2000/svg">\n'
+		'  <sodipodi:namedview id="namedview1" pagecolor="#ffffff" inkscape:document-units="mm" />\n'
+		'  <defs id="defs1" />\n'
+		'  <g inkscape:label="Layer 1" inkscape:groupmode="layer" id="layer1">\n'
+		]
+	for i in range(num_elements):
+		x, y=i%1000, (i//1000)%1000
+		kind=i%3
+		if kind==0:
+			parts.append(f'    <circle style="fill:#ff0000" id="circle{i}" cx="{x}" cy="{y}" r="0.4" />\n')
+		elif kind==1:
+			parts.append(f'    <rect style="fill:#00ff00" id="rect{i}" x="{x}" y="{y}" width="0.5" height="0.5" />\n')
+		else:
+			parts.append(f'    <path style="fill:none;stroke:#0000ff" id="path{i}" d="M {x},{y} L {x+0.5},{y+0.5}" />\n')
+	parts.append('  </g>\n</svg>\n')
+	return "".join(parts).encode("u8")
+
+def _cell_noop(run: daemon.ExtensionRun)->None:
+	pass
+
+def _cell_small_edit(run: daemon.ExtensionRun)->None:
+	layer=run.svg_root[-1]
+	element=layer[len(layer)//2]
+	element.set("style", "fill:#123456" if element.get("style")!="fill:#123456" else "fill:#654321")
+
+def _cell_add_shapes(run: daemon.ExtensionRun)->None:
+	from simpinkscr import circle  # type: ignore
+	for i in range(100):
+		circle((i, i), 1)
+
+def _cell_read_all(run: daemon.ExtensionRun)->None:
+	sum(1 for _ in run.svg_root.iter())
+
+def _cell_pretty_print(run: daemon.ExtensionRun)->None:
+	import io
+	from IPython.lib.pretty import PrettyPrinter
+	from inkscape_scripting import object_repr
+	with io.StringIO() as f:
+		p=PrettyPrinter(f)
+		object_repr.format_element_base(run.svg_root, p, False)
+		p.flush()
+
+cell_types: dict[str, Callable[[daemon.ExtensionRun], None]]={
+	"noop": _cell_noop,
+	"small_edit": _cell_small_edit,
+	"add_shapes": _cell_add_shapes,
+	"read_all": _cell_read_all,
+	"pretty_print": _cell_pretty_print,
+	}
+
+class FakeInkscape:
+	"""
+	Plays the role of Inkscape: :meth:`click` starts the client on the current document,
+	and :meth:`finish` collects its output.
+	"""
+	def __init__(self, directory: Path, document: bytes)->None:
+		self.input_file=directory/"ink_ext_XXXXXX.svg"
+		self.input_file.write_bytes(document)
+		self.process: Optional[subprocess.Popen]=None
+		self.output_size=0
+
+	def click(self)->None:
+		assert self.process is None
+		env=dict(os.environ, PYTHONPATH=str(_root))
+		self.process=subprocess.Popen(
+				[sys.executable, str(_root/"inkscape_scripting"/"client.py"), str(self.input_file)],
+				stdout=subprocess.PIPE, env=env)
+
+	def finish(self)->None:
+		if self.process is None: return  # the run failed before clicking
+		output, _=self.process.communicate()
+		returncode=self.process.returncode
+		self.process=None
+		if returncode!=0: raise RuntimeError(f"Client exited with code {returncode}")
+		self.output_size=len(output)
+		if output:
+			self.input_file.write_bytes(output)
+
+def _percentile(sorted_values: list[float], p: float)->float:
+	return sorted_values[min(len(sorted_values)-1, int(len(sorted_values)*p))]
+
+document_cache_modes=["cold", "warm"]
+
+def run_benchmark(num_elements: int, cell_type: str, repeat: int, document_cache: str="cold")->dict[str, Any]:
+	document=synthetic_svg(num_elements)
+	latencies: list[float]=[]
+	timing.enabled=True
+	timing.reset()
+	cache=daemon.current_session().document_cache
+	cache.invalidate()
+	hits=cache.hits
+	with tempfile.TemporaryDirectory() as directory:
+		# use a separate socket, so that this does not interfere with a running daemon
+		address=str(Path(directory)/"socket")
+		os.environ["INKSCAPE_SCRIPTING_SOCKET"]=address
+		os.environ.pop("INKSCAPE_SCRIPTING_SESSION", None)
+		constants.default_connection_address=constants.connection_address=address
+		inkscape=FakeInkscape(Path(directory), document)
+		daemon.click_extension_window_button=inkscape.click
+		cell=cell_types[cell_type]
+		for _ in range(repeat):
+			if document_cache=="cold": cache.invalidate()
+			start=time.perf_counter()
+			try:
+				with daemon.ExtensionRun() as run:
+					cell(run)
+			finally:
+				inkscape.finish()
+			latencies.append(time.perf_counter()-start)
+			timing.finish_cell()
+		listener=daemon._listener_sockets.pop(address, None)
+		if listener is not None: listener.close()
+	latencies.sort()
+	phases={
+			name: _percentile(sorted(durations), .5)
+			for name, durations in timing._durations.items()
+			}
+	timing.enabled=False
+	return {
+			"num_elements": num_elements,
+			"cell_type": cell_type,
+			"document_cache": document_cache,
+			"document_cache_hits": cache.hits-hits,
+			"document_bytes": len(document),
+			"p50": _percentile(latencies, .5),
+			"p95": _percentile(latencies, .95),
+			"throughput_mb_per_s": len(document)/_percentile(latencies, .5)/1e6,
+			"phases_p50": phases,
+			}
+
+def _key(result: dict[str, Any])->tuple:
+	return result["num_elements"], result["cell_type"], result.get("document_cache", "warm")
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+	parser.add_argument("--cells", nargs="+", default=list(cell_types), choices=list(cell_types))
+	parser.add_argument("--repeat", type=int, default=5)
+	parser.add_argument("--document-cache", nargs="+", default=document_cache_modes, choices=document_cache_modes)
+	parser.add_argument("--output", type=Path, help="store the results as JSON to this file")
+	parser.add_argument("--compare", type=Path, help="compare against results stored by --output")
+	parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown that counts as a regression")
+	args=parser.parse_args()
+
+	results=[]
+	print(f"{'elements':>9} {'cell':<12}{'cache':<6}{'p50 ms':>10}{'p95 ms':>10}{'MB/s':>8}  slowest phases")
+	for num_elements in args.sizes:
+		for cell_type in args.cells:
+			for document_cache in args.document_cache:
+				result=run_benchmark(num_elements, cell_type, args.repeat, document_cache)
+				results.append(result)
+				slowest=sorted(result["phases_p50"].items(), key=lambda item: -item[1])[:3]
+				print(f"{num_elements:>9} {cell_type:<12}{document_cache:<6}{result['p50']*1000:>10.1f}{result['p95']*1000:>10.1f}"
+						f"{result['throughput_mb_per_s']:>8.1f}  "
+						+", ".join(f"{name}={duration*1000:.1f}ms" for name, duration in slowest))
+
+	if args.output is not None:
+		args.output.write_text(json.dumps({
+			"python": sys.version,
+			"platform": platform.platform(),
+			"results": results,
+			}, indent=1))
+
+	if args.compare is not None:
+		previous={_key(result): result for result in json.loads(args.compare.read_text())["results"]}
+		regressions=0
+		for result in results:
+			old=previous.get(_key(result))
+			if old is None: continue
+			ratio=result["p50"]/old["p50"]
+			if ratio>1+args.tolerance:
+				regressions+=1
+				print(f"regression: {result['num_elements']} {result['cell_type']} {result['document_cache']}: "
+						f"{old['p50']*1000:.1f}ms -> {result['p50']*1000:.1f}ms ({ratio:.2f}x)")
+		if regressions: sys.exit(1)
+
+if __name__=="__main__":
+	main()
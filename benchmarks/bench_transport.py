@@ -0,0 +1,91 @@
+#!/bin/python3
+"""
+Throughput of each payload transport mode of :mod:`inkscape_scripting.transport`.
+
+For each document size and mode, a real client process (``inkscape_scripting/client.py``) is started,
+the document is sent to it the same way the daemon does, and the time until the client
+has written the whole document to its stdout (a pipe, as in Inkscape) is measured.
+
+Usage::
+
+	python benchmarks/bench_transport.py [--sizes-mb 1 10 50] [--repeat N]
+
+Does not require inkex or SimpInkScr.
+"""
+from __future__	import annotations
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+_root=Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root))
+
+from inkscape_scripting import framing, transport
+
+def _document(size: int)->bytes:
+	line=b'    <circle style="fill:#ff0000" id="circle%d" cx="%d" cy="%d" r="0.4" />\n'
+	parts=[]
+	total=0
+	i=0
+	while total<size:
+		parts.append(line%(i, i%1000, i//1000))
+		total+=len(parts[-1])
+		i+=1
+	return b"".join(parts)[:size]
+
+def _round_trip(listener: socket.socket, data: bytes, mode: str)->float:
+	"""
+	Return the time from starting to encode the document until the client finished writing it.
+	"""
+	client=subprocess.Popen(
+			[sys.executable, str(_root/"inkscape_scripting"/"client.py"), "input.svg"],
+			stdout=subprocess.PIPE)
+	s, _=listener.accept()
+	with s:
+		framing.recv_frame(s)
+		framing.send_frame(s)
+		start=time.perf_counter()
+		transport.mode=mode
+		framing.send_frame(s, *framing.encode_message(transport.encode(data)))
+	assert client.stdout is not None
+	received=0
+	while True:
+		chunk=client.stdout.read(1<<20)
+		if not chunk: break
+		received+=len(chunk)
+	duration=time.perf_counter()-start
+	client.wait()
+	assert received==len(data), (received, len(data))
+	return duration
+
+def main()->None:
+	parser=argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 10, 50])
+	parser.add_argument("--modes", nargs="+", default=["socket", "zlib", "file"])
+	parser.add_argument("--repeat", type=int, default=3)
+	args=parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as directory:
+		# use a separate socket, so that this does not interfere with a running daemon
+		address=str(Path(directory)/"socket")
+		os.environ["INKSCAPE_SCRIPTING_SOCKET"]=address
+		os.environ["PYTHONPATH"]=str(_root)
+		listener=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		listener.bind(address)
+		listener.listen()
+		print(f"{'size MB':>8} {'mode':<8}{'best ms':>10}{'MB/s':>10}")
+		for size_mb in args.sizes_mb:
+			data=_document(int(size_mb*1e6))
+			for mode in args.modes:
+				best=min(_round_trip(listener, data, mode) for _ in range(args.repeat))
+				print(f"{size_mb:>8g} {mode:<8}{best*1000:>10.1f}{len(data)/best/1e6:>10.1f}")
+		listener.close()
+
+if __name__=="__main__":
+	main()
@@ -0,0 +1,186 @@
+"""
+Run a script over many SVG files without Inkscape, in parallel.
+
+The script is executed like a cell in the IPython daemon: the names of ``from simpinkscr import *``,
+``svg_root``, ``guides``, ``user_args``, ``canvas``, ``metadata``, ``svg_index`` and the units ``mm``, ``cm`` etc. are defined,
+and the changes to the document are saved. See :class:`.daemon.OfflineExtensionRun`.
+
+Usage::
+
+	inkscape_scripting_batch script.py drawings/ -o output/ -j 8
+
+or from Python::
+
+	from inkscape_scripting.batch import run_batch, output_dir_jobs
+	results=run_batch(Path("script.py").read_text(), output_dir_jobs(paths, "output/"))
+
+Each worker process imports inkex and SimpInkScr and compiles the script once, then processes its share of the files.
+An error in one file does not stop the others; it is reported in its :class:`BatchResult`.
+"""
+from __future__	import annotations
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Iterable, Optional
+
+@dataclass
+class BatchResult:
+	input: str
+	output: str
+	error: Optional[str]=None
+	"""
+	The formatted traceback if the script failed on this file.
+	"""
+	duration: float=0.
+
+_worker_code: Optional[CodeType]=None
+_worker_extension_args: list[str]=[]
+
+def _init_worker(script: str, filename: str, extension_args: list[str])->None:
+	global _worker_code, _worker_extension_args
+	from . import daemon
+	daemon.warm_up()
+	_worker_code=compile(script, filename, "exec")
+	_worker_extension_args=extension_args
+
+def script_namespace(run: Any)->dict[str, Any]:
+	"""
+	Return a namespace to execute code in like a cell of the daemon, for the extension run *run*
+	(the names of ``from simpinkscr import *``, the units and the document names).
+	"""
+	from . import daemon
+	namespace: dict[str, Any]={"__name__": "__main__"}
+	exec("from simpinkscr import *", namespace)
+	namespace.update(daemon.unit_values(run.svg_root))
+	namespace.update(run_names(run))
+	return namespace
+
+def run_names(run: Any)->dict[str, Any]:
+	"""
+	Return the names that refer to the document of *run*, such as ``svg_root``.
+	"""
+	return dict(svg_root=run.svg_root, guides=run.guides, user_args=run.user_args, canvas=run.canvas, metadata=run.metadata,
+			svg_index=run.index)
+
+def update_run(run: Any, namespace: dict[str, Any])->None:
+	"""
+	Take the document names that the code may have reassigned in *namespace* back to *run*,
+	same as ``ipython._post_run_cell``.
+	"""
+	run.svg_root =namespace["svg_root"]
+	run.guides   =namespace["guides"]
+	run.user_args=namespace["user_args"]
+	run.canvas   =namespace["canvas"]
+	run.metadata =namespace["metadata"]
+
+def run_script(code: CodeType|str, input: Any, output: Optional[Any], extension_args: Optional[list[str]]=None)->Optional[bytes]:
+	"""
+	Run *code* on one document. *input* and *output* are as in :class:`.daemon.OfflineExtensionRun`.
+	Return the output document.
+	"""
+	from . import daemon
+	with daemon.OfflineExtensionRun(input=input, output=output, extension_args=list(extension_args or [])) as run:
+		namespace=script_namespace(run)
+		exec(code, namespace)
+		update_run(run, namespace)
+	return run.output_data
+
+def _run_job(job: tuple[str, str])->BatchResult:
+	input, output=job
+	start_time=time.perf_counter()
+	error: Optional[str]=None
+	try:
+		Path(output).parent.mkdir(parents=True, exist_ok=True)
+		assert _worker_code is not None, "the worker is not initialized"
+		run_script(_worker_code, input, output, _worker_extension_args)
+	except Exception:
+		error=traceback.format_exc()
+	return BatchResult(input, output, error, time.perf_counter()-start_time)
+
+def output_dir_jobs(inputs: Iterable[str|Path], output_dir: str|Path)->list[tuple[str, str]]:
+	"""
+	Return the jobs that write the result of each input file to *output_dir*, keeping the file names.
+	A directory in *inputs* stands for the SVG files in it (recursively), whose relative paths are kept.
+	"""
+	jobs=[]
+	for input in map(Path, inputs):
+		if input.is_dir():
+			for path in sorted(input.rglob("*.svg")):
+				jobs.append((str(path), str(Path(output_dir)/path.relative_to(input))))
+		else:
+			jobs.append((str(input), str(Path(output_dir)/input.name)))
+	return jobs
+
+def in_place_jobs(inputs: Iterable[str|Path])->list[tuple[str, str]]:
+	return [(input, input) for input, _ in output_dir_jobs(inputs, ".")]
+
+def run_batch(script: str, jobs: list[tuple[str, str]], processes: Optional[int]=None,
+		progress: Optional[Callable[[BatchResult, int, int], None]]=None,
+		extension_args: Optional[list[str]]=None, filename: str="<script>")->list[BatchResult]:
+	"""
+	Run *script* (source code) on each ``(input, output)`` path pair in *jobs*, with *processes* worker processes
+	(default: the number of CPUs). *progress* is called in this process after each file
+	with the result, the number of files done and the total.
+
+	The results are in the order they finish.
+	"""
+	processes=processes or os.cpu_count() or 1
+	compile(script, filename, "exec")  # report syntax errors before starting the workers
+	# where the workers are forked, they inherit the imported modules
+	from . import daemon
+	# large enough to keep the overhead small, small enough to balance the load
+	chunksize=max(1, min(64, len(jobs)//(processes*8)))
+	results: list[BatchResult]=[]
+	with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(script, filename, list(extension_args or []))) as pool:
+		for result in pool.imap_unordered(_run_job, jobs, chunksize=chunksize):
+			results.append(result)
+			if progress is not None: progress(result, len(results), len(jobs))
+	return results
+
+class _ProgressPrinter:
+	def __init__(self)->None:
+		self.start_time=time.perf_counter()
+		self.failed=0
+
+	def __call__(self, result: BatchResult, done: int, total: int)->None:
+		if result.error is not None:
+			self.failed+=1
+			sys.stderr.write(f"\r\x1b[KFailed: {result.input}\n{result.error}")
+		elapsed=time.perf_counter()-self.start_time
+		rate=done/elapsed if elapsed>0 else 0.
+		eta=(total-done)/rate if rate>0 else 0.
+		sys.stderr.write(f"\r\x1b[K{done}/{total} files, {self.failed} failed, {rate:.1f} files/s, ETA {eta:.0f}s")
+		if done==total: sys.stderr.write("\n")
+		sys.stderr.flush()
+
+def main()->None:
+	parser=argparse.ArgumentParser(description="Run an Inkscape scripting script over many SVG files without Inkscape.")
+	parser.add_argument("script", type=Path, help="the script to run, as in a cell of the daemon")
+	parser.add_argument("inputs", nargs="+", help="SVG files, or directories of them")
+	output_group=parser.add_mutually_exclusive_group(required=True)
+	output_group.add_argument("-o", "--output-dir", help="write the results here, keeping the file names")
+	output_group.add_argument("--in-place", action="store_true", help="overwrite the input files")
+	parser.add_argument("-j", "--processes", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+	parser.add_argument("--extension-arg", action="append", default=[], help="argument passed to the extension, may be repeated")
+	parser.add_argument("-q", "--quiet", action="store_true", help="do not show the progress")
+	args=parser.parse_args()
+
+	jobs=in_place_jobs(args.inputs) if args.in_place else output_dir_jobs(args.inputs, args.output_dir)
+	if not jobs: parser.error("no input files")
+	progress=None if args.quiet else _ProgressPrinter()
+	results=run_batch(args.script.read_text(), jobs, args.processes, progress, args.extension_arg, str(args.script))
+	failed=[result for result in results if result.error is not None]
+	if args.quiet:
+		for result in failed:
+			sys.stderr.write(f"Failed: {result.input}\n{result.error}")
+	sys.exit(1 if failed else 0)
+
+if __name__=="__main__":
+	main()
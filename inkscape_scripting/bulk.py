@@ -0,0 +1,194 @@
+"""
+Create many shapes at once from NumPy arrays, much faster than calling SimpInkScr's ``circle()`` etc. in a loop.
+
+Usage (the names are in the IPython namespace)::
+
+	import numpy as np
+	xy=np.random.rand(100000, 2)*100*mm
+	dots=circles(xy, 0.2*mm, fill=np.where(xy[:, 0]>50*mm, "red", "blue"), stroke="none")
+	len(dots), dots[0], dots.group
+
+The markup of all the shapes is generated at once and parsed by lxml (with inkex's parser, so the elements are inkex objects),
+and the result is a :class:`ShapeArray`, which refers to the elements without creating a Python object for each of them.
+
+Keyword arguments are style properties, written as in SimpInkScr (``stroke_width`` is ``stroke-width``):
+each is either one value for all the shapes, or a sequence with one value per shape.
+Unlike SimpInkScr, no default style is added.
+
+The shapes are added to *parent* (default: the current layer), inside a new group unless ``group=False``.
+"""
+from __future__	import annotations
+
+from functools import partial
+from typing import Any, Iterator, Optional
+from xml.sax.saxutils import escape
+
+_attribute_entities={'"': "&quot;"}
+
+class ShapeArray:
+	"""
+	The shapes created by one call of :func:`circles` etc., in order.
+
+	:attr:`group` is the group that contains them, or None if they were added to the parent directly
+	(then the other elements must not be inserted between them).
+	:attr:`data` maps the name of each geometry argument to its array, with one row per shape.
+	"""
+	def __init__(self, first: Any, count: int, group: Any, data: dict[str, Any])->None:
+		self._first=first
+		self._count=count
+		self.group=group
+		self.data=data
+
+	def __len__(self)->int:
+		return self._count
+
+	def __iter__(self)->Iterator:
+		element=self._first
+		for _ in range(self._count):
+			yield element
+			element=element.getnext()
+
+	def __getitem__(self, i: int)->Any:
+		if i<0: i+=self._count
+		if not 0<=i<self._count: raise IndexError(i)
+		if self.group is not None: return self.group[i]
+		element=self._first
+		for _ in range(i):
+			element=element.getnext()
+		return element
+
+	def __repr__(self)->str:
+		return f"<ShapeArray of {self._count} {'' if self._first is None else self._first.TAG}>"
+
+	def elements(self)->list:
+		return list(self)
+
+	def remove(self)->None:
+		"""
+		Remove the shapes (and their group) from the document.
+		"""
+		if self.group is not None:
+			self.group.getparent().remove(self.group)
+		else:
+			for element in self.elements():
+				element.getparent().remove(element)
+		self._count=0
+
+def _default_parent()->Any:
+	from simpinkscr import simple_inkscape_scripting  # type: ignore
+	simple_top=simple_inkscape_scripting._simple_top
+	if simple_top is None: raise RuntimeError("The extension is not running")
+	return simple_top.svg_root.get_current_layer()
+
+def _format_column(values: Any)->list[str]:
+	"""
+	Format each value of the 1-dimensional array *values* as an attribute value.
+	"""
+	if values.dtype.kind in "iuf":
+		return list(map(repr, values.tolist()))
+	return [escape(str(value), _attribute_entities) for value in values.tolist()]
+
+def _create(tag: str, columns: dict[str, Any], data: dict[str, Any], style: dict[str, Any],
+		parent: Any, group: bool, id_prefix: Optional[str])->ShapeArray:
+	"""
+	Create one element *tag* for each row of the attribute *columns* (1-dimensional arrays of the same length).
+	"""
+	import inkex  # type: ignore
+	import numpy as np
+	count=len(next(iter(columns.values())))
+	template_parts=[f"<{tag}"]
+	varying: list[list[str]]=[]
+	def add_varying(name: str, values: list[str])->None:
+		template_parts.append(f' {name}="%s"')
+		varying.append(values)
+	if id_prefix is not None:
+		prefix=escape(id_prefix, _attribute_entities)
+		add_varying("id", [f"{prefix}{i}" for i in range(count)])
+	for name, values in columns.items():
+		add_varying(name, _format_column(values))
+
+	constant_style: list[str]=[]
+	varying_style: list[list[str]]=[]
+	varying_style_names: list[str]=[]
+	for name, value in style.items():
+		name=name.replace("_", "-")
+		if isinstance(value, str) or np.ndim(value)==0:
+			constant_style.append(f"{name}:{escape(str(value), _attribute_entities)}")
+		else:
+			column=np.asarray(value)
+			if column.shape!=(count,): raise ValueError(f"{name} has shape {column.shape}, expected ({count},)")
+			varying_style.append(_format_column(column))
+			varying_style_names.append(name)
+	if constant_style or varying_style:
+		style_template=";".join([part.replace("%", "%%") for part in constant_style]+[f"{name}:%s" for name in varying_style_names])
+		template_parts.append(f' style="{style_template}"')
+		varying.extend(varying_style)
+	template_parts.append("/>")
+	template="".join(template_parts)
+
+	body="".join(template%row for row in zip(*varying))
+	# the namespace must be declared on the group itself: otherwise lxml takes quadratic time to move it to the document
+	wrapper=inkex.load_svg(f'<g xmlns="http://www.w3.org/2000/svg">{body}</g>').getroot()
+
+	if parent is None: parent=_default_parent()
+	if hasattr(parent, "get_inkex_object"): parent=parent.get_inkex_object()  # a SimpInkScr object
+	# inkex 1.4+ overrides append() to update its id registry, going through every new element in Python;
+	# the shapes have neither ids nor style elements unless id_prefix is given, so use lxml's directly
+	from lxml import etree
+	append=parent.append if id_prefix is not None else partial(etree._Element.append, parent)
+	first=wrapper[0] if count else None
+	if group:
+		append(wrapper)
+		return ShapeArray(first, count, wrapper, data)
+	for element in list(wrapper):
+		append(element)
+	return ShapeArray(first, count, None, data)
+
+def _points(points: Any)->Any:
+	import numpy as np
+	result=np.asarray(points, dtype=float)
+	if result.ndim!=2 or result.shape[1]!=2: raise ValueError(f"expected an array of shape (n, 2), got {result.shape}")
+	return result
+
+def circles(centers: Any, radii: Any, parent: Any=None, group: bool=True, id_prefix: Optional[str]=None, **style)->ShapeArray:
+	"""
+	Create circles. *centers* has shape ``(n, 2)``, *radii* is a number or has shape ``(n,)``.
+	"""
+	import numpy as np
+	centers=_points(centers)
+	radii=np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+	return _create("circle", {"cx": centers[:, 0], "cy": centers[:, 1], "r": radii},
+			{"centers": centers, "radii": radii}, style, parent, group, id_prefix)
+
+def ellipses(centers: Any, radii: Any, parent: Any=None, group: bool=True, id_prefix: Optional[str]=None, **style)->ShapeArray:
+	"""
+	Create ellipses. *centers* has shape ``(n, 2)``, *radii* (the ``rx, ry`` pairs) has shape ``(2,)`` or ``(n, 2)``.
+	"""
+	import numpy as np
+	centers=_points(centers)
+	radii=np.broadcast_to(np.asarray(radii, dtype=float), centers.shape)
+	return _create("ellipse", {"cx": centers[:, 0], "cy": centers[:, 1], "rx": radii[:, 0], "ry": radii[:, 1]},
+			{"centers": centers, "radii": radii}, style, parent, group, id_prefix)
+
+def rects(corners1: Any, corners2: Any, parent: Any=None, group: bool=True, id_prefix: Optional[str]=None, **style)->ShapeArray:
+	"""
+	Create rectangles with opposite corners *corners1* and *corners2* (as SimpInkScr's ``rect(pt1, pt2)``),
+	each of shape ``(n, 2)``, or ``(2,)`` for all the rectangles.
+	"""
+	import numpy as np
+	corners1, corners2=np.broadcast_arrays(np.asarray(corners1, dtype=float), np.asarray(corners2, dtype=float))
+	corners1, corners2=_points(corners1), _points(corners2)
+	low=np.minimum(corners1, corners2)
+	size=np.abs(corners2-corners1)
+	return _create("rect", {"x": low[:, 0], "y": low[:, 1], "width": size[:, 0], "height": size[:, 1]},
+			{"corners1": corners1, "corners2": corners2}, style, parent, group, id_prefix)
+
+def lines(starts: Any, ends: Any, parent: Any=None, group: bool=True, id_prefix: Optional[str]=None, **style)->ShapeArray:
+	"""
+	Create line segments from *starts* to *ends*, each of shape ``(n, 2)``, or ``(2,)`` for all the segments.
+	"""
+	import numpy as np
+	starts, ends=np.broadcast_arrays(np.asarray(starts, dtype=float), np.asarray(ends, dtype=float))
+	starts, ends=_points(starts), _points(ends)
+	return _create("line", {"x1": starts[:, 0], "y1": starts[:, 1], "x2": ends[:, 0], "y2": ends[:, 1]},
+			{"starts": starts, "ends": ends}, style, parent, group, id_prefix)
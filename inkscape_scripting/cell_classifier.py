@@ -0,0 +1,202 @@
+"""
+Decides whether an IPython cell may touch the Inkscape document, so that cells that don't
+can be executed locally without running the extension.
+
+The classification is conservative: when in doubt, the cell is considered to need the document.
+
+The decision can be overridden by a marker comment on its own line anywhere in the cell:
+``# inkscape: local`` or ``# inkscape: document``.
+"""
+from __future__	import annotations
+
+import ast
+import collections.abc
+import functools
+import sys
+import sysconfig
+import types
+from typing import Any, Iterable, Optional
+
+document_names: frozenset[str]=frozenset({"svg_root", "guides", "user_args", "canvas", "metadata", "svg_index"})
+"""
+Names in the IPython namespace that are set by the extension run.
+"""
+
+document_modules: tuple[str, ...]=("simpinkscr", "inkex", "inkscape_scripting", "lxml")
+"""
+Objects that come from these modules (or submodules) may touch the document.
+"""
+
+unsafe_builtins: frozenset[str]=frozenset({
+	"eval", "exec", "compile", "globals", "locals", "vars", "__import__", "get_ipython", "breakpoint", "__builtins__",
+	})
+"""
+Builtins that can access arbitrary names, so we cannot tell what the cell does.
+"""
+
+safe_modules: set[str]={"numpy"}
+"""
+Top-level names of the modules (besides the standard library) whose functions and objects do not touch the document.
+The objects of other modules, e.g. a helper module of the user that calls ``circle()``, are considered to need it.
+"""
+
+local_magics: set[str]=set()
+"""
+Names of magics that do not touch the document, such as ``%inkstats``.
+"""
+
+_safe_value_types=(int, float, complex, str, bytes, bool, type(None), range)
+
+_unsafe_modules: frozenset[str]=frozenset({"builtins", "sys", "importlib", "gc"})
+"""
+Modules that give access to arbitrary objects (e.g. ``builtins.eval``, ``sys.modules``).
+"""
+
+local_marker="# inkscape: local"
+document_marker="# inkscape: document"
+
+def _in_document_modules(module_name: Optional[str])->bool:
+	if module_name is None: return False
+	return any(module_name==m or module_name.startswith(m+".") for m in document_modules)
+
+@functools.lru_cache(maxsize=None)
+def _in_standard_library(top_level_name: str)->bool:
+	if top_level_name in sys.builtin_module_names: return True
+	stdlib_module_names=getattr(sys, "stdlib_module_names", None)  # Python 3.10+
+	if stdlib_module_names is not None: return top_level_name in stdlib_module_names
+	import importlib.util
+	try:
+		spec=importlib.util.find_spec(top_level_name)
+	except (ImportError, ValueError):
+		return False
+	origin=getattr(spec, "origin", None)
+	if origin is None: return False
+	stdlib=sysconfig.get_paths()["stdlib"]
+	return origin.startswith(stdlib) and "site-packages" not in origin[len(stdlib):]
+
+def _in_safe_modules(module_name: Optional[str])->bool:
+	"""
+	Return whether *module_name* is in the standard library or in :data:`safe_modules`.
+	"""
+	if module_name is None or _in_document_modules(module_name): return False
+	top_level_name=module_name.partition(".")[0]
+	return top_level_name in safe_modules or _in_standard_library(top_level_name)
+
+def _is_safe_value(value: Any)->bool:
+	"""
+	Return True if using *value* provably does not touch the document.
+	"""
+	if isinstance(value, _safe_value_types):
+		return True
+	if isinstance(value, types.ModuleType):
+		return value.__name__ not in _unsafe_modules and _in_safe_modules(value.__name__)
+	if isinstance(value, functools.partial):
+		return (_is_safe_value(value.func) and all(map(_is_safe_value, value.args))
+				and all(map(_is_safe_value, value.keywords.values())))
+	if isinstance(value, types.MethodType):
+		return _is_safe_value(value.__self__) and _is_safe_value(value.__func__)
+	if isinstance(value, types.BuiltinMethodType) and not isinstance(value.__self__, (types.ModuleType, type(None))):
+		# a method of an object implemented in C, such as the append of an lxml element
+		return _is_safe_value(value.__self__)
+	if isinstance(value, (type, types.FunctionType, types.BuiltinFunctionType)):
+		# functions defined in previous cells or in other modules may do anything
+		return _in_safe_modules(getattr(value, "__module__", None))
+	value_type=type(value)
+	if value_type.__module__=="builtins":
+		# containers, e.g. a list of SimpleObject
+		return False
+	if isinstance(value, (collections.abc.Collection, collections.abc.Iterator)):
+		# containers whose elements we cannot check, e.g. a deque of SimpleObject
+		return value_type.__module__=="numpy" and getattr(getattr(value, "dtype", None), "kind", "O")!="O"
+	return _in_safe_modules(value_type.__module__)
+
+def _marker(raw_cell: str)->Optional[bool]:
+	for line in raw_cell.splitlines():
+		line=line.strip()
+		if line==local_marker: return False
+		if line==document_marker: return True
+	return None
+
+def _local_magic_calls(tree: ast.AST)->set[int]:
+	"""
+	Return the ids of the ``get_ipython`` name nodes in ``get_ipython().run_line_magic(name, ...)``
+	(which is what IPython transforms magics into) where *name* is in :data:`local_magics`.
+	"""
+	result: set[int]=set()
+	for node in ast.walk(tree):
+		if (
+				isinstance(node, ast.Call) and
+				isinstance(node.func, ast.Attribute) and
+				node.func.attr in ("run_line_magic", "run_cell_magic") and
+				isinstance(node.func.value, ast.Call) and
+				isinstance(node.func.value.func, ast.Name) and
+				node.func.value.func.id=="get_ipython" and
+				node.args and
+				isinstance(node.args[0], ast.Constant) and
+				node.args[0].value in local_magics
+				):
+			result.add(id(node.func.value.func))
+	return result
+
+def calls_local_magic(source: str)->bool:
+	"""
+	Return whether the cell *source* (after IPython's transformation) calls a magic in :data:`local_magics`.
+	"""
+	try:
+		return bool(_local_magic_calls(ast.parse(source)))
+	except SyntaxError:
+		return False
+
+def cell_needs_document(raw_cell: str, user_ns: dict, source: Optional[str]=None,
+		extra_document_names: Iterable[str]=())->bool:
+	"""
+	Return whether the cell may touch the document.
+
+	*source* is the cell after IPython's transformation (magics etc.); defaults to *raw_cell*.
+
+	Examples::
+
+		>>> cell_needs_document("print(1+1)", {})
+		False
+		>>> cell_needs_document("import numpy as np\\nnp.zeros(3)", {})
+		False
+		>>> cell_needs_document("svg_root", {})
+		True
+		>>> cell_needs_document("shapes.append(1)", {"shapes": []})
+		True
+		>>> cell_needs_document("# inkscape: local\\nshapes.append(1)", {"shapes": []})
+		False
+	"""
+	marker=_marker(raw_cell)
+	if marker is not None:
+		return marker
+	try:
+		tree=ast.parse(raw_cell if source is None else source)
+	except SyntaxError:
+		return False  # the cell will not be executed anyway
+
+	unsafe_names=document_names|set(extra_document_names)
+	local_magic_calls=_local_magic_calls(tree)
+	for node in ast.walk(tree):
+		if isinstance(node, ast.Name):
+			if id(node) in local_magic_calls: continue
+			name=node.id
+		elif isinstance(node, (ast.Global, ast.Nonlocal)):
+			if unsafe_names.intersection(node.names): return True
+			continue
+		elif isinstance(node, (ast.Import, ast.ImportFrom)):
+			module_names=[alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module]
+			if isinstance(node, ast.ImportFrom) and node.level>0: return True
+			if not all(_in_safe_modules(m) for m in module_names): return True
+			if isinstance(node, ast.ImportFrom) and any(alias.name=="*" for alias in node.names): return True
+			continue
+		else:
+			continue
+
+		if name in unsafe_names or name in unsafe_builtins:
+			return True
+		if name in user_ns and not _is_safe_value(user_ns[name]):
+			# even if the cell assigns to the name, it may use the old value before that
+			return True
+		# otherwise it is defined in the cell, a builtin, or undefined (and a NameError will be raised)
+	return False
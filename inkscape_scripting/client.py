@@ -3,46 +3,49 @@
 Handles the client half that is related to the Inkscape extension.
 This part does not execute any code (it must not even import inkex in order to save time).
 Its only role is to send the code over to the daemon.
+
+Inkscape starts a new process for every run, so the import time of this module is part of the latency of every cell.
+Only import what is strictly needed -- see ``benchmarks/bench_client_startup.py``.
 """
 #import time
 #start_time=time.time()
 
 import sys
 import os
-from multiprocessing.connection import Listener
-from pathlib import Path
-import threading
+# the socket module imports enum and selectors, which costs more than everything else here together
+import _socket
 
-from inkscape_scripting.constants import connection_address, connection_family
+from inkscape_scripting.constants import connection_address, connect_timeout
+from inkscape_scripting.framing import send_frame, recv_frame, encode_argv, decode_message
+from inkscape_scripting.transport import write
 
-def _timeout_error()->None:
-	sys.stderr.write(
-			'Cannot accept connection from server!\n'
-			'Note that you must not click "Apply" button manually.\n')
+def _error(message: str)->None:
+	sys.stderr.write(message)
 	sys.stderr.flush()  # mostly redundant
-	os._exit(1)  # need this to kill all threads
-
-def _connect(retries: int)->None:
-	if retries==2:
-		raise RuntimeError("Retried too many times unsuccessfully")
-	timer=threading.Timer(1, _timeout_error)
-	timer.start()
-	try:
-		with Listener(address=connection_address, family=connection_family) as listener:
-			with listener.accept() as conn:
-				timer.cancel()
-				conn.send(sys.argv)
-				data=conn.recv()
-				sys.stdout.buffer.write(data)
-				return
-	except OSError:
-		Path(connection_address).unlink()
-	timer.cancel()
-	_connect(retries=retries+1)
-
+	os._exit(1)
 
 def main()->None:
-	_connect(retries=0)
+	sock=_socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+	try:
+		try:
+			sock.connect(connection_address)
+		except OSError:
+			_error(
+					'Cannot connect to the daemon!\n'
+					'Note that you must not click "Apply" button manually.\n')
+		send_frame(sock, encode_argv(sys.argv))
+		# the daemon sends an empty frame as soon as it accepts the connection
+		sock.settimeout(connect_timeout)
+		try:
+			recv_frame(sock)
+		except (_socket.timeout, EOFError, OSError):
+			_error(
+					'Cannot accept connection from server!\n'
+					'Note that you must not click "Apply" button manually.\n')
+		sock.settimeout(None)
+		write(decode_message(recv_frame(sock)), sys.stdout.buffer)
+	finally:
+		sock.close()
 
 if __name__=="__main__":
 	main()
@@ -1,5 +1,35 @@
-import tempfile
-from pathlib import Path
+import os
 
-connection_address=str(Path(tempfile.gettempdir())/".inkscape_scripting_plugin_socket")
+def _temporary_directory()->str:
+	"""
+	Same as ``tempfile.gettempdir()`` on Unix, without importing :mod:`tempfile`
+	(which is slow to import, and this module is imported by the client).
+	"""
+	for name in ("TMPDIR", "TEMP", "TMP"):
+		directory=os.environ.get(name)
+		if directory: return directory
+	return "/tmp"
+
+default_connection_address=os.environ.get("INKSCAPE_SCRIPTING_SOCKET",
+		os.path.join(_temporary_directory(), ".inkscape_scripting_plugin_socket"))
+
+def session_address(session_name: str)->str:
+	"""
+	Address of the socket of a daemon session that has its own address (see :class:`.daemon.Session`).
+	"""
+	return f"{default_connection_address}.{session_name}"
+
+connection_address=(
+		session_address(os.environ["INKSCAPE_SCRIPTING_SESSION"]) if os.environ.get("INKSCAPE_SCRIPTING_SESSION")
+		else default_connection_address)
+"""
+The address that the client connects to. Start Inkscape with the environment variable ``INKSCAPE_SCRIPTING_SESSION``
+set to connect to the daemon session with that name instead of the default address.
+"""
 connection_family="AF_UNIX"
+
+connect_timeout=float(os.environ.get("INKSCAPE_SCRIPTING_CONNECT_TIMEOUT", 1))
+"""
+Maximum number of seconds the daemon waits for the client to connect after clicking the button,
+and the client waits for the daemon to accept the connection.
+"""
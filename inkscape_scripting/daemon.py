@@ -14,12 +14,23 @@ import time
 import io
 from contextlib import contextmanager, ExitStack
 from functools import partial
-from multiprocessing.connection import Client
 from pathlib import Path
 import subprocess
+import hashlib
+import socket
+import threading
+import collections
+import atexit
 
-from .constants import connection_address, connection_family
+from . import constants
 from .interact import click_extension_window_button
+from . import patch
+from . import transport
+from . import framing
+from . import timing
+from .index import DocumentIndex
+from .history import DocumentHistory
+from . import geometry
 
 try:
 	import inkex  # type: ignore
@@ -36,6 +47,213 @@ except ImportError:
 from simpinkscr import simple_inkscape_scripting  # type: ignore
 from simpinkscr.simple_inkscape_scripting import SimpleInkscapeScripting  # type: ignore
 
+@dataclass
+class DocumentCache:
+	"""
+	Keeps the parsed document of the previous run, so that it can be reused if the next run's input file
+	has the same content (compared by hash), instead of parsing it again.
+
+	If the document is modified in the GUI between the runs, the input file differs, so it is parsed again.
+	If the document object is modified outside of an extension run, :meth:`invalidate` must be called.
+
+	Note that Inkscape serializes the document by itself before each run, so in practice the cache usually hits
+	when the previous run does not modify the document.
+	"""
+	enabled: bool=True
+	hits: int=0
+	misses: int=0
+	_digest: Optional[bytes]=None
+	_document: Any=None
+	_serialized: Optional[bytes]=None
+
+	def take(self, digest: bytes)->Optional[tuple[Any, bytes]]:
+		"""
+		Return ``(document, serialized)`` if the cached document matches *digest*, and remove it from the cache
+		(it will be modified by the run).
+		"""
+		if self.enabled and self._document is not None and self._digest==digest:
+			self.hits+=1
+			result=self._document, typing.cast(bytes, self._serialized)
+			self.invalidate()
+			return result
+		self.misses+=1
+		self.invalidate()
+		return None
+
+	def put(self, digest: bytes, document: Any, serialized: bytes)->None:
+		if not self.enabled: return
+		self._digest=digest
+		self._document=document
+		self._serialized=serialized
+
+	def invalidate(self)->None:
+		self._digest=None
+		self._document=None
+		self._serialized=None
+
+@dataclass
+class Session:
+	"""
+	The state of the daemon for one Inkscape window: its extension run, document cache and (in IPython) namespace,
+	so that several documents can be worked on from one daemon without interfering with each other.
+
+	Use :func:`use_session` to create and switch sessions (in IPython, the ``%inksession`` magic).
+	The module-level functions such as :func:`pause_extension_run` act on the current session.
+
+	Runs of different sessions may be in progress at the same time (for example ``with ExtensionRun(session=s):``
+	in several threads), except that clicking the extension window is serialized (it moves the keyboard focus),
+	and so is accepting the connection of sessions that share an address.
+	Note that SimpInkScr keeps its state in a global variable, so its functions (``circle`` etc.)
+	always act on the document of the current session.
+	"""
+	name: str
+	window_pattern: Optional[str]=None
+	"""
+	Regular expression matching the title of the main Inkscape window of this session, such as ``"^drawing.svg - Inkscape$"``.
+	``None`` means the only Inkscape window.
+	"""
+	own_address: bool=False
+	"""
+	If True, the clients of this session connect to :func:`.constants.session_address`
+	(start Inkscape with the environment variable ``INKSCAPE_SCRIPTING_SESSION`` set to the name of the session),
+	otherwise to the default address, which is shared with the other sessions.
+	"""
+	document_cache: DocumentCache=dataclasses.field(default_factory=DocumentCache)
+	extension_run_instance: Optional[ExtensionRun]=None
+	"""
+	The running ExtensionRun object of this session.
+
+	Code other than :func:`_register_extension_run_object_globally` must not modify this variable.
+	"""
+	last_connect_latency: Optional[float]=None
+	"""
+	Number of seconds between the start of clicking the extension window button and the client connecting,
+	in the last extension run.
+	"""
+	namespace: Optional[dict]=None
+	"""
+	The IPython namespace of this session while another session is current, see :mod:`inkscape_scripting.ipython`.
+	"""
+	document_index: DocumentIndex=dataclasses.field(default_factory=DocumentIndex)
+	"""
+	Kept across the runs, so that the bounding boxes that did not change are not computed again.
+	"""
+	history: DocumentHistory=dataclasses.field(default_factory=DocumentHistory)
+	"""
+	The earlier states of the document, see :func:`undo`.
+	"""
+
+	@property
+	def connection_address(self)->str:
+		return constants.session_address(self.name) if self.own_address else constants.connection_address
+
+sessions: dict[str, Session]={"default": Session("default")}
+
+_current_session: Session=sessions["default"]
+
+def current_session()->Session:
+	return _current_session
+
+def use_session(name: str, window_pattern: Optional[str]=None, own_address: Optional[bool]=None)->Session:
+	"""
+	Make the session *name* current, creating it if it does not exist.
+	*window_pattern* and *own_address* (see :class:`Session`) are changed if given.
+	"""
+	global _current_session
+	session=sessions.get(name)
+	if session is None:
+		session=sessions[name]=Session(name)
+	if window_pattern is not None:
+		session.window_pattern=window_pattern
+	if own_address is not None:
+		session.own_address=own_address
+	with _simple_top_lock:
+		_current_session=session
+		run=session.extension_run_instance
+		simple_inkscape_scripting._simple_top=None if run is None else run._simple_top
+	return session
+
+def _digest(data: bytes)->bytes:
+	return hashlib.sha1(data).digest()
+
+def _serialize(document)->bytes:
+	"""
+	Serialize *document* the same way as inkex's ``SvgOutputMixin.save``.
+	"""
+	return document.getroot().tostring()
+
+class _SimpleInkscapeScripting(SimpleInkscapeScripting):
+	"""
+	Same as :class:`SimpleInkscapeScripting`, but takes the document from the session's :class:`DocumentCache` if possible.
+
+	Instead of a deep copy of the input document (``original_document``), only its serialization is kept to detect changes,
+	and the serialization made to detect changes is the one that is saved, so that a run serializes the document
+	at most once when it is loaded (not at all if it comes from the cache) and once when it finishes.
+	"""
+	_input_digest: bytes=b""
+	_document_cache: Optional[DocumentCache]=None
+	_original_serialized: Optional[bytes]=None
+	_serialized: Optional[bytes]=None
+
+	def load(self, stream):
+		data=stream.read()
+		self._input_digest=_digest(data)
+		cached=None if self._document_cache is None else self._document_cache.take(self._input_digest)
+		# copied from inkex/base.py → SvgInputMixin.load, without the deepcopy
+		if cached is None:
+			document=inkex.load_svg(io.BytesIO(data))
+			self._original_serialized=_serialize(document)
+		else:
+			document, self._original_serialized=cached
+		self.original_document=None
+		self.svg=document.getroot()
+		self.svg.selection.set(*self.options.ids)
+		if not self.svg.selection and self.select_all:
+			self.svg.selection=self.svg.descendants().filter(*self.select_all)
+		return document
+
+	def has_changed(self, ret)->bool:
+		self._serialized=_serialize(self.document)
+		return self._serialized!=self._original_serialized
+
+	def save(self, stream)->None:
+		if self._serialized is None:
+			super().save(stream)
+		else:
+			stream.write(self._serialized)
+
+_spare_instance: Optional[_SimpleInkscapeScripting]=None
+"""
+Instance created in advance by :func:`warm_up`, used by the next run.
+"""
+
+_spare_instance_lock=threading.Lock()
+
+def warm_up()->None:
+	"""
+	Do the one-time initialization that would otherwise happen in the first run:
+	create the instance for the next run, and parse a tiny document (which sets up inkex's element lookup).
+
+	Called from the background thread of :mod:`inkscape_scripting.warmup`.
+	"""
+	global _spare_instance
+	inkex.load_svg(io.BytesIO(b'<svg xmlns="http://www.w3.org/2000/svg"><g/></svg>'))
+	if _spare_instance is None:
+		_spare_instance=_SimpleInkscapeScripting()
+
+def _new_instance()->_SimpleInkscapeScripting:
+	global _spare_instance
+	with _spare_instance_lock:
+		instance, _spare_instance=_spare_instance, None
+	return instance if instance is not None else _SimpleInkscapeScripting()
+
+pause_hooks: list[Callable[[ExtensionRun, Optional[ExtensionRun]], None]]=[]
+"""
+Functions called by :func:`pause_extension_run` with the run of the current session and ``None`` before the run is finished,
+then again with the run and the new run that replaces it. For example, IPython puts the objects of the new run
+(``svg_root`` etc.) in the namespace.
+"""
+
 @contextmanager
 def pause_extension_run()->Generator:
 	"""
@@ -54,80 +272,153 @@ def pause_extension_run()->Generator:
 
 	..seealso:: :func:`inkscape_press_keys`.
 	"""
-	global extension_run_instance
+	session=current_session()
+	extension_run_instance=session.extension_run_instance
 	if extension_run_instance is None:
 		yield
 	else:
+		for hook in pause_hooks: hook(extension_run_instance, None)
 		extension_run_instance.__exit__(None, None, None)
+		session.document_cache.invalidate()  # the document objects may be modified while paused
 		time.sleep(0.3)
 		try:
 			yield
 		finally:
-			ExtensionRun().__enter__()
+			new_run=ExtensionRun(session=session).__enter__()
+			for hook in pause_hooks: hook(extension_run_instance, new_run)
 
 @contextmanager
 def require_extension_run()->Generator:
 	"""
 	When the extension is not running, runs it.
 	"""
-	global extension_run_instance
+	extension_run_instance=current_session().extension_run_instance
 	if extension_run_instance is None:
 		with _global_extension_run_instance:
+			extension_run_instance=current_session().extension_run_instance
 			assert extension_run_instance is not None
 			yield extension_run_instance
 			# note that if pause_extension_run() is nested inside require_extension_run then the instance may be modified halfway
 	else:
 		yield extension_run_instance
 
+_listener_sockets: dict[str, socket.socket]={}
+"""
+Maps each address to the socket that the clients connect to.
+It is created once and kept listening for the lifetime of the daemon.
+"""
+
+_listener_sockets_lock=threading.Lock()
+
+_address_locks: collections.defaultdict[str, threading.Lock]=collections.defaultdict(threading.Lock)
+"""
+Held from clicking until accepting the connection, so that sessions sharing an address do not take each other's client.
+"""
+
+_click_lock=threading.Lock()
+"""
+Clicking moves the keyboard focus, so the clicks of different sessions must not overlap.
+"""
+
+def _get_listener_socket(address: str)->socket.socket:
+	with _listener_sockets_lock:
+		listener=_listener_sockets.get(address)
+		if listener is None:
+			path=Path(address)
+			if path.exists():
+				with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+					try:
+						s.connect(address)
+					except ConnectionRefusedError:
+						path.unlink()  # left over by a daemon that is no longer running
+					else:
+						raise Exception("Another daemon is already running")
+			listener=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+			listener.bind(address)
+			listener.listen()
+			atexit.register(lambda: path.unlink(missing_ok=True))
+			_listener_sockets[address]=listener
+		return listener
+
+def _discard_pending_connections(listener: socket.socket)->None:
+	"""
+	Close the connections from clients that were started without us clicking the button
+	(e.g. by clicking the "Apply" button manually).
+	"""
+	listener.setblocking(False)
+	try:
+		while True:
+			s, _=listener.accept()
+			s.close()
+	except BlockingIOError:
+		pass
+	finally:
+		listener.setblocking(True)
+
 @contextmanager
-def _connect_to_client()->Generator[tuple[Any, Callable[[Any], None]], None, None]:
+def _connect_to_client(click: Callable[[], None], session: Optional[Session]=None)->Generator[tuple[Any, Callable[[Any], None]], None, None]:
 	"""
-	Connect to the client.
+	Call *click* to start the client, and connect to it.
 
 	Example use::
 
-		with _connect_to_client() as argv, f:
+		with _connect_to_client(click_extension_window_button) as argv, f:
 			f(content_to_be_sent)
 
-	We allow receiving exactly one value, and send back exactly one value.
+	We receive the client's argv, and send back exactly one message (see :mod:`.framing`).
+
+	The daemon keeps a listening socket, and the client connects to it as soon as it starts,
+	so we just block on accepting (without busy-waiting) for at most :data:`.constants.connect_timeout` seconds.
+	Right after receiving the value, an empty message is sent to tell the client that the connection is accepted.
 
-	There are two situations which may happen:
-	* If the client has not started a (listening) server yet, the __enter__ will fail immediately. In that case, we retry.
-	* If we retry too many sometimes, we give up and raise the error.
+	*session* defaults to the current session; it determines the address.
 	"""
-	start_attempt_time=time.time()
-	with ExitStack() as stack:
-		while True:
-			try:
-				connection=stack.enter_context(Client(address=connection_address, family=connection_family))
-				break
-			except: # cannot connect
-				if time.time()-start_attempt_time>1:
-					# waited for too long
-					raise Exception("Cannot connect to the extension")
-				continue  # retry
-		received_value=connection.recv()
-		sending_value=b""
-		def send(b: bytes):
+	if session is None: session=current_session()
+	address=session.connection_address
+	with _address_locks[address]:
+		listener=_get_listener_socket(address)
+		_discard_pending_connections(listener)
+		start_attempt_time=time.perf_counter()
+		with _click_lock, timing.span("click"):
+			click()
+		listener.settimeout(constants.connect_timeout)
+		try:
+			with timing.span("connect"):
+				s, _=listener.accept()
+		except socket.timeout:
+			raise Exception("Cannot connect to the extension")
+		finally:
+			listener.settimeout(None)
+	session.last_connect_latency=time.perf_counter()-start_attempt_time
+	s.setblocking(True)
+	with s:
+		with timing.span("receive"):
+			received_value=framing.decode_argv(framing.recv_frame(s))
+			framing.send_frame(s)
+		sending_value: Any=b""
+		def send(b: Any):
 			nonlocal sending_value
 			sending_value=b
 		try:
 			yield received_value, send
 		finally:
 			# whatever happens, we must send this to unblock the client
-			connection.send(sending_value)
+			with timing.span("send"):
+				framing.send_frame(s, *framing.encode_message(sending_value))
 
 @dataclass
 class ExtensionRun:
 	"""
 	Represents a single run of the Inkscape extension.
 
-	There cannot be more than one extension running at a time, so this object should be singleton.
+	There cannot be more than one extension running at a time in each session.
 
 	Usage::
 		with ExtensionRun() as a:
 			print(len(a.guides))
 			a.guides=[]
+
+	*session* defaults to the current session, see :class:`Session`.
 	"""
 
 	svg_root: Any=None
@@ -135,42 +426,95 @@ class ExtensionRun:
 	user_args: Any=None
 	canvas: Any=None
 	metadata: Any=None
+	index: Optional[DocumentIndex]=None
+	"""
+	The index of the elements of :attr:`svg_root`, see :mod:`inkscape_scripting.index`.
+	"""
+	session: Optional[Session]=None
 
 	_connection: Any=None
+	_simple_top: Any=None
+	_original_guides: Any=None
+	_replacement: Optional[bytes]=None
 	_stack: ExitStack=dataclasses.field(default_factory=ExitStack)
 
 	def __enter__(self)->ExtensionRun:
 		with self._stack:
 			assert self._connection is None
+			if self.session is None: self.session=current_session()
+			session=self.session
 			self._stack.enter_context(_register_extension_run_object_globally(self))
 
-			click_extension_window_button()
-			args, self._connection=self._stack.enter_context(_connect_to_client())
-			del args[0]
+			args, self._connection=self._start()
 
 			# taken from /usr/share/inkscape/extensions/inkex/base.py → def run
-			self._sis_instance=_sis_instance=SimpleInkscapeScripting()
+			self._sis_instance=_sis_instance=_new_instance()
+			_sis_instance._document_cache=session.document_cache
 			self._stack.push(lambda exc_type, exc_value, traceback: _sis_instance.clean_up())
 			_sis_instance.parse_arguments(args)
 			assert _sis_instance.options.input_file is not None
-			_sis_instance.load_raw()
+			with timing.span("load"):
+				_sis_instance.load_raw()
 
 			# construct the object. Copied from SimpInkScr/simpinkscr/simple_inkscape_scripting.py → def effect
-			self._stack.enter_context(_setup_global_simple_top(
-				simple_inkscape_scripting.SimpleTopLevel(_sis_instance.svg, _sis_instance)
-				))
-			simple_inkscape_scripting._simple_top.simple_pages=simple_inkscape_scripting._simple_top.get_existing_pages()
-
-			self._stack.enter_context(self._set_properties_to_none())
-			self.svg_root = _sis_instance.svg
-			self.guides = simple_inkscape_scripting._simple_top.get_existing_guides()
-			self.user_args = _sis_instance.options.user_args
-			self.canvas = simple_inkscape_scripting._simple_top.canvas
-			self.metadata = simple_inkscape_scripting.SimpleMetadata()
+			with timing.span("setup"):
+				simple_top=self._simple_top=simple_inkscape_scripting.SimpleTopLevel(_sis_instance.svg, _sis_instance)
+				self._stack.enter_context(self._global_simple_top())
+				with _using_simple_top(simple_top):
+					simple_top.simple_pages=simple_top.get_existing_pages()
+
+					self._stack.enter_context(self._set_properties_to_none())
+					self.svg_root = _sis_instance.svg
+					self.guides = simple_top.get_existing_guides()
+					self._original_guides = _guides_state(self.guides)
+					self.user_args = _sis_instance.options.user_args
+					self.canvas = simple_top.canvas
+					self.metadata = simple_inkscape_scripting.SimpleMetadata()
+					self.index = session.document_index
+					self.index.reset(self.svg_root)
 
 			self._stack=self._stack.pop_all()
 		return self
 
+	def replace_document(self, data: bytes)->None:
+		"""
+		When the run finishes, send the document *data* (serialized) instead of the document of the run,
+		whose changes are discarded.
+		"""
+		self._replacement=data
+
+	def _start(self)->tuple[list[str], Callable[[Any], None]]:
+		"""
+		Start the client, and return the arguments of the extension (without ``argv[0]``)
+		and the function to send the output with. Called inside :attr:`_stack`.
+		"""
+		session=typing.cast(Session, self.session)
+		click=(click_extension_window_button if session.window_pattern is None
+				else partial(click_extension_window_button, session.window_pattern))
+		args, send=self._stack.enter_context(_connect_to_client(click, session))
+		return args[1:], send
+
+	def _global_simple_top(self)->typing.ContextManager:
+		return _setup_global_simple_top(self)
+
+	def _encode_output(self, data: bytes)->Any:
+		"""
+		Return the message to send for the changed document *data*.
+		"""
+		message: Any=data
+		if send_patch:
+			with timing.span("patch"):
+				message=patch.make_output(self._sis_instance.options.input_file, data)
+		if isinstance(message, bytes):
+			with timing.span("encode"):
+				message=transport.encode(message, slot=typing.cast(Session, self.session).name)
+		return message
+
+	def _send_unchanged(self, send: Callable[[Any], None])->None:
+		"""
+		Called instead of *send* when the document is not changed. (Inkscape takes an empty output as unchanged.)
+		"""
+
 	@contextmanager
 	def _set_properties_to_none(self)->Generator:
 		yield
@@ -179,34 +523,165 @@ class ExtensionRun:
 		self.user_args=None
 		self.canvas=None
 		self.metadata=None
+		self.index=None
 
 	def __exit__(self, exc_type, exc_value, traceback)->None:
 		with self._stack:
 			assert self._connection is not None
 			send=self._connection
 			self._connection=None
-			simple_inkscape_scripting._simple_top.replace_all_guides(self.guides)
-			if self._sis_instance.has_changed(None):
-				with io.BytesIO() as f:
-					self._sis_instance.save(f)
-					send(f.getvalue())
+			session=typing.cast(Session, self.session)
+			geometry.flush(self._sis_instance.svg)
+			_sis_instance=self._sis_instance
+			if self._replacement is not None:
+				send(self._encode_output(self._replacement))
+				session.document_cache.invalidate()
+				return
+			if not _same_guides(self.guides, self._original_guides):
+				# this removes and appends all the guide elements, so skip it if not needed
+				with timing.span("guides"), _using_simple_top(self._simple_top):
+					self._simple_top.replace_all_guides(self.guides)
+			with timing.span("has_changed"):
+				changed=_sis_instance.has_changed(None)
+			if changed:
+				with timing.span("save"), io.BytesIO() as f:
+					_sis_instance.save(f)
+					data=f.getvalue()
+				send(self._encode_output(data))
+				with timing.span("history"):
+					session.history.record(typing.cast(bytes, _sis_instance._original_serialized))
+				session.document_cache.put(_digest(data), _sis_instance.document, _sis_instance._serialized)
+			else:
+				self._send_unchanged(send)
+				session.document_cache.put(_sis_instance._input_digest, _sis_instance.document, _sis_instance._serialized)
+
+def _guides_state(guides)->Any:
+	"""
+	A snapshot of the list of guide objects *guides*, to be compared with by :func:`_same_guides`.
+	"""
+	try:
+		return [(guide, dict(vars(guide))) for guide in guides]
+	except TypeError:  # no __dict__
+		return None
 
+def _same_guides(guides, state)->bool:
+	"""
+	Return whether *guides* contains the same guide objects, with the same attribute values, as when *state* was taken.
+	"""
+	if state is None or guides is None or len(guides)!=len(state): return False
+	try:
+		return all(guide is old_guide and vars(guide)==old_values for guide, (old_guide, old_values) in zip(guides, state))
+	except Exception:  # some value cannot be compared
+		return False
 
-extension_run_instance: Optional[ExtensionRun]=None
-"""
-The global instance of the running ExtensionRun object.
+@dataclass
+class OfflineExtensionRun(ExtensionRun):
+	"""
+	Same as :class:`ExtensionRun`, but without Inkscape: the document is read from *input*
+	(a path, or the content of the file as bytes), and the result is written to *output* (a path),
+	or only kept in :attr:`output_data` if *output* is None.
+	The output is written even if the document is not changed, but not if the ``with`` block raises an exception:
+	then the document may be half-edited, and *output* (possibly the input file) is left untouched.
 
-Code other than :func:`_register_extension_run_object_globally` must not modify this variable.
+	Usage::
+		with OfflineExtensionRun(input="in.svg", output="out.svg") as a:
+			a.svg_root.set("width", "10cm")
+
+	*extension_args* are passed to the extension before the input file, like Inkscape does.
+
+	It has its own session (unless *session* is given), so it does not interfere with the runs of the current session;
+	but while it is running, SimpInkScr's functions act on its document, and runs in other threads cannot be set up.
+	See :mod:`inkscape_scripting.batch` to process many files.
+	"""
+
+	input: Any=None
+	output: Optional[Any]=None
+	extension_args: list[str]=dataclasses.field(default_factory=list)
+	output_data: Optional[bytes]=None
+
+	def __post_init__(self)->None:
+		if self.session is None:
+			self.session=Session("offline", document_cache=DocumentCache(enabled=False), history=DocumentHistory(enabled=False))
+
+	def _start(self)->tuple[list[str], Callable[[Any], None]]:
+		if isinstance(self.input, bytes):
+			fd, path=tempfile.mkstemp(prefix="inkscape_scripting_", suffix=".svg", dir=transport.file_directory)
+			with open(fd, "wb") as f:
+				f.write(self.input)
+			self._stack.callback(Path(path).unlink)
+		else:
+			path=str(self.input)
+		return [*self.extension_args, path], self._write_output
+
+	def _global_simple_top(self)->typing.ContextManager:
+		return _using_simple_top(self._simple_top)
+
+	def _encode_output(self, data: bytes)->Any:
+		return data
+
+	def _send_unchanged(self, send: Callable[[Any], None])->None:
+		with open(self._sis_instance.options.input_file, "rb") as f:
+			send(f.read())
+
+	def __exit__(self, exc_type, exc_value, traceback)->None:
+		if exc_type is None:
+			super().__exit__(exc_type, exc_value, traceback)
+			return
+		assert self._connection is not None
+		self._connection=None
+		self._stack.__exit__(exc_type, exc_value, traceback)
+
+	def _write_output(self, data: bytes)->None:
+		self.output_data=data
+		if self.output is not None:
+			Path(self.output).write_bytes(data)
+
+def undo(steps: int=1, session: Optional[Session]=None)->int:
+	"""
+	Restore the document of *session* (default: the current one) to its state before the last *steps* runs
+	that changed it (redo if *steps* is negative), in one extension run.
+	Return the number of steps done, which is less than ``abs(steps)`` if not enough states are recorded.
+
+	..seealso:: :class:`.history.DocumentHistory`.
+	"""
+	history=(session or current_session()).history
+	if (history.undo_count if steps>0 else history.redo_count if steps<0 else 0)==0: return 0
+	with ExtensionRun(session=session) as run:
+		with timing.span("undo"):
+			data, done=history.undo(typing.cast(bytes, run._sis_instance._original_serialized), steps)
+		if done: run.replace_document(data)
+	return done
+
+def unit_values(svg_root)->dict[str, float]:
+	"""
+	Return the values of ``mm``, ``cm``, ``pt``, ``px`` and ``inch`` (``in`` is a keyword) in the user unit of *svg_root*,
+	which are put in the namespace of the user code.
+	"""
+	try:
+		# Inkscape 1.2+
+		convert_unit = svg_root.viewport_to_unit
+	except AttributeError:
+		# Inkscape 1.0 and 1.1
+		convert_unit = svg_root.unittouu
+	result={unit: convert_unit('1' + unit) for unit in ['mm', 'cm', 'pt', 'px']}
+	result['inch'] = convert_unit('1in')
+	return result
+
+send_patch: bool=True
+"""
+If True, when only a small part of the document changes, a patch against the input file is sent to the client
+instead of the whole document. See :mod:`inkscape_scripting.patch`.
 """
 
 class _GlobalExtensionRun:
 	"""
-	A class that is a thin wrapper over the current extension_run_instance object.
+	A class that is a thin wrapper over the extension_run_instance object of the current session.
 	"""
 	def __enter__(self)->ExtensionRun:
-		assert extension_run_instance is None
+		assert current_session().extension_run_instance is None
 		return ExtensionRun().__enter__()
 	def __exit__(self, exc_type, exc_value, traceback)->None:
+		extension_run_instance=current_session().extension_run_instance
 		assert extension_run_instance is not None
 		extension_run_instance.__exit__(exc_type, exc_value, traceback)
 	# note that extension_run_instance may have changed between __enter__ and __exit__
@@ -215,18 +690,40 @@ _global_extension_run_instance=_GlobalExtensionRun()
 
 @contextmanager
 def _register_extension_run_object_globally(e: ExtensionRun)->Generator:
-	global extension_run_instance
-	assert extension_run_instance is None
-	extension_run_instance=e
+	session=typing.cast(Session, e.session)
+	assert session.extension_run_instance is None
+	session.extension_run_instance=e
 	try: yield
 	finally:
-		assert extension_run_instance is e
-		extension_run_instance=None
+		assert session.extension_run_instance is e
+		session.extension_run_instance=None
+
+_simple_top_lock=threading.RLock()
+"""
+Protects SimpInkScr's global variable ``_simple_top``, which is the top-level object of the current session's run
+(see :func:`use_session`), and temporarily the one of another run while that run is set up or finished.
+"""
 
 @contextmanager
-def _setup_global_simple_top(simple_top)->Generator:
-	assert simple_inkscape_scripting._simple_top is None
-	simple_inkscape_scripting._simple_top=simple_top
+def _setup_global_simple_top(e: ExtensionRun)->Generator:
+	"""
+	If *e* is a run of the current session, make its top-level object SimpInkScr's global one while it runs.
+	"""
+	with _simple_top_lock:
+		if e.session is current_session():
+			assert simple_inkscape_scripting._simple_top is None
+			simple_inkscape_scripting._simple_top=e._simple_top
 	try: yield
-	finally: simple_inkscape_scripting._simple_top=None
+	finally:
+		with _simple_top_lock:
+			if simple_inkscape_scripting._simple_top is e._simple_top:
+				simple_inkscape_scripting._simple_top=None
+
+@contextmanager
+def _using_simple_top(simple_top)->Generator:
+	with _simple_top_lock:
+		old_simple_top=simple_inkscape_scripting._simple_top
+		simple_inkscape_scripting._simple_top=simple_top
+		try: yield
+		finally: simple_inkscape_scripting._simple_top=old_simple_top
 
@@ -0,0 +1,109 @@
+"""
+The wire format between the daemon and the client.
+
+Each frame is an 8-byte big-endian length followed by that many bytes.
+
+* The client sends one frame with its argv (encoded by :func:`encode_argv`).
+* The daemon sends an empty frame as soon as it accepts the connection,
+  then one frame with the output message (encoded by :func:`encode_message`, see :mod:`inkscape_scripting.transport`).
+
+This module is imported by the client, so it must not import anything (not even ``typing``)
+-- in particular not :mod:`pickle` and :mod:`multiprocessing`.
+"""
+from __future__	import annotations
+
+TYPE_CHECKING=False
+if TYPE_CHECKING:
+	import socket
+	from typing import Any
+
+_header_size=8
+
+def send_frame(sock: socket.socket, *parts: bytes)->None:
+	"""
+	Send the concatenation of *parts* as one frame, without concatenating them in memory.
+	"""
+	sock.sendall(sum(len(part) for part in parts).to_bytes(_header_size, "big"))
+	for part in parts:
+		# the client may close the connection as soon as it has received the whole frame,
+		# so sending an empty part after that fails with EPIPE
+		if part: sock.sendall(part)
+
+def _recv_exactly(sock: socket.socket, size: int)->bytearray:
+	result=bytearray(size)
+	view=memoryview(result)
+	received=0
+	while received<size:
+		n=sock.recv_into(view[received:])
+		if n==0: raise EOFError
+		received+=n
+	return result
+
+def recv_frame(sock: socket.socket)->bytearray:
+	return _recv_exactly(sock, int.from_bytes(_recv_exactly(sock, _header_size), "big"))
+
+def encode_argv(argv: list[str])->bytes:
+	import os
+	return b"\0".join(os.fsencode(arg) for arg in argv)
+
+def decode_argv(data: bytes)->list[str]:
+	import os
+	return [os.fsdecode(arg) for arg in bytes(data).split(b"\0")]
+
+def _int(value: int)->bytes:
+	return value.to_bytes(8, "big")
+
+def encode_message(message: Any)->list[bytes]:
+	"""
+	Encode a message of :mod:`inkscape_scripting.transport` into a list of parts of one frame.
+	"""
+	if isinstance(message, bytes):
+		return [b"D", message]
+	tag=message[0]
+	if tag=="zlib":
+		return [b"Z", message[1]]
+	if tag=="file":
+		_, path, length=message
+		return [b"F", _int(length), path.encode("u8")]
+	if tag=="patch":
+		_, input_file, original_length, patch=message
+		path=input_file.encode("u8")
+		parts=[b"P", _int(original_length), _int(len(path)), path]
+		for op in patch:
+			if isinstance(op, bytes):
+				parts+=[b"I", _int(len(op)), op]
+			else:
+				parts+=[b"C", _int(op[0]), _int(op[1])]
+		return parts
+	raise ValueError(f"Unknown message: {tag!r}")
+
+def decode_message(frame: bytearray)->Any:
+	"""
+	Inverse of :func:`encode_message`.
+	"""
+	view=memoryview(frame)
+	tag=bytes(view[:1])
+	def read_int(i: int)->int:
+		return int.from_bytes(view[i:i+8], "big")
+	if tag==b"D":
+		return view[1:]
+	if tag==b"Z":
+		return ("zlib", view[1:])
+	if tag==b"F":
+		return ("file", bytes(view[9:]).decode("u8"), read_int(1))
+	if tag==b"P":
+		original_length=read_int(1)
+		path_length=read_int(9)
+		i=17+path_length
+		input_file=bytes(view[17:i]).decode("u8")
+		patch: list=[]
+		while i<len(view):
+			if view[i:i+1]==b"I":
+				length=read_int(i+1)
+				patch.append(bytes(view[i+9:i+9+length]))
+				i+=9+length
+			else:
+				patch.append((read_int(i+1), read_int(i+9)))
+				i+=17
+		return ("patch", input_file, original_length, patch)
+	raise ValueError(f"Unknown message: {tag!r}")
@@ -0,0 +1,331 @@
+"""
+The geometry of many paths in NumPy arrays, so that moving, scaling or snapping them is one array operation.
+
+Usage (``PathArray`` is in the IPython namespace)::
+
+	paths=PathArray(svg_index.with_tag("path"))  # default: the selected paths
+	paths.translate(10*mm, 0)
+	paths.rotate(90, origin=(50*mm, 50*mm), paths=paths.bounding_boxes()[:, 0]>100*mm)
+	paths.round(0.5*mm)
+
+The ``d`` attribute of each path is parsed once into absolute ``M``, ``L``, ``C``, ``Q`` and ``Z`` commands
+(``H``, ``V``, ``S`` and ``T`` are expanded, and the paths that contain arcs are converted to curves by inkex).
+The coordinates are in the coordinate system of each path (its own ``transform`` attribute is not applied).
+
+The modified paths are written back to the document when the cell ends (in general, when :func:`flush` is called,
+which the extension run does before finishing), or when :meth:`PathArray.write` is called.
+Modifying the ``d`` attribute of the paths in the meantime is overwritten.
+"""
+from __future__	import annotations
+
+import re
+import threading
+from typing import Any, Optional
+
+_svg_path_tag="{http://www.w3.org/2000/svg}path"
+
+_token_pattern=re.compile(r"([MmLlHhVvCcSsQqTtAaZz])|([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)")
+
+_arity={"M": 2, "L": 2, "H": 1, "V": 1, "C": 6, "S": 4, "Q": 4, "T": 2, "Z": 0}
+"""
+Number of arguments of each command.
+"""
+
+_point_count={ord("M"): 1, ord("L"): 1, ord("C"): 3, ord("Q"): 2, ord("Z"): 0}
+"""
+Number of points of each command after normalization.
+"""
+
+def _parse(d: str, codes: list[int], coordinates: list[float])->None:
+	"""
+	Append the normalized commands of the path data *d* to *codes* (the letters) and *coordinates* (``x, y, x, y, ...``).
+	After ``Z``, a drawing command is preceded by an explicit ``M``, so that the current point before each command
+	is the last point of the previous one.
+	"""
+	if "a" in d or "A" in d:
+		import inkex  # type: ignore
+		d=str(inkex.CubicSuperPath(inkex.Path(d)).to_path())
+	x=y=0.
+	start_x=start_y=0.
+	control_x=control_y=0.  # the last control point of the previous C or Q, reflected by S and T
+	previous=""
+	command=""
+	arguments: list[float]=[]
+	closed=False
+	for letter, number in _token_pattern.findall(d):
+		if letter:
+			command=letter
+			arguments=[]
+			if command in "Zz":
+				codes.append(ord("Z"))
+				x, y=start_x, start_y
+				previous="Z"
+				closed=True
+			continue
+		if not command or command in "Zz": raise ValueError(f"Invalid path data: {d!r}")
+		arguments.append(float(number))
+		if len(arguments)<_arity[command.upper()]: continue
+		relative=command.islower()
+		upper=command.upper()
+		values=arguments
+		arguments=[]
+		if closed and upper!="M":
+			codes.append(ord("M"))
+			coordinates+=(x, y)
+		elif not previous and upper!="M":
+			raise ValueError(f"Path data does not start with M: {d!r}")
+		closed=False
+		if upper=="H":
+			upper, values, relative=("L", [values[0]+x if relative else values[0], y], False)
+		elif upper=="V":
+			upper, values, relative=("L", [x, values[0]+y if relative else values[0]], False)
+		if relative:
+			values=[value+(x if i%2==0 else y) for i, value in enumerate(values)]
+		if upper=="S":
+			reflected=(2*x-control_x, 2*y-control_y) if previous=="C" else (x, y)
+			upper, values=("C", [*reflected, *values])
+		elif upper=="T":
+			reflected=(2*x-control_x, 2*y-control_y) if previous=="Q" else (x, y)
+			upper, values=("Q", [*reflected, *values])
+		codes.append(ord(upper))
+		coordinates+=values
+		if upper=="M":
+			start_x, start_y=values
+			command="l" if command=="m" else "L"  # the next pairs are line-to
+		if upper in "CQ":
+			control_x, control_y=values[-4], values[-3]
+		x, y=values[-2], values[-1]
+		previous=upper
+	if arguments: raise ValueError(f"Invalid path data: {d!r}")
+
+_pending: dict[int, PathArray]={}
+"""
+The path arrays with modifications that are not written to the document yet.
+"""
+
+_pending_lock=threading.Lock()
+
+def flush(svg_root: Any=None)->None:
+	"""
+	Write back the modified paths of all the path arrays of the document *svg_root* (default: of all documents).
+	"""
+	with _pending_lock:
+		arrays=[array for array in _pending.values() if svg_root is None or array._svg_root is svg_root]
+	for array in arrays:
+		array.write()
+
+class PathArray:
+	"""
+	See the module documentation.
+
+	Attributes (the arrays are shared with the object, and may be modified in place followed by :meth:`mark_modified`):
+
+	* :attr:`elements`: the path elements,
+	* :attr:`points`: array of shape ``(k, 2)``, the points of all the commands of all the paths,
+	* :attr:`codes`: array of the letters of all the commands (as ``uint8``),
+	* :attr:`command_start`: where the points of each command start in :attr:`points` (one more entry at the end),
+	* :attr:`path_command_start`: where the commands of each path start in :attr:`codes` (one more entry at the end),
+	* :attr:`point_path`: the index of the path of each point.
+
+	Methods that modify the points take an optional *paths*, the indices of the paths to modify,
+	or a boolean array with one value per path.
+	"""
+	def __init__(self, elements: Any=None)->None:
+		import numpy as np
+		if elements is None:
+			from simpinkscr import simple_inkscape_scripting  # type: ignore
+			simple_top=simple_inkscape_scripting._simple_top
+			if simple_top is None: raise RuntimeError("The extension is not running")
+			elements=[element for element in simple_top.svg_root.selection.values() if element.tag==_svg_path_tag]
+		self.elements=list(elements)
+		codes: list[int]=[]
+		coordinates: list[float]=[]
+		path_command_start=[0]
+		for element in self.elements:
+			if element.tag!=_svg_path_tag: raise TypeError(f"Not a path: {element!r}")
+			_parse(element.attrib.get("d", ""), codes, coordinates)
+			path_command_start.append(len(codes))
+		self.codes=np.array(codes, dtype=np.uint8)
+		self.points=np.array(coordinates, dtype=float).reshape(-1, 2)
+		point_count=np.zeros(256, dtype=np.int64)
+		for code, count in _point_count.items(): point_count[code]=count
+		self.command_start=np.concatenate([[0], np.cumsum(point_count[self.codes])])
+		self.path_command_start=np.array(path_command_start, dtype=np.int64)
+		path_point_start=self.command_start[self.path_command_start]
+		self.point_path=np.repeat(np.arange(len(self.elements)), np.diff(path_point_start))
+		self._modified=np.zeros(len(self.elements), dtype=bool)
+		self._svg_root=self.elements[0].getroottree().getroot() if self.elements else None
+
+	def __len__(self)->int:
+		return len(self.elements)
+
+	def __repr__(self)->str:
+		return f"<PathArray of {len(self.elements)} paths, {len(self.points)} points>"
+
+	def _path_mask(self, paths: Any)->Any:
+		import numpy as np
+		if paths is None: return np.ones(len(self.elements), dtype=bool)
+		paths=np.asarray(paths)
+		if paths.dtype==bool: return paths
+		mask=np.zeros(len(self.elements), dtype=bool)
+		mask[paths]=True
+		return mask
+
+	def mark_modified(self, paths: Any=None)->None:
+		"""
+		Mark the *paths* to be written back (after modifying :attr:`points` directly).
+		"""
+		self._modified|=self._path_mask(paths)
+		with _pending_lock:
+			_pending[id(self)]=self
+
+	def path_points(self, i: int)->Any:
+		"""
+		Return the points of the path *i* (a view of :attr:`points`).
+		"""
+		start, end=self.command_start[self.path_command_start[i]], self.command_start[self.path_command_start[i+1]]
+		return self.points[start:end]
+
+	def transform(self, matrix: Any, paths: Any=None)->None:
+		"""
+		Apply the affine transformation *matrix*: an ``inkex.Transform``, ``(a, b, c, d, e, f)`` as in SVG,
+		or an array of shape ``(2, 3)``.
+		"""
+		import numpy as np
+		if hasattr(matrix, "to_hexad"): matrix=list(matrix.to_hexad())
+		matrix=np.asarray(matrix, dtype=float)
+		if matrix.shape==(6,): matrix=matrix.reshape(3, 2).T
+		if matrix.shape!=(2, 3): raise ValueError(f"Invalid matrix of shape {matrix.shape}")
+		mask=self._path_mask(paths)
+		if mask.all():
+			self.points[:]=self.points@matrix[:, :2].T+matrix[:, 2]
+		else:
+			point_mask=mask[self.point_path]
+			self.points[point_mask]=self.points[point_mask]@matrix[:, :2].T+matrix[:, 2]
+		self.mark_modified(mask)
+
+	def translate(self, dx: float, dy: float, paths: Any=None)->None:
+		self.transform([[1, 0, dx], [0, 1, dy]], paths)
+
+	def scale(self, sx: float, sy: Optional[float]=None, origin: tuple[float, float]=(0, 0), paths: Any=None)->None:
+		if sy is None: sy=sx
+		x, y=origin
+		self.transform([[sx, 0, x-sx*x], [0, sy, y-sy*y]], paths)
+
+	def rotate(self, degrees: float, origin: tuple[float, float]=(0, 0), paths: Any=None)->None:
+		"""
+		Rotate by *degrees* around *origin*, clockwise on the screen (as the ``rotate()`` SVG transform).
+		"""
+		import numpy as np
+		c, s=np.cos(np.radians(degrees)), np.sin(np.radians(degrees))
+		x, y=origin
+		self.transform([[c, -s, x-c*x+s*y], [s, c, y-s*x-c*y]], paths)
+
+	def round(self, step: float=1., paths: Any=None)->None:
+		"""
+		Snap all the points (including the control points) to the multiples of *step*.
+		"""
+		import numpy as np
+		mask=self._path_mask(paths)
+		point_mask=mask[self.point_path]
+		self.points[point_mask]=np.round(self.points[point_mask]/step)*step
+		self.mark_modified(mask)
+
+	def bounding_boxes(self)->Any:
+		"""
+		Return an array with one row ``left, top, right, bottom`` for each path (NaN for an empty path).
+		The bounding boxes are exact (the extrema of the curves are computed), without the stroke width.
+		"""
+		import numpy as np
+		codes=self.codes
+		has_points=codes!=ord("Z")
+		# the end point of each command
+		candidates=[self.points[self.command_start[1:][has_points]-1]]
+		candidate_paths=[self._command_path()[has_points]]
+		for code, degree in ((ord("C"), 3), (ord("Q"), 2)):
+			commands=np.flatnonzero(codes==code)
+			if not len(commands): continue
+			first=self.command_start[commands]
+			# the current point, followed by the points of the command
+			control=np.stack([self.points[first-1+i] for i in range(degree+1)], axis=1)
+			for t in _extrema(control):
+				valid=~np.isnan(t)
+				candidates.append(_bezier(control[valid], t[valid]))
+				candidate_paths.append(self._command_path()[commands][valid])
+		points=np.concatenate(candidates)
+		path_of_point=np.concatenate(candidate_paths)
+		result=np.full((len(self.elements), 4), np.inf)
+		result[:, 2:]=-np.inf
+		np.minimum.at(result[:, 0], path_of_point, points[:, 0])
+		np.minimum.at(result[:, 1], path_of_point, points[:, 1])
+		np.maximum.at(result[:, 2], path_of_point, points[:, 0])
+		np.maximum.at(result[:, 3], path_of_point, points[:, 1])
+		result[np.isinf(result[:, 0])]=np.nan
+		return result
+
+	def bounding_box(self)->Any:
+		"""
+		Return ``left, top, right, bottom`` of all the paths.
+		"""
+		import numpy as np
+		boxes=self.bounding_boxes()
+		return np.array([np.nanmin(boxes[:, 0]), np.nanmin(boxes[:, 1]), np.nanmax(boxes[:, 2]), np.nanmax(boxes[:, 3])])
+
+	def _command_path(self)->Any:
+		import numpy as np
+		return np.repeat(np.arange(len(self.elements)), np.diff(self.path_command_start))
+
+	def write(self)->None:
+		"""
+		Write the ``d`` attribute of the modified paths now.
+		"""
+		with _pending_lock:
+			_pending.pop(id(self), None)
+		import numpy as np
+		codes=self.codes.tolist()
+		command_start=self.command_start.tolist()
+		path_command_start=self.path_command_start.tolist()
+		for i in np.flatnonzero(self._modified).tolist():
+			parts=[]
+			for j in range(path_command_start[i], path_command_start[i+1]):
+				parts.append(chr(codes[j]))
+				parts.extend(format(value, ".8g") for value in self.points[command_start[j]:command_start[j+1]].ravel().tolist())
+			self.elements[i].attrib["d"]=" ".join(parts)
+		self._modified[:]=False
+
+def _extrema(control: Any)->list:
+	"""
+	For Bézier curves with control points *control* (an array of shape ``(n, degree+1, 2)``),
+	return arrays of the parameters in ``(0, 1)`` where the derivative of a coordinate is zero (NaN where there is none).
+	"""
+	import numpy as np
+	with np.errstate(divide="ignore", invalid="ignore"):
+		if control.shape[1]==3:
+			p0, p1, p2=control[:, 0], control[:, 1], control[:, 2]
+			t=(p0-p1)/(p0-2*p1+p2)
+			roots=[t]
+		else:
+			p0, p1, p2, p3=control[:, 0], control[:, 1], control[:, 2], control[:, 3]
+			# the derivative divided by 3 is a*t^2+b*t+c
+			a=-p0+3*p1-3*p2+p3
+			b=2*(p0-2*p1+p2)
+			c=p1-p0
+			root=np.sqrt(b*b-4*a*c)
+			linear=np.abs(a)<1e-12
+			roots=[
+				np.where(linear, -c/b, (-b+root)/(2*a)),
+				np.where(linear, np.nan, (-b-root)/(2*a)),
+				]
+		# one column per coordinate
+		return [np.where((t>0)&(t<1), t, np.nan) for roots_t in roots for t in (roots_t[:, 0], roots_t[:, 1])]
+
+def _bezier(control: Any, t: Any)->Any:
+	"""
+	Evaluate the Bézier curves with control points *control* (shape ``(n, degree+1, 2)``) at the parameters *t*.
+	"""
+	s=1-t
+	if control.shape[1]==3:
+		weights=[s*s, 2*s*t, t*t]
+	else:
+		weights=[s*s*s, 3*s*s*t, 3*s*t*t, t*t*t]
+	return sum(weight[:, None]*control[:, i] for i, weight in enumerate(weights))
@@ -0,0 +1,124 @@
+"""
+Undo history of the document, kept in the daemon, so that ``%inkundo`` restores an earlier state
+in one extension run instead of pressing Ctrl+Z in the Inkscape window.
+
+Each run that changes the document records the document as it was before the run. The state is the serialization
+that the run makes anyway to detect changes (see :class:`.daemon._SimpleInkscapeScripting`), so recording
+does not serialize anything. Only the newest state is kept whole; each older state is kept as a :class:`_Delta`
+against the next newer one, which is small when a cell changes one part of the document,
+and costs about one ``memcmp`` of the document to compute.
+"""
+from __future__	import annotations
+
+import dataclasses
+from dataclasses import dataclass
+from typing import Any
+
+from .patch import _common_prefix_length, _common_suffix_length
+
+@dataclass
+class _Delta:
+	"""
+	A document that has the first *prefix* and the last *suffix* bytes in common with the next newer one,
+	and *middle* in between.
+	"""
+	prefix: int
+	middle: bytes
+	suffix: int
+
+	def apply(self, newer: bytes)->bytes:
+		view=memoryview(newer)
+		return b"".join((view[:self.prefix], self.middle, view[len(view)-self.suffix:]))
+
+def _delta(older: bytes, newer: bytes)->_Delta:
+	prefix=_common_prefix_length(older, newer)
+	suffix=_common_suffix_length(older, newer, min(len(older), len(newer))-prefix)
+	return _Delta(prefix, older[prefix:len(older)-suffix], suffix)
+
+@dataclass
+class _StateStack:
+	"""
+	A stack of documents, where all but the top one are stored as deltas.
+	"""
+	items: list[Any]=dataclasses.field(default_factory=list)
+
+	def __len__(self)->int:
+		return len(self.items)
+
+	def push(self, data: bytes)->None:
+		if self.items: self.items[-1]=_delta(self.items[-1], data)
+		self.items.append(data)
+
+	def pop(self)->bytes:
+		data=self.items.pop()
+		if self.items: self.items[-1]=self.items[-1].apply(data)
+		return data
+
+	def size(self)->int:
+		return sum(len(item) if isinstance(item, bytes) else len(item.middle) for item in self.items)
+
+	def drop_oldest(self)->None:
+		del self.items[0]
+
+@dataclass
+class DocumentHistory:
+	"""
+	The states of the document before the runs of a session that changed it, and the states undone since then
+	(to be redone). Running a cell that changes the document clears the states to be redone.
+
+	Note that the states are only recorded when a run finishes: in sticky mode, everything from the start of the run
+	to the commit is one step. Changes made in the Inkscape window after the last run are discarded by undoing.
+	"""
+	enabled: bool=True
+	max_bytes: int=256<<20
+	"""
+	The oldest states are dropped when the stored states take more memory than this (the newest one is always kept).
+	The size of a state is the size of its delta, except for the newest one.
+	"""
+	max_states: int=100
+	_undo: _StateStack=dataclasses.field(default_factory=_StateStack)
+	_redo: _StateStack=dataclasses.field(default_factory=_StateStack)
+
+	@property
+	def undo_count(self)->int:
+		return len(self._undo)
+
+	@property
+	def redo_count(self)->int:
+		return len(self._redo)
+
+	def record(self, before: bytes)->None:
+		"""
+		Record that a run changed the document, which was *before* (serialized) when the run started.
+		"""
+		if not self.enabled: return
+		self._undo.push(before)
+		self._redo=_StateStack()
+		self._trim()
+
+	def undo(self, current: bytes, steps: int)->tuple[bytes, int]:
+		"""
+		Go back *steps* steps (forward if negative) from the document *current*.
+		Return the resulting document and the number of steps actually done (limited by the recorded states).
+		"""
+		source, target=(self._undo, self._redo) if steps>=0 else (self._redo, self._undo)
+		done=min(abs(steps), len(source))
+		for _ in range(done):
+			target.push(current)
+			current=source.pop()
+		self._trim()
+		return current, done
+
+	def clear(self)->None:
+		self._undo=_StateStack()
+		self._redo=_StateStack()
+
+	def size(self)->int:
+		return self._undo.size()+self._redo.size()
+
+	def _trim(self)->None:
+		while len(self._undo)+len(self._redo)>self.max_states or self.size()>self.max_bytes:
+			# drop the state farthest from the current one, but keep the nearest one in each direction
+			stack=max(self._undo, self._redo, key=len)
+			if len(stack)<=1: break
+			stack.drop_oldest()
@@ -0,0 +1,297 @@
+"""
+Index of the elements of a document by id, class and tag, and of the bounding boxes of its shapes.
+
+Each session keeps a :class:`DocumentIndex`, which is available in IPython as ``svg_index``
+(and as :attr:`.daemon.ExtensionRun.index`)::
+
+	svg_index.by_id("circle12")
+	svg_index.with_id_prefix("label-")
+	svg_index.with_class("highlight")
+	svg_index.with_tag("circle")
+	svg_index.overlapping(0, 0, 100*mm, 50*mm)
+
+Each kind of index is built on its first query in each cell, and the later queries of the same cell
+use that snapshot: call :meth:`DocumentIndex.refresh` after modifying the document in the cell if needed.
+Bounding boxes are only recomputed for the shapes whose attributes or ancestors' transforms changed
+since the previous spatial query (even if the document was parsed again in between),
+and those of plain circles, ellipses and rectangles are computed in bulk with NumPy.
+
+The spatial queries need NumPy.
+"""
+from __future__	import annotations
+
+import bisect
+import functools
+import gc
+from contextlib import contextmanager
+from typing import Any, Generator, Optional, Tuple
+
+_svg_namespace="{http://www.w3.org/2000/svg}"
+
+_container_tags=frozenset(_svg_namespace+tag for tag in ("svg", "g", "a", "switch"))
+"""
+Elements whose children are rendered, and whose ``transform`` applies to them.
+"""
+
+_shape_tags=frozenset(_svg_namespace+tag for tag in (
+	"path", "rect", "circle", "ellipse", "line", "polyline", "polygon", "text", "image", "use"))
+"""
+Elements that get a bounding box. Elements that are not rendered (inside ``defs``, ``clipPath`` etc.) do not.
+"""
+
+_Matrix=Tuple[float, float, float, float, float, float]
+_identity: _Matrix=(1., 0., 0., 1., 0., 0.)
+
+def _compose(m: _Matrix, n: _Matrix)->_Matrix:
+	a, b, c, d, e, f=m
+	a1, b1, c1, d1, e1, f1=n
+	return (a*a1+c*b1, b*a1+d*b1, a*c1+c*d1, b*c1+d*d1, a*e1+c*f1+e, b*e1+d*f1+f)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_transform(value: Optional[str])->_Matrix:
+	if not value: return _identity
+	import inkex  # type: ignore
+	return tuple(inkex.Transform(value).to_hexad())  # type: ignore
+
+def _inkex_bounding_box(element, matrix: _Matrix)->Optional[tuple[float, float, float, float]]:
+	"""
+	The bounding box of *element* (without clipping) in the coordinates of the root, using inkex.
+	*matrix* is the composed transform of its parent.
+	"""
+	import inkex  # type: ignore
+	try:
+		shape_box=getattr(element, "shape_box", None) or element.bounding_box  # shape_box is new in inkex 1.1
+		box=shape_box(inkex.Transform(matrix))
+	except Exception:  # e.g. an unsupported element, or a use element that refers to nothing
+		return None
+	if box is None: return None
+	return (box.left, box.top, box.right, box.bottom)
+
+_simple_shape_attributes={
+	_svg_namespace+"circle": ("cx", "cy", "r", "r"),
+	_svg_namespace+"ellipse": ("cx", "cy", "rx", "ry"),
+	_svg_namespace+"rect": ("x", "y", "width", "height"),
+	}
+"""
+Shapes whose bounding box is computed by :func:`_bulk_bounding_boxes` when these attributes are plain numbers.
+"""
+
+def _simple_shape_values(element)->Optional[tuple[float, ...]]:
+	try:
+		return tuple(float(element.get(name, "0")) for name in _simple_shape_attributes[element.tag])
+	except ValueError:  # with a unit, a percentage, "auto" etc.
+		return None
+
+def _bulk_bounding_boxes(tags: list[str], values: list[tuple[float, ...]], matrices: list[_Matrix])->Any:
+	"""
+	Return the bounding boxes (an array of rows ``left, top, right, bottom``) of circles, ellipses and rectangles
+	with the given values of :data:`_simple_shape_attributes` and full transforms.
+	"""
+	import numpy as np
+	v=np.array(values, dtype=float).reshape(-1, 4)
+	a, b, c, d, e, f=np.array(matrices, dtype=float).reshape(-1, 6).T
+	is_rect=np.array([tag==_svg_namespace+"rect" for tag in tags], dtype=bool)
+	# center and half-sizes before the transform
+	cx=np.where(is_rect, v[:, 0]+v[:, 2]/2, v[:, 0])
+	cy=np.where(is_rect, v[:, 1]+v[:, 3]/2, v[:, 1])
+	hx=np.where(is_rect, v[:, 2]/2, v[:, 2])
+	hy=np.where(is_rect, v[:, 3]/2, v[:, 3])
+	x=a*cx+c*cy+e
+	y=b*cx+d*cy+f
+	# for a rectangle the extent is the sum of the absolute values, for an ellipse the norm
+	half_width=np.where(is_rect, np.abs(a*hx)+np.abs(c*hy), np.hypot(a*hx, c*hy))
+	half_height=np.where(is_rect, np.abs(b*hx)+np.abs(d*hy), np.hypot(b*hx, d*hy))
+	return np.stack([x-half_width, y-half_height, x+half_width, y+half_height], axis=1)
+
+@contextmanager
+def _gc_paused()->Generator:
+	"""
+	Computing the bounding boxes creates many objects, and the garbage collections it triggers
+	(which go through the whole document) would cost as much as the rest.
+	"""
+	enabled=gc.isenabled()
+	gc.disable()
+	try: yield
+	finally:
+		if enabled: gc.enable()
+
+class DocumentIndex:
+	"""
+	See the module documentation.
+	"""
+	def __init__(self, svg_root: Any=None)->None:
+		self.svg_root=svg_root
+		self._box_cache: dict[Any, Optional[tuple[float, float, float, float]]]={}
+		self._box_elements: list=[]
+		"""
+		Kept until the next spatial query even after :meth:`refresh`, so that the Python objects of the elements
+		(which inkex makes slow to create) are reused.
+		"""
+		self.refresh()
+
+	def reset(self, svg_root: Any)->None:
+		"""
+		Use the document *svg_root* from now on. Called when an extension run starts.
+		"""
+		self.svg_root=svg_root
+		self.refresh()
+
+	def refresh(self)->None:
+		"""
+		Forget the indexed state, so that the next queries see the current document. Called before each cell.
+
+		Each kind of query (by id, class, tag or position) builds its part of the index on its first use.
+		"""
+		self._by_id: Optional[dict[str, Any]]=None
+		self._sorted_ids: Optional[list[str]]=None
+		self._by_class: Optional[dict[str, list]]=None
+		self._by_tag: dict[str, list]={}
+		self._boxes: Any=None
+
+	def _root(self)->Any:
+		if self.svg_root is None: raise RuntimeError("The extension is not running")
+		return self.svg_root
+
+	def by_id(self, id: str)->Any:
+		"""
+		Return the element with this id, or None.
+		"""
+		if self._by_id is None:
+			by_id: dict[str, Any]={}
+			# element.get() of inkex is much slower than element.attrib.get()
+			for element in self._root().xpath("//*[@id]"):
+				by_id.setdefault(element.attrib["id"], element)
+			self._by_id=by_id
+		return self._by_id.get(id)
+
+	def with_id_prefix(self, prefix: str)->list:
+		"""
+		Return the elements whose id starts with *prefix*, sorted by id.
+		"""
+		self.by_id("")
+		assert self._by_id is not None
+		if self._sorted_ids is None:
+			self._sorted_ids=sorted(self._by_id)
+		result=[]
+		for id in self._sorted_ids[bisect.bisect_left(self._sorted_ids, prefix):]:
+			if not id.startswith(prefix): break
+			result.append(self._by_id[id])
+		return result
+
+	def with_class(self, name: str)->list:
+		"""
+		Return the elements that have the class *name*, in document order.
+		"""
+		if self._by_class is None:
+			by_class: dict[str, list]={}
+			for element in self._root().xpath("//*[@class]"):
+				for class_name in element.attrib["class"].split():
+					by_class.setdefault(class_name, []).append(element)
+			self._by_class=by_class
+		return list(self._by_class.get(name, ()))
+
+	def with_tag(self, tag: str)->list:
+		"""
+		Return the elements with this tag, in document order.
+		*tag* is either ``"circle"`` (in the SVG namespace), ``"sodipodi:namedview"`` or ``"{namespace}name"``.
+		"""
+		if not tag.startswith("{"):
+			if ":" in tag:
+				import inkex  # type: ignore
+				tag=inkex.addNS(tag)
+			else:
+				tag=_svg_namespace+tag
+		elements=self._by_tag.get(tag)
+		if elements is None:
+			elements=self._by_tag[tag]=list(self._root().iter(tag))
+		return list(elements)
+
+	def _shapes(self)->list[tuple[Any, _Matrix]]:
+		"""
+		Return ``(element, parent's composed transform)`` for each rendered shape, in document order.
+		"""
+		shapes: list[tuple[Any, _Matrix]]=[]
+		def visit(element, matrix: _Matrix)->None:
+			for child in element:
+				tag=child.tag
+				if tag in _shape_tags:
+					shapes.append((child, matrix))
+				elif tag in _container_tags:
+					transform=child.attrib.get("transform")
+					visit(child, _compose(matrix, _parse_transform(transform)) if transform else matrix)
+		visit(self._root(), _identity)
+		return shapes
+
+	@staticmethod
+	def _cache_key(element, matrix: _Matrix)->Any:
+		if element.tag==_svg_namespace+"use": return None  # depends on the element it refers to
+		if len(element) or element.tag==_svg_namespace+"text":
+			from lxml import etree
+			return (etree.tostring(element, with_tail=False), matrix)
+		return (element.tag, tuple(element.attrib.items()), matrix)
+
+	def bounding_boxes(self)->tuple[list, Any]:
+		"""
+		Return the list of the shapes that have a bounding box, in document order,
+		and a NumPy array with one row ``left, top, right, bottom`` for each of them, in the coordinates of ``svg_root``.
+
+		The bounding boxes are geometric (the stroke width is not included) and clipping is ignored.
+		"""
+		if self._boxes is None:
+			self._compute_boxes()
+		return self._box_elements, self._boxes
+
+	def _compute_boxes(self)->None:
+		import numpy as np
+		with _gc_paused():
+			self._compute_boxes_in(np)
+
+	def _compute_boxes_in(self, np)->None:
+		shapes=self._shapes()
+		old_cache=self._box_cache
+		cache: dict[Any, Optional[tuple[float, float, float, float]]]={}
+		keys=[self._cache_key(element, matrix) for element, matrix in shapes]
+		boxes: list[Optional[tuple[float, float, float, float]]]=[None]*len(shapes)
+		bulk_indices: list[int]=[]
+		bulk_tags: list[str]=[]
+		bulk_values: list[tuple[float, ...]]=[]
+		bulk_matrices: list[_Matrix]=[]
+		for i, ((element, matrix), key) in enumerate(zip(shapes, keys)):
+			if key is not None and key in old_cache:
+				boxes[i]=cache[key]=old_cache[key]
+				continue
+			values=_simple_shape_values(element) if element.tag in _simple_shape_attributes else None
+			if values is None:
+				boxes[i]=_inkex_bounding_box(element, matrix)
+				if key is not None: cache[key]=boxes[i]
+			else:
+				bulk_indices.append(i)
+				bulk_tags.append(element.tag)
+				bulk_values.append(values)
+				bulk_matrices.append(_compose(matrix, _parse_transform(element.attrib.get("transform"))))
+		if bulk_indices:
+			for i, box in zip(bulk_indices, _bulk_bounding_boxes(bulk_tags, bulk_values, bulk_matrices).tolist()):
+				boxes[i]=cache[keys[i]]=tuple(box)
+		# only keep the current shapes, so that the cache does not grow across the runs
+		self._box_cache=cache
+		self._box_elements=[element for (element, _matrix), box in zip(shapes, boxes) if box is not None]
+		self._boxes=np.array([box for box in boxes if box is not None], dtype=float).reshape(-1, 4)
+
+	def overlapping(self, left: float, top: float, right: float, bottom: float)->list:
+		"""
+		Return the shapes whose bounding box intersects the rectangle, in document order.
+		See :meth:`bounding_boxes`.
+		"""
+		import numpy as np
+		elements, boxes=self.bounding_boxes()
+		mask=(boxes[:, 0]<=right)&(boxes[:, 2]>=left)&(boxes[:, 1]<=bottom)&(boxes[:, 3]>=top)
+		return [elements[i] for i in np.flatnonzero(mask)]
+
+	def within(self, left: float, top: float, right: float, bottom: float)->list:
+		"""
+		Return the shapes whose bounding box is inside the rectangle, in document order.
+		"""
+		import numpy as np
+		elements, boxes=self.bounding_boxes()
+		mask=(boxes[:, 0]>=left)&(boxes[:, 2]<=right)&(boxes[:, 1]>=top)&(boxes[:, 3]<=bottom)
+		return [elements[i] for i in np.flatnonzero(mask)]
@@ -1,52 +1,130 @@
 from __future__	import annotations
 
-from typing import Any
+from typing import Any, Callable, Optional
+import re
 import subprocess
 import time
 
-from . import daemon
 
+xdotool_executable: str="xdotool"
+
+xprop_executable: str="xprop"
+"""
+Only used to find the extension window of a given Inkscape window, when several are open.
+"""
+
+_window_id_cache: dict[str, int]={}
+"""
+Maps a window name pattern (or a key made from several patterns) to the id of the unique window found.
+
+The cached id is only re-checked when an action on it fails, so that in the common case
+each action costs a single xdotool process.
+"""
+
+def clear_window_id_cache()->None:
+	_window_id_cache.clear()
 
 def _focus_window(win: int)->None:
-	subprocess.run(["xdotool", "windowfocus", str(win)], check=True)
+	subprocess.run([xdotool_executable, "windowfocus", str(win)], check=True)
 
 def _search_windows(s: str)->list[int]:
 	# older versions of xdotool has a bug https://github.com/jordansissel/xdotool/pull/335
 	# we no longer need the bug fix now, so the fix is removed
-	process=subprocess.run(["xdotool", "search", "--name", s], stdout=subprocess.PIPE, check=True)
+	process=subprocess.run([xdotool_executable, "search", "--name", s], stdout=subprocess.PIPE, check=True)
 	return [int(x) for x in process.stdout.split()]
 
+def _find_unique_window(pattern: str, not_found_message: str, multiple_message: str)->int:
+	try:
+		return _window_id_cache[pattern]
+	except KeyError:
+		pass
+	l=_search_windows(pattern)
+	if len(l)==0: raise Exception(not_found_message)
+	if len(l)>=2: raise Exception(multiple_message)
+	_window_id_cache[pattern]=l[0]
+	return l[0]
+
+def _transient_for(win: int)->Optional[int]:
+	"""
+	Return the window that *win* is a dialog of, or None.
+	"""
+	process=subprocess.run([xprop_executable, "-id", str(win), "WM_TRANSIENT_FOR"], stdout=subprocess.PIPE, check=True)
+	# the output looks like: WM_TRANSIENT_FOR(WINDOW): window id # 0x3a00007
+	match=re.search(rb"# (0x[0-9a-fA-F]+)", process.stdout)
+	return int(match[1], 16) if match else None
+
+def _window_exists(win: int)->bool:
+	return subprocess.run([xdotool_executable, "getwindowname", str(win)],
+			stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode==0
+
+def _with_window(key: str, find: Callable[[], int], action: Callable[[int], None])->None:
+	"""
+	Run *action* on the window returned by *find*, which caches the window id in :data:`_window_id_cache` under *key*.
+
+	If the action fails on a cached window id that no longer exists, the window is searched again, and the action
+	is retried once if the window id changed (for example the extension dialog was reopened).
+
+	The action is a chain of xdotool commands, and the exit code does not tell which one failed.
+	If the cached window still exists, the failure may have happened after the keys were sent
+	(e.g. when focusing back the previous window), so the action is not retried, otherwise the keys would be pressed twice.
+	"""
+	cached=key in _window_id_cache
+	win=find()
+	try:
+		action(win)
+	except subprocess.CalledProcessError:
+		_window_id_cache.pop(key, None)
+		if not cached or _window_exists(win): raise
+		new_win=find()
+		if new_win==win: raise
+		action(new_win)
+
 def _execute_in_window(win: int, cmd: list[str])->None:
+	"""
+	Execute xdotool commands *cmd* (which will be chained), by switching focus to that window, execute the commands, then switch back.
+
+	Everything is done in a single xdotool process: ``getwindowfocus`` saves the old focused window to the window stack as ``%1``.
+	"""
+	process=subprocess.run(
+			[xdotool_executable, "getwindowfocus", "windowfocus", str(win)]+cmd+["windowfocus", "%1"],
+			stdout=subprocess.PIPE)
+	if process.returncode!=0:
+		# whatever error that might happen, must try to switch to old_focused_window
+		old_focused_window=process.stdout.split()
+		if old_focused_window:
+			subprocess.run([xdotool_executable, "windowfocus", old_focused_window[0]])
+		raise subprocess.CalledProcessError(process.returncode, process.args, process.stdout)
+
+def _send_to_window(win: int, keys: list[bytes])->None:
 	"""
 	Send a sequence of keys of a window, by switching focus to that window, send the keys, then switch back.
 	win and keys are like python-libxdo's format.
 	"""
-	old_focused_window=int(subprocess.run(["xdotool", "getwindowfocus"], stdout=subprocess.PIPE, check=True).stdout)
-	try:
-		_focus_window(win)
-		subprocess.run(cmd, check=True)
-	finally: # whatever error that might happen, must try to switch to old_focused_window
-		_focus_window(old_focused_window)
+	_execute_in_window(win, ["key", "--clearmodifiers", "--window", str(win)]+[key.decode('u8') for key in keys])
 
-def _send_to_window(win: int, keys: list[bytes])->None:
-	_execute_in_window(win, ["xdotool", "key", "--clearmodifiers", "--window", str(win)]+[key.decode('u8') for key in keys])
+_main_window_pattern=" - Inkscape$"
+_main_window_messages=("Inkscape window cannot be found.", "Multiple Inkscape windows visible, cannot determine which one is focused.")
 
-def main_inkscape_window_id()->int:
-	l=_search_windows(" - Inkscape$")
-	if len(l)==0: raise Exception("Inkscape window cannot be found.")
-	if len(l)>=2: raise Exception("Multiple Inkscape windows visible, cannot determine which one is focused.")
-	return l[0]
+def main_inkscape_window_id(main_window_pattern: Optional[str]=None)->int:
+	"""
+	Return the id of the main Inkscape window whose title matches *main_window_pattern*,
+	or of the only Inkscape window if it is None.
+	"""
+	if main_window_pattern is None:
+		return _find_unique_window(_main_window_pattern, *_main_window_messages)
+	return _find_unique_window(main_window_pattern,
+			f"Inkscape window matching {main_window_pattern!r} cannot be found.",
+			f"Multiple Inkscape windows match {main_window_pattern!r}.")
 
-def _inkscape_press_keys_raw(keys: str|bytes|list[str]|list[bytes])->None:
+def _inkscape_press_keys_raw(keys: str|bytes|list[str]|list[bytes], main_window_pattern: Optional[str]=None)->None:
 	if isinstance(keys, (str, bytes)): keys1=[keys]
+	else: keys1=keys
 	keys=[key.decode('u8') if isinstance(key, bytes) else key for key in keys1]
-	win=main_inkscape_window_id()
 	# we don't use _send_to_window here because at this point the "extension running" dialog is still visible for a brief moment
 	# and for some reason get_focused_window() or get_focused_window_sane() will raise an XError
 	# we don't really need to switch focus back to the previous window anyway because later on _pre_run_cell() will do something
-	_focus_window(win)
-	for key in keys:
-		subprocess.run(["xdotool", "key", "--window", str(win)]+keys, check=True)
+	_with_window(main_window_pattern or _main_window_pattern, lambda: main_inkscape_window_id(main_window_pattern), lambda win:
+			subprocess.run([xdotool_executable, "windowfocus", str(win), "key", "--window", str(win)]+keys, check=True))
 
 def inkscape_press_keys(keys: str|bytes|list[str]|list[bytes])->None:
 	"""
@@ -57,16 +135,38 @@ def inkscape_press_keys(keys: str|bytes|list[str]|list[bytes])->None:
 
 	The format is the same as ``xdotool``.
 	Importantly, the string is case-sensitive -- using ``Ctrl+Z`` instead of ``Ctrl+z`` will not work!
+
+	The keys are sent to the Inkscape window of the current session, see :class:`.daemon.Session`.
 	"""
+	from . import daemon
 	with daemon.pause_extension_run():
-		_inkscape_press_keys_raw(keys)
+		_inkscape_press_keys_raw(keys, daemon.current_session().window_pattern)
+
+_extension_window_pattern="^Inkscape Scripting$"
 
-def click_extension_window_button()->None:
+def _extension_window_id(main_window_pattern: Optional[str])->int:
+	if main_window_pattern is None:
+		return _find_unique_window(_extension_window_pattern,
+				"Extension window cannot be found. Please read the documentation.",
+				"Multiple windows found with the extension's name? Use a session for each Inkscape window.")
+	key=f"{_extension_window_pattern} of {main_window_pattern}"
+	try:
+		return _window_id_cache[key]
+	except KeyError:
+		pass
+	main_window=main_inkscape_window_id(main_window_pattern)
+	for win in _search_windows(_extension_window_pattern):
+		if _transient_for(win)==main_window:
+			_window_id_cache[key]=win
+			return win
+	raise Exception(f"Extension window of the Inkscape window matching {main_window_pattern!r} cannot be found.")
+
+def click_extension_window_button(main_window_pattern: Optional[str]=None)->None:
 	"""
 	Switch to the window with name "Inkscape Scripting" and press "Return" to (hopefully) click the button.
-	"""
-	l=_search_windows("^Inkscape Scripting$")
-	if len(l)==0: raise Exception("Extension window cannot be found. Please read the documentation.")
-	if len(l)>=2: raise Exception("Multiple windows found with the extension's name?")
-	_execute_in_window(l[0], ["xdotool", "keyup", "--clearmodifiers", "Return", "key", "--clearmodifiers", "Return"])
 
+	If *main_window_pattern* is given, use the extension window of the Inkscape window whose title matches it.
+	"""
+	key=_extension_window_pattern if main_window_pattern is None else f"{_extension_window_pattern} of {main_window_pattern}"
+	_with_window(key, lambda: _extension_window_id(main_window_pattern),
+			lambda win: _execute_in_window(win, ["keyup", "--clearmodifiers", "Return", "key", "--clearmodifiers", "Return"]))
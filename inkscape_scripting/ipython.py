@@ -8,10 +8,22 @@ from traitlets.config import Config
 import typing
 from typing import Any, Optional
 import ast
+import atexit
+import shlex
+import sys
+import threading
+import time
+import traceback
 
 # global get_ipython() instance
 _ip=typing.cast(IPython.core.interactiveshell.InteractiveShell, None)
-from . import daemon
+from . import timing
+from . import warmup
+from . import cell_classifier
+from . import macro
+from .cell_classifier import cell_needs_document
+if typing.TYPE_CHECKING:
+	from . import daemon  # imported lazily, see .warmup
 
 class _ASTTransformerDeleteEverything:
 	def visit(self, node)->Any:
@@ -30,14 +42,59 @@ def set_connect_to_client(enable_connect_to_client: bool)->None:
 	global _enable_connect_to_client
 	_enable_connect_to_client=enable_connect_to_client
 
+_skip_local_cells: bool=True
+
+def set_skip_local_cells(skip_local_cells: bool)->None:
+	"""
+	By default, cells that provably do not touch the document (e.g. ``print(1+1)``) are executed
+	without running the extension. Execute `set_skip_local_cells(False)` to always run the extension.
+
+	For a single cell, a line ``# inkscape: document`` or ``# inkscape: local`` overrides the decision.
+	See :mod:`inkscape_scripting.cell_classifier`.
+	"""
+	global _skip_local_cells
+	_skip_local_cells=skip_local_cells
+
 _units_are_setup: bool=False
 
+_unit_names=['mm', 'cm', 'pt', 'px', 'inch']
+
+_cell_start_time: float=0.
+_user_code_start_time: float=0.
+
 _ipython_extension_run_instance: Optional[daemon.ExtensionRun]=None
 """
 Stores the instance of ExtensionRun that is started by IPython implicit extension run.
 
 Note that if the user runs an extension manually (with ExtensionRun().__enter__() for example)
-and it sets global variable daemon.extension_run_instance, we must not stop it
+and it sets the session's extension_run_instance, we must not stop it
+"""
+
+_recorder: Optional[macro.Recorder]=None
+"""
+If set, the cells are recorded, see :func:`_inkrecord_magic`.
+"""
+
+_cell_user_args: Any=None
+"""
+The ``user_args`` of the extension run of the current cell, for the recorder.
+"""
+
+_sticky: bool=False
+"""
+If True, the extension run is kept open across cells, see :func:`_inksticky_magic`.
+"""
+
+_sticky_idle_timeout: Optional[float]=30.
+"""
+Number of seconds without any cell after which the sticky run is committed. None means never.
+"""
+
+_sticky_timer: Optional[threading.Timer]=None
+
+_sticky_lock=threading.Lock()
+"""
+Protects :data:`_sticky_timer`, so that the idle timer cannot commit the run while a cell starts using it.
 """
 
 def _pre_run_cell(info)->None:
@@ -48,28 +105,40 @@ def _pre_run_cell(info)->None:
 	Then after getting the data, we send the data to the code in the cell
 	After the code in the cell is done, we return the result to the client to print it on client's stdout
 	"""
-	if not _enable_connect_to_client: return
-	global _ip, _units_are_setup, _ipython_extension_run_instance
+	global _ip, _units_are_setup, _ipython_extension_run_instance, _cell_start_time, _user_code_start_time, _cell_user_args
+	_cell_start_time=time.perf_counter()
+	_cancel_idle_timer()
+	if _ipython_extension_run_instance is not None:
+		# sticky mode: the run of the previous cell is still open, and the namespace still refers to its document
+		_user_code_start_time=_cell_start_time
+		_cell_user_args=_ipython_extension_run_instance.user_args
+		typing.cast("daemon.Session", _ipython_extension_run_instance.session).document_index.refresh()
+		return
+	source=_transform_cell(info.raw_cell)
+	warmup.prepare_cell(source, _ip)
+	if not _enable_connect_to_client or _skip_local_cells and not cell_needs_document(
+			info.raw_cell, _ip.user_ns, source,
+			extra_document_names=() if _units_are_setup else _unit_names):
+		# the cell runs without the extension, and may modify the document objects left in the namespace
+		# (forced by "# inkscape: local", or misclassified), which are the cached document
+		# (if the warm-up is not done, there cannot be any cached document yet)
+		if warmup.is_done():
+			from . import daemon
+			daemon.current_session().document_cache.invalidate()
+		return
+	from . import daemon
+	if _pause_hook not in daemon.pause_hooks: daemon.pause_hooks.append(_pause_hook)
 	try:
 		assert _ipython_extension_run_instance is None
 		extension_run=_ipython_extension_run_instance=daemon.ExtensionRun().__enter__()
-		_ip.user_ns['svg_root'] =extension_run.svg_root
-		_ip.user_ns['guides']   =extension_run.guides
-		_ip.user_ns['user_args']=extension_run.user_args
-		_ip.user_ns['canvas']   =extension_run.canvas
-		_ip.user_ns['metadata'] =extension_run.metadata
+		_user_code_start_time=time.perf_counter()
+		timing.record("enter", _user_code_start_time-_cell_start_time)
+		_cell_user_args=extension_run.user_args
+		_set_namespace_from_run(extension_run)
 
 		if not _units_are_setup:
 			_units_are_setup=True
-			try:
-				# Inkscape 1.2+
-				convert_unit = extension_run.svg_root.viewport_to_unit
-			except AttributeError:
-				# Inkscape 1.0 and 1.1
-				convert_unit = extension_run.svg_root.unittouu
-			for unit in ['mm', 'cm', 'pt', 'px']:
-				_ip.user_ns[unit] = convert_unit('1' + unit)
-			_ip.user_ns['inch'] = convert_unit('1in')  # "in" is a keyword.
+			_ip.user_ns.update(daemon.unit_values(extension_run.svg_root))
 
 	except:
 		# if an error happen, the cell will still be executed.
@@ -78,25 +147,356 @@ def _pre_run_cell(info)->None:
 		_ip.ast_transformers.append(_ASTTransformerDeleteEverything())
 		raise
 
+def _transform_cell(raw_cell: str)->Optional[str]:
+	try:
+		return _ip.transform_cell(raw_cell)
+	except Exception:
+		return None  # let IPython report the error
+
 def _post_run_cell(result)->None:
 	"""
 	https://ipython.readthedocs.io/en/stable/config/callbacks.html#post-run-cell
 	"""
+	if _ipython_extension_run_instance is None:
+		timing.finish_cell()
+		warmup.cell_finished()
+		_record_cell(result, False)
+		return
+	exit_start_time=time.perf_counter()
+	timing.record("cell", exit_start_time-_user_code_start_time)
+	try:
+		if _sticky:
+			_sync_run_from_namespace(_ipython_extension_run_instance)
+			_start_idle_timer()
+		else:
+			_finish_ipython_run()
+	finally:
+		end_time=time.perf_counter()
+		timing.record("exit", end_time-exit_start_time)
+		timing.record("total", end_time-_cell_start_time)
+		timing.finish_cell()
+		warmup.cell_finished()
+	_record_cell(result, True)
+
+def _record_cell(result, used_document: bool)->None:
+	if _recorder is None or not result.success: return
+	source=_transform_cell(result.info.raw_cell)
+	if source is None or cell_classifier.calls_local_magic(source): return
+	_recorder.add(macro.MacroStep(source, _cell_user_args if used_document else None, time.perf_counter()-_cell_start_time))
+
+def _set_namespace_from_run(extension_run: daemon.ExtensionRun)->None:
+	_ip.user_ns['svg_root'] =extension_run.svg_root
+	_ip.user_ns['guides']   =extension_run.guides
+	_ip.user_ns['user_args']=extension_run.user_args
+	_ip.user_ns['canvas']   =extension_run.canvas
+	_ip.user_ns['metadata'] =extension_run.metadata
+	_ip.user_ns['svg_index']=extension_run.index
+
+def _pause_hook(extension_run: daemon.ExtensionRun, new_run: Optional[daemon.ExtensionRun])->None:
+	"""
+	Registered in :data:`.daemon.pause_hooks`: when the run of the cell (or the sticky run) is paused,
+	finish it with the changes made through the namespace, then continue with the new run and its objects.
+	"""
+	global _ipython_extension_run_instance
+	if extension_run is not _ipython_extension_run_instance: return
+	if new_run is None:
+		_sync_run_from_namespace(extension_run)
+	else:
+		_ipython_extension_run_instance=new_run
+		_set_namespace_from_run(new_run)
+
+def _sync_run_from_namespace(extension_run: daemon.ExtensionRun)->None:
+	from . import geometry
+	geometry.flush(extension_run.svg_root)
+	extension_run.svg_root =_ip.user_ns['svg_root']
+	extension_run.guides   =_ip.user_ns['guides']
+	extension_run.user_args=_ip.user_ns['user_args']
+	extension_run.canvas   =_ip.user_ns['canvas']
+	extension_run.metadata =_ip.user_ns['metadata']
+
+def _finish_ipython_run()->None:
+	"""
+	Exit the run started by :func:`_pre_run_cell`, sending the document back to Inkscape.
+	"""
 	global _ipython_extension_run_instance
 	extension_run=_ipython_extension_run_instance
-	if extension_run is None:
-		return
+	assert extension_run is not None
 	_ipython_extension_run_instance=None
-	global _ip
 	try:
-		extension_run.svg_root =_ip.user_ns['svg_root']
-		extension_run.guides   =_ip.user_ns['guides']
-		extension_run.user_args=_ip.user_ns['user_args']
-		extension_run.canvas   =_ip.user_ns['canvas']
-		extension_run.metadata =_ip.user_ns['metadata']
+		_sync_run_from_namespace(extension_run)
 	finally:
 		extension_run.__exit__(None, None, None)
 
+def _commit_sticky_run(reason: str)->None:
+	if _ipython_extension_run_instance is None: return
+	_finish_ipython_run()
+	print(f"Committed the changes to Inkscape ({reason}), the Inkscape window is no longer blocked.", file=sys.stderr)
+	app=getattr(getattr(_ip, "pt_app", None), "app", None)
+	if app is not None: app.invalidate()  # redraw the prompt
+
+def _start_idle_timer()->None:
+	global _sticky_timer
+	if _sticky_idle_timeout is None: return
+	with _sticky_lock:
+		_sticky_timer=threading.Timer(_sticky_idle_timeout, _idle_commit)
+		_sticky_timer.daemon=True
+		_sticky_timer.start()
+
+def _cancel_idle_timer()->None:
+	global _sticky_timer
+	with _sticky_lock:
+		if _sticky_timer is not None:
+			_sticky_timer.cancel()
+			_sticky_timer=None
+
+def _idle_commit()->None:
+	global _sticky_timer
+	with _sticky_lock:
+		if _sticky_timer is not threading.current_thread(): return  # cancelled by a new cell
+		_sticky_timer=None
+		try:
+			_commit_sticky_run(f"idle for {_sticky_idle_timeout:g} seconds")
+		except Exception:
+			traceback.print_exc()
+
+def _flush_at_exit()->None:
+	_cancel_idle_timer()
+	_commit_sticky_run("exiting")
+
+class _BlockedPrompts:
+	"""
+	Wraps IPython's prompts to show that the Inkscape window is blocked while a sticky run is open.
+	"""
+	def __init__(self, prompts: Any)->None:
+		self._prompts=prompts
+	def __getattr__(self, name: str)->Any:
+		return getattr(self._prompts, name)
+	def in_prompt_tokens(self, *args, **kwargs)->list:
+		tokens=list(self._prompts.in_prompt_tokens(*args, **kwargs))
+		if _ipython_extension_run_instance is None or not _sticky: return tokens
+		from pygments.token import Token
+		return [(Token.Prompt, "[Inkscape blocked] ")]+tokens
+
+def _inksticky_magic(line: str)->None:
+	"""
+	Keep a single extension run open across cells, so that each cell only costs running the code
+	(instead of clicking the button, loading and saving the document).
+
+	While the run is open, the Inkscape window is blocked, and the prompt starts with ``[Inkscape blocked]``.
+	The changes are sent to Inkscape when the run is committed.
+
+	Usage::
+
+		%inksticky                 # show the state
+		%inksticky on [<seconds>]  # enable; commit after <seconds> without any cell (default 30, 0 means never)
+		%inksticky flush           # commit now; the next cell that uses the document starts a new run
+		%inksticky off             # commit and disable
+	"""
+	global _sticky, _sticky_idle_timeout
+	command, _, argument=line.strip().partition(" ")
+	if command=="on":
+		if argument.strip():
+			timeout=float(argument)
+			_sticky_idle_timeout=timeout if timeout>0 else None
+		_sticky=True
+		prompts=getattr(_ip, "prompts", None)
+		if prompts is not None and not isinstance(prompts, _BlockedPrompts):
+			_ip.prompts=_BlockedPrompts(prompts)
+		when="" if _sticky_idle_timeout is None else f", or after {_sticky_idle_timeout:g} seconds without any cell"
+		print(f"Sticky mode: the Inkscape window stays blocked until `%inksticky flush` or `%inksticky off`{when}.")
+	elif command=="flush":
+		_commit_sticky_run("flush")
+	elif command=="off":
+		_sticky=False
+		_commit_sticky_run("sticky mode off")
+	elif command=="":
+		state="on" if _sticky else "off"
+		run="open, the Inkscape window is blocked" if _ipython_extension_run_instance is not None else "not open"
+		print(f"Sticky mode is {state}, the run is {run}.")
+	else:
+		raise ValueError(f"Unknown command: {command}")
+
+def _inkstats_magic(line: str)->None:
+	"""
+	Show the startup times (see :mod:`inkscape_scripting.warmup`) and per-phase latency statistics of the extension runs.
+
+	Usage::
+
+		%inkstats             # show the statistics
+		%inkstats on          # enable the instrumentation (disabled by default)
+		%inkstats off         # disable the instrumentation
+		%inkstats reset       # clear the statistics
+		%inkstats log <path>  # also append one JSON line per cell to <path>; without <path>, stop logging
+
+	..seealso:: :mod:`inkscape_scripting.timing`.
+	"""
+	command, _, argument=line.strip().partition(" ")
+	if command=="on": timing.enabled=True
+	elif command=="off": timing.enabled=False
+	elif command=="reset": timing.reset()
+	elif command=="log": timing.log_path=argument.strip() or None
+	elif command=="":
+		print(warmup.summary())
+		if not timing.enabled: print("Instrumentation is disabled, execute `%inkstats on` to enable it.")
+		print(timing.summary())
+	else:
+		raise ValueError(f"Unknown command: {command}")
+
+def _inksession_magic(line: str)->None:
+	"""
+	Switch between sessions, one for each Inkscape window. Each session has its own namespace.
+
+	Usage::
+
+		%inksession                                # list the sessions
+		%inksession <name>                         # switch to session <name>, creating it if needed
+		%inksession <name> <pattern>               # ... that uses the Inkscape window whose title matches <pattern>
+		%inksession --own-address <name> [<pattern>]
+			# the clients of the session connect to their own address,
+			# start Inkscape with the environment variable INKSCAPE_SCRIPTING_SESSION=<name>
+
+	For example::
+
+		%inksession drawing ^drawing.svg - Inkscape$
+
+	..seealso:: :class:`.daemon.Session`.
+	"""
+	global _units_are_setup
+	warmup.prepare_cell(None, _ip, force=True)
+	from . import daemon
+	line=line.strip()
+	own_address: Optional[bool]=None
+	if line.startswith("--own-address"):
+		own_address=True
+		line=line[len("--own-address"):].strip()
+	if not line:
+		for session in daemon.sessions.values():
+			marker="*" if session is daemon.current_session() else " "
+			print(f"{marker} {session.name:<16}{session.window_pattern or '(the only window)':<40}{session.connection_address}")
+		return
+	name, _, window_pattern=line.partition(" ")
+	if _ipython_extension_run_instance is not None:
+		if not _sticky: raise RuntimeError("Cannot switch the session in a cell that uses the document")
+		_commit_sticky_run("switching the session")
+	old_session=daemon.current_session()
+	new_session=daemon.use_session(name, window_pattern.strip() or None, own_address)
+	if new_session is old_session: return
+	old_session.namespace=dict(_ip.user_ns)
+	namespace=new_session.namespace
+	if namespace is None:
+		namespace=dict(_initial_names)
+		namespace.update((key, _ip.user_ns[key]) for key in _ip.user_ns_hidden if key in _ip.user_ns)
+		namespace.update(warmup.namespace_names())
+	new_session.namespace=None
+	_ip.user_ns.clear()
+	_ip.user_ns.update(namespace)
+	_units_are_setup=all(unit in _ip.user_ns for unit in _unit_names)
+
+def _prepare_document_magic(action: str)->None:
+	"""
+	Prepare for a magic that runs the extension by itself: commit the sticky run if there is one.
+	"""
+	warmup.prepare_cell(None, _ip, force=True)
+	if _ipython_extension_run_instance is not None:
+		if not _sticky: raise RuntimeError(f"Cannot {action} in a cell that uses the document")
+		_commit_sticky_run(action)
+
+def _report_undo(done: int, steps: int)->None:
+	from . import daemon
+	history=daemon.current_session().history
+	action="Undid" if steps>=0 else "Redid"
+	print(f"{action} {done} step{'s'*(done!=1)} ({history.undo_count} to undo, {history.redo_count} to redo).")
+
+def _inkundo_magic(line: str)->None:
+	"""
+	Restore the document to its state before the last cells that changed it, in one extension run
+	(instead of pressing Ctrl+Z in Inkscape). Changes made in the Inkscape window since the last cell are discarded.
+
+	Usage::
+
+		%inkundo        # undo the last cell
+		%inkundo <n>    # undo the last <n> cells; a negative <n> redoes
+		%inkundo list   # show the number of recorded states and their memory usage
+		%inkundo clear  # forget the recorded states
+
+	..seealso:: :class:`.history.DocumentHistory`, :func:`.daemon.undo`.
+	"""
+	argument=line.strip()
+	if argument in ("list", "clear"):
+		if not warmup.is_done():
+			print("Nothing recorded yet.")
+			return
+		from . import daemon
+		history=daemon.current_session().history
+		if argument=="clear": history.clear()
+		print(f"{history.undo_count} to undo, {history.redo_count} to redo, {history.size()/2**20:.1f} MiB.")
+		return
+	steps=int(argument) if argument else 1
+	_prepare_document_magic("undo")
+	from . import daemon
+	_report_undo(daemon.undo(steps), steps)
+
+def _inkrevert_magic(line: str)->None:
+	"""
+	Restore the document to the oldest recorded state, see ``%inkundo``.
+	"""
+	_prepare_document_magic("revert")
+	from . import daemon
+	steps=daemon.current_session().history.undo_count
+	_report_undo(daemon.undo(steps), steps)
+
+def _inkrecord_magic(line: str)->None:
+	"""
+	Record the cells into a macro file, to be replayed by ``%inkreplay``. See :mod:`inkscape_scripting.macro`.
+
+	Usage::
+
+		%inkrecord                # show the state
+		%inkrecord start <path>   # append each successful cell from now on to <path>
+		%inkrecord stop
+	"""
+	global _recorder
+	command, _, argument=line.strip().partition(" ")
+	if command=="start":
+		if not argument.strip(): raise ValueError("Usage: %inkrecord start <path>")
+		if _recorder is not None: _recorder.close()
+		_recorder=macro.Recorder(argument.strip())
+		print(f"Recording the cells to {_recorder.path}.")
+	elif command=="stop":
+		if _recorder is None: return
+		_recorder.close()
+		print(f"Recorded {_recorder.count} cell{'s'*(_recorder.count!=1)} to {_recorder.path}.")
+		_recorder=None
+	elif command=="":
+		print("Not recording." if _recorder is None else f"Recording to {_recorder.path}, {_recorder.count} cells so far.")
+	else:
+		raise ValueError(f"Unknown command: {command}")
+
+def _inkreplay_magic(line: str)->None:
+	"""
+	Replay a macro recorded by ``%inkrecord``, in one extension run. See :mod:`inkscape_scripting.macro`.
+
+	Usage::
+
+		%inkreplay <path>                    # on the document in Inkscape, in the namespace of this session
+		%inkreplay <path> <input> <output>   # on the file <input> without Inkscape, writing the result to <output>
+	"""
+	arguments=shlex.split(line)
+	if len(arguments) not in (1, 3): raise ValueError("Usage: %inkreplay <path> [<input> <output>]")
+	recorded=macro.load(arguments[0])
+	if len(arguments)==3:
+		warmup.prepare_cell(None, _ip, force=True)
+		print(macro.replay_offline(recorded, arguments[1], arguments[2]))
+		return
+	_prepare_document_magic("replay a macro")
+	print(macro.replay(recorded, namespace=_ip.user_ns))
+
+_initial_names: dict[str, Any]={}
+"""
+The names such as ``__name__`` and ``__builtins__`` that IPython puts in the fresh namespace,
+taken at :func:`setup` to build the namespace of a new session.
+"""
+
 def setup(ip)->None:
 	"""
 	This function is called at the beginning to setup necessary things.
@@ -106,19 +506,35 @@ def setup(ip)->None:
 	if _ip is ip: return
 	assert _ip is None
 	_ip=ip
+	_initial_names.update((key, value) for key, value in ip.user_ns.items() if key.startswith("__") and key.endswith("__"))
 	ip.events.register("pre_run_cell", _pre_run_cell)
 	ip.events.register("post_run_cell", _post_run_cell)
+	ip.register_magic_function(_inkstats_magic, magic_kind="line", magic_name="inkstats")
+	cell_classifier.local_magics.add("inkstats")
+	ip.register_magic_function(_inksession_magic, magic_kind="line", magic_name="inksession")
+	cell_classifier.local_magics.add("inksession")
+	ip.register_magic_function(_inksticky_magic, magic_kind="line", magic_name="inksticky")
+	cell_classifier.local_magics.add("inksticky")
+	ip.register_magic_function(_inkundo_magic, magic_kind="line", magic_name="inkundo")
+	cell_classifier.local_magics.add("inkundo")
+	ip.register_magic_function(_inkrevert_magic, magic_kind="line", magic_name="inkrevert")
+	cell_classifier.local_magics.add("inkrevert")
+	ip.register_magic_function(_inkrecord_magic, magic_kind="line", magic_name="inkrecord")
+	cell_classifier.local_magics.add("inkrecord")
+	ip.register_magic_function(_inkreplay_magic, magic_kind="line", magic_name="inkreplay")
+	cell_classifier.local_magics.add("inkreplay")
+	atexit.register(_flush_at_exit)
 
-	from inkscape_scripting.object_repr import formatter_setup
-	formatter_setup(ip)
+	# inkex, SimpInkScr and the pretty-printing are loaded in the background, see .warmup
+	warmup.start()
+	warmup.mark_prompt()
 
 def main()->None:
+	warmup.start()  # overlap the warm-up with the startup of IPython
 	c = Config()
 	c.InteractiveShellApp.exec_lines = [
 		'import inkscape_scripting.ipython;' +
-		'inkscape_scripting.ipython.setup(get_ipython());' +
-		'from simpinkscr import *;' +
-		'from inkscape_scripting.ipython_export import *;'
+		'inkscape_scripting.ipython.setup(get_ipython());'
 	]  # for some reason this must be kept ≤ 2 lines otherwise _pre_run_cell will be triggered at the start
 	IPython.start_ipython(config=c)
 
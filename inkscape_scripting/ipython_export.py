@@ -1,6 +1,9 @@
 """
 Contains everything that should be exported to the IPython environment.
 """
-from .ipython import set_connect_to_client
+from .ipython import set_connect_to_client, set_skip_local_cells
 from .daemon import pause_extension_run
 from .interact import inkscape_press_keys
+from .object_repr import more
+from .bulk import circles, ellipses, rects, lines, ShapeArray
+from .geometry import PathArray
@@ -0,0 +1,151 @@
+"""
+Record the cells run in the daemon, and replay them later in one extension run.
+
+In IPython::
+
+	%inkrecord start drawing.macro           # append each successful cell from now on to drawing.macro
+	...
+	%inkrecord stop
+	%inkreplay drawing.macro                 # run all the recorded cells in one extension run
+	%inkreplay drawing.macro in.svg out.svg  # ... on a saved file, without Inkscape
+
+or from Python::
+
+	from inkscape_scripting import macro
+	result=macro.replay_offline(macro.load("drawing.macro"), "in.svg", "out.svg")
+	print(result)
+
+Replaying N steps costs one extension run (one click, one load and one save of the document) instead of N.
+
+All the cells are recorded, including the ones that do not use the document (they may define names used later),
+except the ones that call the magics of this package (``%inkrecord`` etc.).
+The steps share one namespace, and each step sees the ``user_args`` of the run it was recorded in.
+
+The file has one JSON object per line, with the fields of :class:`MacroStep`.
+"""
+from __future__	import annotations
+
+import dataclasses
+from dataclasses import dataclass
+import json
+import time
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+@dataclass
+class MacroStep:
+	code: str
+	"""
+	The source code of the cell, after IPython's transformation
+	(so magics become calls of ``get_ipython()``, which only work when replaying in IPython).
+	"""
+	user_args: Any=None
+	"""
+	The ``user_args`` of the extension run of the cell, or None if the cell did not use the document.
+	"""
+	duration: float=0.
+	"""
+	Number of seconds the cell took when it was recorded, including the extension run.
+	"""
+
+@dataclass
+class Macro:
+	steps: list[MacroStep]=dataclasses.field(default_factory=list)
+
+	@property
+	def duration(self)->float:
+		return sum(step.duration for step in self.steps)
+
+	def save(self, path: str|Path)->None:
+		with open(path, "w") as f:
+			for step in self.steps:
+				_write_step(f, step)
+
+def load(path: str|Path)->Macro:
+	with open(path) as f:
+		return Macro([MacroStep(**json.loads(line)) for line in f if line.strip()])
+
+def _write_step(f: TextIO, step: MacroStep)->None:
+	f.write(json.dumps(dataclasses.asdict(step), default=str)+"\n")
+
+class Recorder:
+	"""
+	Appends the steps to the file *path* as they are recorded, so that nothing is lost if the daemon dies.
+	"""
+	def __init__(self, path: str|Path)->None:
+		self.path=Path(path)
+		self.count=0
+		self._file=open(self.path, "a")
+
+	def add(self, step: MacroStep)->None:
+		_write_step(self._file, step)
+		self._file.flush()
+		self.count+=1
+
+	def close(self)->None:
+		self._file.close()
+
+@dataclass
+class ReplayResult:
+	step_durations: list[float]
+	duration: float
+	"""
+	Number of seconds the whole replay took, including the extension run.
+	"""
+	recorded_duration: float
+	"""
+	Number of seconds the steps took when they were recorded.
+	"""
+	output_data: Optional[bytes]=None
+	"""
+	The resulting document, for :func:`replay_offline`.
+	"""
+
+	def __str__(self)->str:
+		steps=len(self.step_durations)
+		result=f"Replayed {steps} step{'s'*(steps!=1)} in {self.duration:.3f} s, the recorded cells took {self.recorded_duration:.3f} s"
+		if self.duration>0 and self.recorded_duration>0:
+			result+=f" ({self.recorded_duration/self.duration:.1f}x)"
+		return result+"."
+
+def execute(macro: Macro, namespace: dict[str, Any])->list[float]:
+	"""
+	Execute the steps of *macro* in *namespace* (see :func:`.batch.script_namespace`). Return the duration of each step.
+	"""
+	durations: list[float]=[]
+	for i, step in enumerate(macro.steps):
+		if step.user_args is not None: namespace["user_args"]=step.user_args
+		start_time=time.perf_counter()
+		exec(compile(step.code, f"<macro step {i+1}>", "exec"), namespace)
+		durations.append(time.perf_counter()-start_time)
+	return durations
+
+def _replay(macro: Macro, run: Any, namespace: Optional[dict[str, Any]]=None)->ReplayResult:
+	from . import batch
+	start_time=time.perf_counter()
+	with run:
+		if namespace is None: namespace=batch.script_namespace(run)
+		else:
+			from . import daemon
+			for name, value in daemon.unit_values(run.svg_root).items(): namespace.setdefault(name, value)
+			namespace.update(batch.run_names(run))
+		durations=execute(macro, namespace)
+		batch.update_run(run, namespace)
+	return ReplayResult(durations, time.perf_counter()-start_time, macro.duration, getattr(run, "output_data", None))
+
+def replay(macro: Macro, session: Any=None, namespace: Optional[dict[str, Any]]=None)->ReplayResult:
+	"""
+	Replay *macro* on the document of the Inkscape window of *session* (default: the current one), in one extension run.
+
+	The steps are executed in *namespace* if given (its names that refer to the document are replaced),
+	otherwise in a new one, see :func:`.batch.script_namespace`.
+	"""
+	from . import daemon
+	return _replay(macro, daemon.ExtensionRun(session=session), namespace)
+
+def replay_offline(macro: Macro, input: Any, output: Optional[Any]=None, extension_args: Optional[list[str]]=None)->ReplayResult:
+	"""
+	Replay *macro* without Inkscape. The arguments are as in :class:`.daemon.OfflineExtensionRun`.
+	"""
+	from . import daemon
+	return _replay(macro, daemon.OfflineExtensionRun(input=input, output=output, extension_args=list(extension_args or [])))
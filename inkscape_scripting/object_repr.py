@@ -3,7 +3,14 @@ Implements logic to pretty-print objects.
 """
 from __future__	import annotations
 
-from typing import Any
+from typing import Any, Callable, Optional, Iterator, Iterable
+import collections
+import copy
+import dataclasses
+from dataclasses import dataclass
+import hashlib
+import itertools
+import re
 
 from lxml import etree
 
@@ -28,6 +35,231 @@ def _unregister_gettext():
 
 _unregister_gettext()
 
+@dataclass
+class ConversionCache:
+	"""
+	LRU cache of the SimpInkScr conversion of elements, keyed by a structural fingerprint of the subtree
+	(see :func:`_fingerprints`), so that displaying an unchanged element does not convert it again.
+
+	When `svg_root` is displayed, the result for the whole root is cached, and so is the conversion of each subtree
+	(before the dependency analysis and the variable naming of :class:`SvgToPythonScript`, which are global
+	to the document and are redone each time): after a cell changes one element, only the subtrees that contain it
+	are converted again.
+
+	The total size of the cached values is bounded by *max_bytes* (approximately: the size of a list of strings
+	is the number of characters, and the size of a converted subtree is the size of the tags, attributes and text
+	of its elements).
+	"""
+	max_bytes: int=64<<20
+	hits: int=0
+	misses: int=0
+	_entries: collections.OrderedDict[bytes, tuple[Any, int]]=dataclasses.field(default_factory=collections.OrderedDict)
+	_size: int=0
+
+	@property
+	def hit_rate(self)->float:
+		return self.hits/max(1, self.hits+self.misses)
+
+	def get_or_compute(self, key: bytes, compute: Callable[[], Any], size: Optional[int]=None)->Any:
+		"""
+		*size* defaults to the total length of the strings in the computed value.
+		"""
+		entry=self._entries.get(key)
+		if entry is not None:
+			self.hits+=1
+			self._entries.move_to_end(key)
+			return entry[0]
+		self.misses+=1
+		value=compute()
+		if size is None: size=sum(map(len, value))
+		if size<=self.max_bytes:
+			self._entries[key]=value, size
+			self._size+=size
+			while self._size>self.max_bytes:
+				_, (_, evicted_size)=self._entries.popitem(last=False)
+				self._size-=evicted_size
+		return value
+
+	def clear(self)->None:
+		self._entries.clear()
+		self._size=0
+
+conversion_cache=ConversionCache()
+
+@dataclass
+class _Fingerprints:
+	"""
+	The structural fingerprint and the approximate size of each element of a tree, keyed by ``id(element)``.
+	*elements* keeps the element objects alive, so that the ids stay valid.
+	"""
+	elements: list[Any]
+	digests: dict[int, tuple[bytes, int]]
+
+	def digest(self, o)->bytes:
+		return self.digests[id(o)][0]
+
+def _fingerprints(root)->_Fingerprints:
+	"""
+	Fingerprint each element of *root* in one pass: each element is hashed once, from its tag, attributes and text,
+	and the fingerprints and tails of its children (so the cost is linear in the size of the tree, whatever its depth).
+	"""
+	elements=list(root.iter())
+	digests: dict[int, tuple[bytes, int]]={}
+	for element in reversed(elements):  # each element comes after its descendants
+		tag=element.tag if isinstance(element.tag, str) else type(element).__name__  # e.g. a comment
+		data=repr((tag, element.items() if isinstance(element.tag, str) else (), element.text)).encode("u8")
+		h=hashlib.sha1(data)
+		size=len(data)
+		for child in element:
+			child_digest, child_size=digests[id(child)]
+			h.update(child_digest)
+			h.update(repr(child.tail).encode("u8"))
+			size+=child_size
+		digests[id(element)]=h.digest(), size
+	return _Fingerprints(elements, digests)
+
+@dataclass
+class DisplayBudget:
+	"""
+	Limits of what is printed when an element with more than *threshold* descendants is displayed.
+
+	Such an element is displayed in streaming mode: the XML and the statements are generated lazily,
+	element by element, until *max_items* lines or *max_bytes* characters are printed,
+	and elements deeper than *max_depth* are collapsed. Then the rest can be printed page by page with :func:`more`.
+
+	Unlike the normal mode, the statements are not sorted by dependency, and groups are shown as comments
+	followed by the statements of their children.
+
+	Set *threshold* to ``None`` to always use the normal mode.
+	*max_items* is also the number of items printed for a list or tuple of elements or SimpleObjects.
+	"""
+	threshold: Optional[int]=5000
+	max_items: int=500
+	max_bytes: int=200_000
+	max_depth: int=6
+
+display_budget=DisplayBudget()
+
+@dataclass
+class _Stream:
+	chunks: Iterator[tuple[str, int]]
+	"""
+	Yields ``(line, number of elements covered by the line)``.
+	"""
+	total_elements: int
+	shown_elements: int=0
+
+	def print_page(self, p)->None:
+		"""
+		Print at most one page (according to :data:`display_budget`) to IPython pretty printer *p*.
+		"""
+		num_items=0
+		num_bytes=0
+		for line, num_elements in self.chunks:
+			p.text(line)
+			p.break_()
+			num_items+=1
+			num_bytes+=len(line)
+			self.shown_elements+=num_elements
+			if num_items>=display_budget.max_items or num_bytes>=display_budget.max_bytes:
+				break
+		else:
+			return
+		p.text(f"… {max(0, self.total_elements-self.shown_elements)} more elements (execute more() to show)")
+
+_pending_stream: Optional[_Stream]=None
+"""
+The stream that was cut off by the budget the last time, continued by :func:`more`.
+"""
+
+def _is_large(o)->bool:
+	if display_budget.threshold is None: return False
+	return next(itertools.islice(o.iter(), display_budget.threshold+1, None), None) is not None
+
+_xmlns_pattern=re.compile(r' xmlns(?::[\w.-]+)?="[^"]*"')
+
+def _to_string(o, strip_xmlns: bool)->str:
+	result=etree.tostring(o, with_tail=False).decode("u8", errors="replace")
+	if strip_xmlns:
+		# they are already declared on the root element that is printed
+		start_tag, end, rest=result.partition(">")
+		result=_xmlns_pattern.sub("", start_tag)+end+rest
+	return result
+
+def _tags(o, strip_xmlns: bool)->tuple[str, str]:
+	"""
+	Return the start tag and the end tag of *o*, without serializing its children.
+	"""
+	shallow=etree.Element(o.tag, dict(o.attrib), nsmap=o.nsmap)
+	shallow.text=" "
+	content=_to_string(shallow, strip_xmlns)
+	i=content.rindex("> </")
+	return content[:i+1], content[i+2:]
+
+def _is_leaf(o)->bool:
+	# len() is linear in the number of children
+	return next(iter(o), None) is None
+
+def _has_mixed_content(o)->bool:
+	"""
+	Heuristic (only the first child's tail is checked, to avoid iterating over the children) for e.g. text elements.
+	"""
+	return bool((o.text or "").strip() or (o[0].tail or "").strip())
+
+def _iter_xml(o, depth: int=0)->Iterator[tuple[str, int]]:
+	indent="  "*depth
+	if not isinstance(o.tag, str) or _is_leaf(o) or _has_mixed_content(o):
+		# leaf, comment, or e.g. a text element: print as a whole
+		yield indent+_to_string(o, depth>0), sum(1 for _ in o.iter())
+		return
+	start, end=_tags(o, depth>0)
+	if depth>=display_budget.max_depth:
+		num_descendants=int(o.xpath("count(.//*)"))
+		yield f"{indent}{start}<!-- … {num_descendants} elements -->{end}", num_descendants+1
+		return
+	yield indent+start, 1
+	for child in o:
+		yield from _iter_xml(child, depth+1)
+	yield indent+end, 0
+
+def _iter_statements(o, depth: int=0)->Iterator[tuple[str, int]]:
+	for child in o:
+		if isinstance(child, inkex.Defs):
+			yield from _iter_statements(child, depth+1)
+			continue
+		if isinstance(child, inkex.Group) and not _is_leaf(child) and depth<display_budget.max_depth:
+			yield f"# {child.get('inkscape:label') or child.get_id()}", 1
+			yield from _iter_statements(child, depth+1)
+			continue
+		try:
+			code=_repr_inkscape_object(child).code
+		except Exception:
+			continue  # not a shape, e.g. sodipodi:namedview
+		num_elements=sum(1 for _ in child.iter())
+		for i, stmt in enumerate(code):
+			yield str(stmt), num_elements if i==0 else 0
+
+def _display_streaming(o, p, chunks: Iterator[tuple[str, int]])->None:
+	global _pending_stream
+	_pending_stream=_Stream(chunks, int(o.xpath("count(descendant-or-self::*)")))
+	_pending_stream.print_page(p)
+
+def more()->None:
+	"""
+	Print the next page of the last large element that was displayed.
+
+	..seealso:: :class:`DisplayBudget`.
+	"""
+	from IPython.lib.pretty import PrettyPrinter
+	import sys
+	if _pending_stream is None:
+		print("Nothing more to show.")
+		return
+	p=PrettyPrinter(sys.stdout)
+	_pending_stream.print_page(p)
+	p.flush()
+	sys.stdout.write("\n")
+
 _for_type_registers=[]
 
 def _for_type(t):
@@ -41,86 +273,194 @@ def format_element_base(o, p, cycle)->None:
 	"""
 	Used to pretty-print `svg_root` etc. in IPython.
 	"""
+	if _is_large(o):
+		chunks=_iter_xml(o)
+		if o.TAG=="svg":
+			# each element is covered by both the XML and the statements
+			chunks=itertools.chain(
+					((line, 0) for line, _ in chunks),
+					[("[", 0)], _iter_statements(o), [("]", 0)])
+		_display_streaming(o, p, chunks)
+		return
 	try:
-		content=etree.tostring(o, pretty_print=True)
+		# not cached: computing a key from the content would cost as much as serializing
+		content=etree.tostring(o, pretty_print=True).decode("u8", errors="replace")
 	except:
 		p.text(repr(o))
 		return
-	p.text(content.decode("u8", errors="replace"))
+	p.text(content)
 	if o.TAG=="svg":
 		p.text("\n[\n")
 		pretty_print_svg_root(o, p)
 		p.text("]")
 
+class _SubtreeCachingConverter(SvgToPythonScript):
+	"""
+	A converter whose ``convert_*`` methods look up the statement of each subtree in :data:`conversion_cache`
+	by the fingerprints in :attr:`fingerprints` (including the nested calls, e.g. for the children of a group).
+
+	The cache holds an unused copy of each statement and each lookup returns a new copy,
+	because :meth:`SvgToPythonScript.find_dependencies` modifies the statements.
+	"""
+	fingerprints: Optional[_Fingerprints]=None
+
+	def _copy(self, stmt: Any)->Any:
+		# the document must not be copied if a statement refers to it
+		return copy.deepcopy(stmt, {id(self): self, id(self.svg): self.svg})
+
+def _caching_convert(name: str)->Callable[..., Any]:
+	convert=getattr(SvgToPythonScript, name)
+	def caching_convert(self: _SubtreeCachingConverter, node, *args):
+		entry=None if self.fingerprints is None else self.fingerprints.digests.get(id(node))
+		if entry is None: return convert(self, node, *args)
+		digest, size=entry
+		key=hashlib.sha1(f"statement\0{name}{args!r}\0".encode()+digest).digest()
+		return self._copy(conversion_cache.get_or_compute(key, lambda: self._copy(convert(self, node, *args)), size=size))
+	caching_convert.__name__=name
+	return caching_convert
+
+for _name in dir(SvgToPythonScript):
+	if _name.startswith("convert_") and _name!="convert_all_shapes":
+		setattr(_SubtreeCachingConverter, _name, _caching_convert(_name))
+del _name
+
+_root_converter=_SubtreeCachingConverter()
+_unregister_gettext()
+
+def svg_root_statements(svg_root)->list[str]:
+	"""
+	Return the SimpInkScr statements that reconstruct the document.
+	"""
+	fingerprints=_fingerprints(svg_root)
+	def compute()->list[str]:
+		converter=_root_converter
+		converter.svg=svg_root
+		converter.fingerprints=fingerprints
+		try:
+			code=converter.convert_all_shapes()
+		finally:
+			converter.fingerprints=None
+		converter.find_dependencies(code)
+		code=converter.sort_statement_forest(code)
+		return [str(stmt) for stmt in code if not (stmt.delete_if_unused and not stmt.need_var_name)]
+	return conversion_cache.get_or_compute(b"root\0"+fingerprints.digest(svg_root), compute)
+
 def pretty_print_svg_root(svg_root, p)->None:
-	_svg_to_python_script.svg=svg_root
-	code=_svg_to_python_script.convert_all_shapes()
-	_svg_to_python_script.find_dependencies(code)
-	code=_svg_to_python_script.sort_statement_forest(code)
-	for stmt in code:
-		if stmt.delete_if_unused and not stmt.need_var_name:
-			continue
-		p.text(str(stmt))
+	for stmt in svg_root_statements(svg_root):
+		p.text(stmt)
 		p.breakable(";")
 
-def _repr_inkscape_object(node)->Any:
+_converter_table: list[tuple[type, Callable[[Any, Any], Any]]]=[
+	# copied from SimpInkScr/simpinkscr/svg_to_simp_ink_script.py → convert_all_shapes
+	# the order matters: the first matching entry is used
+	(inkex.Circle, lambda c, node: c.convert_circle(node)),
+	(inkex.Ellipse, lambda c, node: c.convert_ellipse(node)),
+	(inkex.Rectangle, lambda c, node: c.convert_rectangle(node)),
+	(inkex.Line, lambda c, node: c.convert_line(node)),
+	(inkex.Polyline, lambda c, node: c.convert_poly(node, 'polyline')),
+	(inkex.Polygon, lambda c, node: c.convert_poly(node, 'polygon')),
+	(inkex.PathElement, lambda c, node: c.convert_path(node)),
+	(inkex.TextElement, lambda c, node: c.convert_text(node)),
+	(inkex.Image, lambda c, node: c.convert_image(node)),
+	(inkex.ForeignObject, lambda c, node: c.convert_foreign(node)),
+	(inkex.Use, lambda c, node: c.convert_clone(node)),
+	(inkex.Group, lambda c, node: c.convert_group(node)),
+	(inkex.Filter, lambda c, node: c.convert_filter(node)),
+	(inkex.LinearGradient, lambda c, node: c.convert_linear_gradient(node)),
+	(inkex.RadialGradient, lambda c, node: c.convert_radial_gradient(node)),
+	(inkex.ClipPath, lambda c, node: c.convert_clip_path(node)),
+	*([(inkex.Mask, lambda c, node: c.convert_mask(node))] if hasattr(inkex, 'Mask') else []),  # Inkscape 1.2+
+	(inkex.Marker, lambda c, node: c.convert_marker(node)),
+	(inkex.Anchor, lambda c, node: c.convert_hyperlink(node)),
+	(inkex.PathEffect, lambda c, node: c.convert_path_effect(node)),
+	(inkex.Guide, lambda c, node: c.convert_guide(node)),
+	]
+
+_converter_by_type: dict[type, Optional[Callable[[Any, Any], Any]]]={}
+"""
+Cache of the entry of :data:`_converter_table` that is used for each concrete class.
+"""
+
+def _converter_for_type(t: type)->Optional[Callable[[Any, Any], Any]]:
+	try:
+		return _converter_by_type[t]
+	except KeyError:
+		pass
+	result=next((convert for base, convert in _converter_table if issubclass(t, base)), None)
+	_converter_by_type[t]=result
+	return result
+
+def _repr_inkscape_object(node, converter: Any=None)->Any:
 	"""
 	node is of type inkex.elements._base.BaseElement (e.g. inkex.Rectangle)
 	return a SvgToPythonScript.Statement object.
 	"""
-	# copied from SimpInkScr/simpinkscr/svg_to_simp_ink_script.py → convert_all_shapes
-	if isinstance(node, inkex.Circle):
-		return _svg_to_python_script.convert_circle(node)
-	elif isinstance(node, inkex.Ellipse):
-		return _svg_to_python_script.convert_ellipse(node)
-	elif isinstance(node, inkex.Rectangle):
-		return _svg_to_python_script.convert_rectangle(node)
-	elif isinstance(node, inkex.Line):
-		return _svg_to_python_script.convert_line(node)
-	elif isinstance(node, inkex.Polyline):
-		return _svg_to_python_script.convert_poly(node, 'polyline')
-	elif isinstance(node, inkex.Polygon):
-		return _svg_to_python_script.convert_poly(node, 'polygon')
-	elif isinstance(node, inkex.PathElement):
-		return _svg_to_python_script.convert_path(node)
-	elif isinstance(node, inkex.TextElement):
-		return _svg_to_python_script.convert_text(node)
-	elif isinstance(node, inkex.Image):
-		return _svg_to_python_script.convert_image(node)
-	elif isinstance(node, inkex.ForeignObject):
-		return _svg_to_python_script.convert_foreign(node)
-	elif isinstance(node, inkex.Use):
-		return _svg_to_python_script.convert_clone(node)
-	elif isinstance(node, inkex.Group):
-		return _svg_to_python_script.convert_group(node)
-	elif isinstance(node, inkex.Filter):
-		return _svg_to_python_script.convert_filter(node)
-	elif isinstance(node, inkex.LinearGradient):
-		return _svg_to_python_script.convert_linear_gradient(node)
-	elif isinstance(node, inkex.RadialGradient):
-		return _svg_to_python_script.convert_radial_gradient(node)
-	elif isinstance(node, inkex.ClipPath):
-		return _svg_to_python_script.convert_clip_path(node)
-	elif hasattr(inkex, 'Mask') and isinstance(node, inkex.Mask):
-		return _svg_to_python_script.convert_mask(node)  # Inkscape 1.2+
-	elif isinstance(node, inkex.Marker):
-		return _svg_to_python_script.convert_marker(node)
-	elif isinstance(node, inkex.Anchor):
-		return _svg_to_python_script.convert_hyperlink(node)
-	elif isinstance(node, inkex.PathEffect):
-		return _svg_to_python_script.convert_path_effect(node)
-	elif isinstance(node, inkex.Guide):
-		return _svg_to_python_script.convert_guide(node)
-	else:
+	convert=_converter_for_type(type(node))
+	if convert is None:
 		raise RuntimeError('Internal error converting %s' % repr(node))
+	return convert(_svg_to_python_script if converter is None else converter, node)
+
+def convert_objects(objects: Iterable[Any], sort: bool=True)->list[str]:
+	"""
+	Convert SimpleObjects and/or inkex elements to SimpInkScr statements in one pass,
+	with a fresh :class:`SvgToPythonScript` instance.
+	Elements that cannot be converted (e.g. ``sodipodi:namedview``) are skipped.
+
+	If *sort* is True, the statements are sorted so that each comes after its dependencies,
+	and unused definitions are removed (as when displaying `svg_root`).
+
+	This does not need IPython. For example, to dump a layer to a script::
+
+		Path("layer.py").write_text("\\n".join(convert_objects(layer))+"\\n")
+	"""
+	converter=SvgToPythonScript()
+	_unregister_gettext()
+	code=[]
+	for o in objects:
+		node=o.get_inkex_object() if isinstance(o, SimpleObject) else o
+		convert=_converter_for_type(type(node))
+		if convert is None: continue
+		if getattr(converter, "svg", None) is None: converter.svg=node.root
+		code.append(convert(converter, node))
+	if not sort:
+		return [str(line) for stmt in code for line in stmt.code]
+	converter.find_dependencies(code)
+	code=converter.sort_statement_forest(code)
+	return [str(stmt) for stmt in code if not (stmt.delete_if_unused and not stmt.need_var_name)]
 
 @_for_type(SimpleObject)
 def format_simple_object(o, p, cycle)->None:
-	for i, stmt in enumerate(_repr_inkscape_object(o.get_inkex_object()).code):
+	node=o.get_inkex_object()
+	if _is_large(node):
+		_display_streaming(node, p, itertools.chain([(f"# {node.get_id()}", 1)], _iter_statements(node)))
+		return
+	code=conversion_cache.get_or_compute(b"object\0"+_fingerprints(node).digest(node),
+			lambda: [str(stmt) for stmt in _repr_inkscape_object(node).code])
+	for i, stmt in enumerate(code):
 		if i!=0: p.breakable(";")
-		p.text(str(stmt))
+		p.text(stmt)
+
+def _limit_element_sequences(default: Callable[[Any, Any, bool], None])->Callable[[Any, Any, bool], None]:
+	"""
+	Wrap IPython's printer *default* of a sequence type, so that only *display_budget.max_items* items
+	are printed when the first item is an element or a SimpleObject (e.g. the result of ``all_shapes()``).
+	"""
+	def format_sequence(o, p, cycle)->None:
+		if not (o and isinstance(next(iter(o)), (etree.ElementBase, SimpleObject))):
+			default(o, p, cycle)
+			return
+		max_seq_length=p.max_seq_length
+		p.max_seq_length=display_budget.max_items
+		try:
+			default(o, p, cycle)
+		finally:
+			p.max_seq_length=max_seq_length
+	return format_sequence
 
 def formatter_setup(ip):
 	formatter=ip.display_formatter.formatters['text/plain']
 	for t, g in _for_type_registers:
 		formatter.for_type(t, g)
+	for t in (list, tuple):
+		default=formatter.for_type(t)
+		if default is not None: formatter.for_type(t, _limit_element_sequences(default))
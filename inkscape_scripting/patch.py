@@ -0,0 +1,171 @@
+"""
+Compact edit scripts of the output document against the input document.
+
+The client already has the input file, so instead of sending the whole re-serialized document back,
+the daemon may send a patch, which is a list of operations. Each operation is either
+
+* a tuple ``(start, end)``, meaning "copy ``original[start:end]``", or
+* a bytes object, meaning "write these bytes literally".
+
+This module is imported by the client, so it must not import anything expensive at top level (not even ``typing``).
+"""
+from __future__	import annotations
+
+TYPE_CHECKING=False
+if TYPE_CHECKING:
+	from typing import Any, Callable, Optional, Union
+	PatchOperation=Union[tuple, bytes]
+
+max_diff_lines: int=200000
+"""
+If the changed region has more lines than this, we do not run a line diff on it
+(which may be slow) and only strip the common prefix and suffix.
+"""
+
+_operation_overhead: int=17
+"""
+Number of bytes that each operation costs on the wire, see :func:`.framing.encode_message`.
+"""
+
+_chunk_size: int=1<<16
+
+def _common_prefix_length(a: bytes, b: bytes)->int:
+	"""
+	Compare chunk by chunk, then binary search in the first chunk that differs,
+	so that the comparisons are done in C instead of byte-by-byte in Python.
+	(Slices of bytes are compared with ``memcmp``; slices of memoryview objects are much slower.)
+	"""
+	n=min(len(a), len(b))
+	start=0
+	while start<n:
+		end=min(start+_chunk_size, n)
+		if a[start:end]!=b[start:end]: break
+		start=end
+	else:
+		return n
+	lo, hi=start, end-1
+	while lo<hi:
+		mid=(lo+hi+1)//2
+		if a[start:mid]==b[start:mid]: lo=mid
+		else: hi=mid-1
+	return lo
+
+def _common_suffix_length(a: bytes, b: bytes, limit: int)->int:
+	n=min(len(a), len(b), limit)
+	start=0
+	while start<n:
+		end=min(start+_chunk_size, n)
+		if a[len(a)-end:len(a)-start]!=b[len(b)-end:len(b)-start]: break
+		start=end
+	else:
+		return n
+	lo, hi=start, end-1
+	while lo<hi:
+		mid=(lo+hi+1)//2
+		if a[len(a)-mid:len(a)-start]==b[len(b)-mid:len(b)-start]: lo=mid
+		else: hi=mid-1
+	return lo
+
+def _line_starts(data: Any, start: int, end: int)->list[int]:
+	"""
+	Return the offsets in ``data[start:end]`` where each line starts, followed by ``end``.
+	"""
+	result=[start]
+	find=data.find
+	i=find(b"\n", start, end)
+	while i!=-1:
+		result.append(i+1)
+		i=find(b"\n", i+1, end)
+	if result[-1]!=end: result.append(end)
+	return result
+
+def compute_patch(original: bytes, new: bytes)->list[PatchOperation]:
+	"""
+	Compute a patch that transforms *original* into *new*.
+
+	The common prefix and suffix are stripped first, then a line-based diff is run on the rest.
+	"""
+	prefix=_common_prefix_length(original, new)
+	# align to the start of a line, so that the line diff below sees whole lines
+	prefix=original.rfind(b"\n", 0, prefix)+1
+	suffix=_common_suffix_length(original, new, min(len(original), len(new))-prefix)
+
+	result: list[PatchOperation]=[]
+	def copy(start: int, end: int)->None:
+		if start==end: return
+		if result and isinstance(result[-1], tuple) and result[-1][1]==start:
+			result[-1]=(result[-1][0], end)
+		else:
+			result.append((start, end))
+	def insert(start: int, end: int)->None:
+		if start==end: return
+		if result and isinstance(result[-1], bytes):
+			result[-1]+=new[start:end]
+		else:
+			result.append(new[start:end])
+
+	copy(0, prefix)
+	a_end=len(original)-suffix
+	b_end=len(new)-suffix
+	a_starts=_line_starts(original, prefix, a_end)
+	b_starts=_line_starts(new, prefix, b_end)
+	if max(len(a_starts), len(b_starts))>max_diff_lines:
+		insert(prefix, b_end)
+	else:
+		import difflib
+		a_lines=[original[i:j] for i, j in zip(a_starts, a_starts[1:])]
+		b_lines=[new[i:j] for i, j in zip(b_starts, b_starts[1:])]
+		for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a_lines, b_lines).get_opcodes():
+			if tag=="equal":
+				copy(a_starts[i1], a_starts[i2])
+			else:
+				insert(b_starts[j1], b_starts[j2])
+	copy(a_end, len(original))
+	return result
+
+def patch_size(patch: list[PatchOperation])->int:
+	"""
+	Estimate the number of bytes needed to send *patch*.
+	"""
+	return sum(len(op) if isinstance(op, bytes) else 0 for op in patch)+_operation_overhead*len(patch)
+
+def make_output(input_file: str, new: bytes)->Any:
+	"""
+	Return the value to be sent to the client.
+
+	This is either *new* itself, or a tuple ``("patch", input_file, original_length, patch)``
+	if the patch is smaller.
+	"""
+	try:
+		with open(input_file, "rb") as f:
+			original=f.read()
+	except OSError:
+		return new
+	patch=compute_patch(original, new)
+	if patch_size(patch)>=len(new):
+		return new
+	return ("patch", input_file, len(original), patch)
+
+def apply_patch(original: bytes, patch: list[PatchOperation], write: Callable[[Any], Any])->None:
+	"""
+	Apply *patch* to *original*, passing the resulting chunks to *write*.
+	"""
+	view=memoryview(original)
+	for op in patch:
+		if isinstance(op, bytes): write(op)
+		else: write(view[op[0]:op[1]])
+
+def write_output(data: Any, write: Callable[[Any], Any])->None:
+	"""
+	Inverse of :func:`make_output`.
+	"""
+	if not isinstance(data, tuple):
+		write(data)
+		return
+	tag, input_file, original_length, patch=data
+	assert tag=="patch", tag
+	with open(input_file, "rb") as f:
+		original=f.read()
+	if len(original)!=original_length:
+		raise RuntimeError("Input file changed while the extension is running")
+	apply_patch(original, patch, write)
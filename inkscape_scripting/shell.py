@@ -2,12 +2,23 @@ from __future__	import annotations
 
 from pathlib import Path
 import tempfile
-from typing import overload, Optional
+import typing
+from typing import overload, Any, Callable, Optional, Generator
+import dataclasses
 from dataclasses import dataclass
 import subprocess
 import time
+import os
+import select
+import threading
+import asyncio
+import atexit
+import collections
+import hashlib
+from concurrent.futures import Future
+from contextlib import contextmanager, nullcontext
 
-from .daemon import pause_extension_run
+from .daemon import Session, current_session, pause_extension_run
 
 
 @dataclass
@@ -21,91 +32,555 @@ class InkscapeShell:
 
 		with InkscapeShell() as shell:
 			print(shell.send_command("query-all"))
+			print(shell.send_command(["select-by-id:rect1", "query-x"], pipeline=True, timeout=5))
+
+	If *active_window* is False, the process is started without ``--active-window``, so it works on the documents
+	it opens itself (``file-open:...``) and runs alongside the extension; see :class:`ExportQueue`.
 	"""
 	shell: Optional[subprocess.Popen]=None
+	active_window: bool=True
+	executable: str="inkscape"
 	num_retries_wait_for_inkscape: int=10
 	retry_wait_time: float=0.2
+	_buffer: bytearray=dataclasses.field(default_factory=bytearray)
 
 	def __enter__(self)->InkscapeShell:
 		assert self.shell is None
-		with pause_extension_run():
+		with self._pause_extension_run():
 			for _ in range(self.num_retries_wait_for_inkscape):
 				self.shell=subprocess.Popen(
-						["inkscape", "--shell", "--active-window"],
-						stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-						text=True, encoding='u8')
-				assert self.shell.stdout is not None
-				line=self.shell.stdout.readline()
+						[self.executable, "--shell", *(["--active-window"] if self.active_window else [])],
+						stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+				try:
+					line=self._read_until(b"\n").decode("u8")
+				except EOFError:
+					line=""
 				stderr_line=None
 				if not line.strip():
-					stderr_line=self.shell.stderr.readline()
+					assert self.shell.stderr is not None
+					stderr_line=self.shell.stderr.readline().decode("u8")
 					if stderr_line.startswith(("No active desktop to run",
 								#"terminate after throwing an instance of 'Gio::DBus::Error'"
 								)):
 						self._stop_shell()
 						continue
 				assert line.startswith("Inkscape interactive shell mode"), repr((line, stderr_line))
-				line=self.shell.stdout.readline()
-				assert line==" Input of the form:\n", repr(line)
-				line=self.shell.stdout.readline()
-				prompt=self.shell.stdout.read(2)
-				assert prompt=="> ", repr(prompt)
+				line=self._read_until(b"\n").decode("u8")
+				assert line==" Input of the form:", repr(line)
+				self._read_until(b"\n")
+				prompt=self._read_until(b"> ")
+				assert prompt==b"", repr(prompt)
 				break
 			else:
 				raise RuntimeError("No active window found")
 		return self
 
-	def _read_until_prompt(self)->str:
-		content=""
+	def _pause_extension_run(self)->typing.ContextManager:
+		return pause_extension_run() if self.active_window else nullcontext()
+
+	def _remove_active_desktop_commands(self)->None:
+		# https://gitlab.com/inkscape/inbox/-/issues/9922
+		if self.active_window:
+			(Path(tempfile.gettempdir())/"active_desktop_commands.xml").unlink(missing_ok=True)
+
+	def _read_until(self, delimiter: bytes, timeout: Optional[float]=None)->bytes:
+		"""
+		Read from the shell's stdout until *delimiter*, return the content before it and consume the delimiter.
+
+		The output is read in large chunks directly from the file descriptor, the rest is kept in :attr:`_buffer`.
+		Raise :class:`EOFError` if the process closes its stdout, :class:`TimeoutError` if *timeout* seconds elapse.
+		"""
+		assert self.shell is not None
+		assert self.shell.stdout is not None
+		fd=self.shell.stdout.fileno()
+		buffer=self._buffer
+		deadline=None if timeout is None else time.monotonic()+timeout
+		start=0
 		while True:
-			assert self.shell is not None
-			assert self.shell.stdout is not None
-			chunk=self.shell.stdout.read(1)
-			content+=chunk
-			assert chunk, repr(content)
-			if content.endswith("\n> "): break
-		content=content.removesuffix("\n> ")
-		return content
+			i=buffer.find(delimiter, start)
+			if i>=0:
+				content=bytes(buffer[:i])
+				del buffer[:i+len(delimiter)]
+				return content
+			start=max(0, len(buffer)-len(delimiter)+1)
+			if deadline is not None:
+				remaining=deadline-time.monotonic()
+				if remaining<=0 or not select.select([fd], [], [], remaining)[0]:
+					raise TimeoutError(f"Inkscape shell did not respond within {timeout} seconds")
+			chunk=os.read(fd, 1<<16)
+			if not chunk: raise EOFError(bytes(buffer))
+			buffer+=chunk
+
+	def _read_until_prompt(self, timeout: Optional[float]=None)->str:
+		return self._read_until(b"\n> ", timeout).decode("u8")
 
 	@overload
-	def send_command(self, s: str)->str: ...
+	def send_command(self, s: str, pipeline: bool=False, timeout: Optional[float]=None)->str: ...
 	@overload
-	def send_command(self, s: list[str])->list[str]: ...
+	def send_command(self, s: list[str], pipeline: bool=False, timeout: Optional[float]=None)->list[str]: ...
 
-	def send_command(self, s: str|list[str])->str|list[str]:
-		# https://gitlab.com/inkscape/inbox/-/issues/9922
+	def send_command(self, s: str|list[str], pipeline: bool=False, timeout: Optional[float]=None)->str|list[str]:
+		"""
+		Send a command or a list of commands, return the output of each.
+
+		If *pipeline* is True, all the commands are written at once, and the replies are matched in order.
+
+		*timeout* is the maximum number of seconds to wait for the reply of each command.
+		If it elapses, the shell is stopped (because its output would be out of sync) and :class:`TimeoutError` is raised.
+		"""
 		t=s if isinstance(s, list) else [s]
 		for a in t:
 			assert "\n" not in a, (a, t)
+		with self._pause_extension_run():
+			result=self._send_commands(t, pipeline, timeout)
+		if isinstance(s, str): return result[0]
+		return result
+
+	def _send_commands(self, t: list[str], pipeline: bool, timeout: Optional[float])->list[str]:
+		"""
+		The part of :meth:`send_command` that talks to the process, called while the extension run is paused.
+		"""
 		assert self.shell is not None
 		assert self.shell.stdin is not None
-		with pause_extension_run():
-			result=[]
-			for a in t:
-				assert "\n" not in a
-				(Path(tempfile.gettempdir())/"active_desktop_commands.xml").unlink(missing_ok=True)
-				self.shell.stdin.write(a+"\n")
-				self.shell.stdin.flush()
-				#print(">> sent command", a)
-				result.append(self._read_until_prompt())
-				#print("<< received ", result[-1])
-			if isinstance(s, str): return result[0]
-			return result
+		stdin=self.shell.stdin
+		result=[]
+		try:
+			if pipeline:
+				# with pipelining, the workaround can only be applied before the whole batch
+				self._remove_active_desktop_commands()
+				data="".join(a+"\n" for a in t).encode("u8")
+				def write()->None:
+					try:
+						stdin.write(data)
+						stdin.flush()
+					except (BrokenPipeError, ValueError):
+						pass  # the shell is stopped, the error is reported by the reader
+				# write in another thread, otherwise both processes may block on full pipes
+				writer=threading.Thread(target=write, daemon=True)
+				writer.start()
+				for a in t:
+					result.append(self._read_until_prompt(timeout))
+				writer.join()
+			else:
+				for a in t:
+					self._remove_active_desktop_commands()
+					stdin.write((a+"\n").encode("u8"))
+					stdin.flush()
+					#print(">> sent command", a)
+					result.append(self._read_until_prompt(timeout))
+					#print("<< received ", result[-1])
+		except TimeoutError:
+			self.kill()
+			raise
+		return result
+
+	async def send_command_async(self, s: str|list[str], pipeline: bool=False, timeout: Optional[float]=None)->str|list[str]:
+		"""
+		Same as :meth:`send_command`, but does not block the event loop.
+
+		The extension run is paused and resumed in the calling thread (like everything that touches the session),
+		only the communication with the process runs in the default executor.
+		"""
+		t=s if isinstance(s, list) else [s]
+		for a in t:
+			assert "\n" not in a, (a, t)
+		with self._pause_extension_run():
+			result=await asyncio.get_running_loop().run_in_executor(None, lambda: self._send_commands(t, pipeline, timeout))
+		if isinstance(s, str): return result[0]
+		return result
 
 	def __exit__(self, value, type, traceback)->None:
 		self._stop_shell()
 
+	def is_healthy(self)->bool:
+		"""
+		Return whether the process is still running and has not written anything unexpected
+		(which would mean its output is out of sync with the commands).
+		"""
+		if self.shell is None or self.shell.poll() is not None: return False
+		if self._buffer: return False
+		assert self.shell.stdout is not None
+		return not select.select([self.shell.stdout.fileno()], [], [], 0)[0]
+
+	def kill(self)->None:
+		"""
+		Stop the process, without waiting for it to exit by itself.
+		"""
+		if self.shell is not None and self.shell.poll() is None:
+			self.shell.kill()
+		self._stop_shell()
+
 	def _stop_shell(self)->None:
 		if self.shell is None:
 			return
 		assert self.shell.stdin is not None
 		assert self.shell.stdout is not None
-		self.shell.stdin.close()
+		try:
+			self.shell.stdin.close()
+		except BrokenPipeError:
+			pass
 		self.shell.stdout.close()
 		self.shell.stderr.close()
 		self.shell.wait(timeout=1)
 		self.shell=None
+		self._buffer.clear()
 
 	def __del__(self)->None:
 		self._stop_shell()
 
+
+
+@dataclass
+class InkscapeShellPool:
+	"""
+	Keeps up to *max_size* ``inkscape --shell --active-window`` processes alive between uses,
+	so that using a shell costs a command round-trip instead of a process launch.
+
+	An idle process is checked with :meth:`InkscapeShell.is_healthy` before it is reused,
+	and a new one is started if the check fails.
+	A process is attached to the Inkscape window that was active when it started, so it is only reused
+	for the same session (see :class:`.daemon.Session`).
+	Processes that are idle for more than *idle_timeout* seconds are stopped (``None`` means never).
+
+	Usage::
+
+		with shell_pool.shell() as shell:
+			print(shell.send_command("query-all"))
+
+	..seealso:: :func:`send_shell_command`.
+	"""
+	max_size: int=1
+	idle_timeout: Optional[float]=60.
+	_idle: list[tuple[InkscapeShell, float, str]]=dataclasses.field(default_factory=list)
+	"""
+	The idle processes, with the time they were released and the name of their session.
+	"""
+	_lock: threading.Lock=dataclasses.field(default_factory=threading.Lock)
+	_eviction_timer: Optional[threading.Timer]=None
+
+	def _acquire(self, session_name: str)->InkscapeShell:
+		with self._lock:
+			while True:
+				i=next((i for i in reversed(range(len(self._idle))) if self._idle[i][2]==session_name), None)
+				if i is None: break
+				shell, _, _=self._idle.pop(i)
+				if shell.is_healthy(): return shell
+				shell.kill()
+		return InkscapeShell().__enter__()
+
+	def _release(self, shell: InkscapeShell, session_name: str)->None:
+		if not shell.is_healthy():
+			shell.kill()
+			return
+		with self._lock:
+			if len(self._idle)<self.max_size:
+				self._idle.append((shell, time.monotonic(), session_name))
+				shell=None
+			self._schedule_eviction()
+		if shell is not None:
+			shell._stop_shell()
+
+	def _schedule_eviction(self)->None:
+		if self.idle_timeout is None or self._eviction_timer is not None or not self._idle: return
+		self._eviction_timer=threading.Timer(self.idle_timeout, self.evict_idle)
+		self._eviction_timer.daemon=True
+		self._eviction_timer.start()
+
+	def evict_idle(self)->None:
+		"""
+		Stop the processes that are idle for more than :attr:`idle_timeout` seconds.
+		"""
+		with self._lock:
+			self._eviction_timer=None
+			now=time.monotonic()
+			evicted=[shell for shell, last_used, _ in self._idle if self.idle_timeout is not None and now-last_used>=self.idle_timeout]
+			self._idle=[item for item in self._idle if all(item[0] is not e for e in evicted)]
+			self._schedule_eviction()
+		for shell in evicted:
+			shell._stop_shell()
+
+	def close(self)->None:
+		"""
+		Stop all idle processes.
+		"""
+		with self._lock:
+			idle, self._idle=self._idle, []
+			if self._eviction_timer is not None:
+				self._eviction_timer.cancel()
+				self._eviction_timer=None
+		for shell, _, _ in idle:
+			shell._stop_shell()
+
+	@contextmanager
+	def shell(self, session: Optional[Session]=None)->Generator[InkscapeShell, None, None]:
+		"""
+		Use a process for the Inkscape window of *session* (default: the current one).
+		"""
+		session_name=(session or current_session()).name
+		shell=self._acquire(session_name)
+		try:
+			yield shell
+		finally:
+			self._release(shell, session_name)
+
+shell_pool=InkscapeShellPool()
+atexit.register(shell_pool.close)
+
+@overload
+def send_shell_command(s: str, pipeline: bool=False, timeout: Optional[float]=None)->str: ...
+@overload
+def send_shell_command(s: list[str], pipeline: bool=False, timeout: Optional[float]=None)->list[str]: ...
+
+def send_shell_command(s: str|list[str], pipeline: bool=False, timeout: Optional[float]=None)->str|list[str]:
+	"""
+	Same as :meth:`InkscapeShell.send_command`, using a process from :data:`shell_pool`.
+	"""
+	with shell_pool.shell() as shell:
+		return shell.send_command(s, pipeline, timeout)
+
+_export_defaults: dict[str, str]={
+		"id": "", "id-only": "false", "area-page": "false", "area-drawing": "false", "area-snap": "false",
+		"dpi": "96", "margin": "0", "plain-svg": "false", "text-to-path": "false", "ignore-filters": "false",
+		}
+"""
+Values that reset the export options, which Inkscape keeps from one export to the next.
+"""
+
+@dataclass
+class ExportJob:
+	document: str
+	"""
+	The SVG file to export from.
+	"""
+	filename: str
+	type: str
+	options: dict[str, str]
+	"""
+	The other ``export-*`` actions, without the ``export-`` prefix, such as ``{"id": "rect1", "dpi": "300"}``.
+	"""
+	future: Future=dataclasses.field(default_factory=Future)
+	"""
+	Its result is the path of the exported file.
+	"""
+
+@dataclass
+class ExportReport:
+	jobs: int
+	failed: int
+	commands: int
+	"""
+	Number of shell commands sent (each opens a document and runs several exports).
+	"""
+	processes: int
+	duration: float
+
+	def __str__(self)->str:
+		rate=self.jobs/self.duration if self.duration>0 else 0.
+		return (f"{self.jobs} exports ({self.failed} failed) in {self.duration:.1f} s, "
+				f"{self.commands} shell commands on {self.processes} processes: {rate:.1f} exports/s")
+
+def _check_action_value(value: str)->str:
+	if ";" in value or "\n" in value: raise ValueError(f"Cannot be used in a shell command: {value!r}")
+	return value
+
+def _job_actions(job: ExportJob, state: dict[str, str])->list[str]:
+	"""
+	Return the actions that export *job* from the open document, given the export options *state* set by the previous
+	actions of the process (updated).
+	"""
+	wanted={key: value for key, value in _export_defaults.items() if key in state}
+	wanted.update(job.options)
+	wanted.update(type=job.type, filename=job.filename)
+	actions=[]
+	for key, value in wanted.items():
+		if state.get(key)!=value:
+			actions.append(f"export-{key}:{value}")
+			state[key]=value
+	actions.append("export-do")
+	return actions
+
+def _mtime(path: str)->Optional[int]:
+	try:
+		return os.stat(path).st_mtime_ns
+	except FileNotFoundError:
+		return None
+
+class ExportQueue:
+	"""
+	Exports many files from saved documents with several ``inkscape --shell`` processes in parallel,
+	without blocking the caller or the Inkscape window.
+
+	Each process takes a batch of up to *batch_size* jobs of one document, and sends them as a single shell command
+	(``file-open:...; export-filename:...; export-do; ...``), where only the export options that differ
+	from the previous export are set.
+	A document that is not a path (the content as bytes, or an inkex element such as ``svg_root``) is saved to a temporary copy.
+
+	Usage::
+
+		with ExportQueue(processes=4) as queue:
+			for i in range(100):
+				queue.export("drawing.svg", f"out/card{i}.png", id=f"card{i}", id_only=True, dpi=300)
+		print(queue.report())
+
+	:meth:`export` returns a :class:`concurrent.futures.Future`. *progress*, if given, is called from the worker threads
+	after each job with the job, the number of jobs done and the number of jobs submitted.
+
+	Export options without a known default (see :data:`_export_defaults`) stay set for the following exports
+	of the same process, so give them in every job that uses them.
+	"""
+	def __init__(self, processes: int=2, batch_size: int=32, executable: str="inkscape", timeout: Optional[float]=None,
+			progress: Optional[Callable[[ExportJob, int, int], None]]=None)->None:
+		self.processes=processes
+		self.batch_size=batch_size
+		self.executable=executable
+		self.timeout=timeout
+		self.progress=progress
+		self._pending: dict[str, collections.deque[ExportJob]]={}
+		self._pending_count=0
+		self._submitted=0
+		self._done=0
+		self._failed=0
+		self._commands=0
+		self._start_time: Optional[float]=None
+		self._end_time: Optional[float]=None
+		self._closing=False
+		self._condition=threading.Condition()
+		self._workers: list[threading.Thread]=[]
+		self._copies: dict[bytes, str]={}
+
+	def export(self, document: Any, filename: str|Path, type: Optional[str]=None, **options: Any)->Future:
+		"""
+		Queue the export of *document* to *filename*. *type* defaults to the extension of *filename*.
+		*options* are ``export-*`` actions, with ``_`` for ``-``, such as ``id="rect1", id_only=True, dpi=300``.
+		"""
+		path=Path(filename).absolute()
+		path.parent.mkdir(parents=True, exist_ok=True)
+		job=ExportJob(
+				_check_action_value(self._document_path(document)),
+				_check_action_value(str(path)),
+				_check_action_value(type or path.suffix.lstrip(".")),
+				{_check_action_value(key.replace("_", "-")): _check_action_value(str(value).lower() if isinstance(value, bool) else str(value))
+					for key, value in options.items()})
+		with self._condition:
+			if self._closing: raise RuntimeError("The queue is closed")
+			if self._start_time is None: self._start_time=time.perf_counter()
+			self._pending.setdefault(job.document, collections.deque()).append(job)
+			self._pending_count+=1
+			self._submitted+=1
+			if len(self._workers)<self.processes:
+				worker=threading.Thread(target=self._work, daemon=True)
+				self._workers.append(worker)
+				worker.start()
+			self._condition.notify()
+		return job.future
+
+	def _document_path(self, document: Any)->str:
+		if hasattr(document, "tostring"): document=document.tostring()
+		if not isinstance(document, bytes):
+			return str(Path(document).absolute())
+		digest=hashlib.sha1(document).digest()
+		with self._condition:
+			path=self._copies.get(digest)
+			if path is None:
+				fd, path=tempfile.mkstemp(prefix="inkscape_scripting_export_", suffix=".svg")
+				with open(fd, "wb") as f:
+					f.write(document)
+				self._copies[digest]=path
+		return path
+
+	def _take(self, open_document: Optional[str])->list[ExportJob]:
+		"""
+		Return the next batch of jobs for a worker whose process has *open_document* open,
+		or an empty list when the queue is closed and empty.
+		"""
+		with self._condition:
+			while not self._pending and not self._closing:
+				self._condition.wait()
+			if not self._pending: return []
+			document=open_document if open_document in self._pending else next(iter(self._pending))
+			jobs=self._pending[document]
+			# split the remaining jobs between the processes, but in batches of at most batch_size
+			count=max(1, min(self.batch_size, -(-self._pending_count//len(self._workers)), len(jobs)))
+			result=[jobs.popleft() for _ in range(count)]
+			if not jobs: del self._pending[document]
+			self._pending_count-=count
+			self._commands+=1
+			return result
+
+	def _finish(self, job: ExportJob, error: Optional[BaseException])->None:
+		if error is None: job.future.set_result(Path(job.filename))
+		else: job.future.set_exception(error)
+		with self._condition:
+			self._done+=1
+			if error is not None: self._failed+=1
+			if self._done==self._submitted:
+				self._end_time=time.perf_counter()
+				self._condition.notify_all()
+			if self.progress is not None: self.progress(job, self._done, self._submitted)
+
+	def _work(self)->None:
+		shell: Optional[InkscapeShell]=None
+		open_document: Optional[str]=None
+		state: dict[str, str]={}
+		try:
+			while True:
+				jobs=self._take(open_document)
+				if not jobs: break
+				actions=[]
+				if jobs[0].document!=open_document:
+					if open_document is not None: actions.append("file-close")
+					actions.append(f"file-open:{jobs[0].document}")
+					open_document=jobs[0].document
+				for job in jobs:
+					actions+=_job_actions(job, state)
+				old_mtimes=[_mtime(job.filename) for job in jobs]
+				try:
+					if shell is None:
+						shell=InkscapeShell(active_window=False, executable=self.executable).__enter__()
+					shell.send_command("; ".join(actions), timeout=self.timeout)
+				except Exception as e:
+					if shell is not None: shell.kill()
+					shell, open_document, state=None, None, {}
+					for job in jobs: self._finish(job, e)
+					continue
+				for job, old_mtime in zip(jobs, old_mtimes):
+					mtime=_mtime(job.filename)
+					self._finish(job, None if mtime is not None and mtime!=old_mtime else
+							RuntimeError(f"Inkscape did not write {job.filename}"))
+		finally:
+			if shell is not None: shell._stop_shell()
+
+	def wait(self)->ExportReport:
+		"""
+		Wait until all the submitted jobs are done, and return the report.
+		"""
+		with self._condition:
+			while self._done<self._submitted:
+				self._condition.wait()
+		return self.report()
+
+	def report(self)->ExportReport:
+		with self._condition:
+			start_time=self._start_time
+			end_time=self._end_time if self._done==self._submitted else time.perf_counter()
+			duration=0. if start_time is None or end_time is None else end_time-start_time
+			return ExportReport(self._done, self._failed, self._commands, len(self._workers), duration)
+
+	def close(self)->None:
+		"""
+		Wait until all the submitted jobs are done, then stop the processes and delete the temporary copies.
+		"""
+		with self._condition:
+			self._closing=True
+			self._condition.notify_all()
+		for worker in self._workers:
+			worker.join()
+		for path in self._copies.values():
+			Path(path).unlink(missing_ok=True)
+		self._copies.clear()
+
+	def __enter__(self)->ExportQueue:
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback)->None:
+		self.close()
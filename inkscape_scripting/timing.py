@@ -0,0 +1,116 @@
+"""
+Per-phase latency instrumentation of the extension runs.
+
+Usage::
+
+	from inkscape_scripting import timing
+	timing.enabled=True
+	with timing.span("load"):
+		...
+	timing.finish_cell()  # writes one line to timing.log_path if set
+
+In IPython, use the ``%inkstats`` magic instead.
+
+When disabled, :func:`span` returns a shared no-op context manager, so the overhead is a function call.
+"""
+from __future__	import annotations
+
+import collections
+import json
+import time
+from typing import Any, Optional
+
+enabled: bool=False
+
+log_path: Optional[str]=None
+"""
+If set, after each cell one JSON object is appended to this file, with the duration of each phase in seconds.
+"""
+
+window_size: int=1000
+"""
+Number of most recent durations kept for each phase.
+"""
+
+_durations: dict[str, collections.deque[float]]={}
+_current: dict[str, float]={}
+
+class _NullSpan:
+	def __enter__(self)->None: pass
+	def __exit__(self, exc_type, exc_value, traceback)->None: pass
+
+_null_span=_NullSpan()
+
+class _Span:
+	def __init__(self, name: str)->None:
+		self.name=name
+	def __enter__(self)->None:
+		self.start=time.perf_counter()
+	def __exit__(self, exc_type, exc_value, traceback)->None:
+		record(self.name, time.perf_counter()-self.start)
+
+def span(name: str)->Any:
+	"""
+	Return a context manager that measures the time spent inside as phase *name*.
+	"""
+	if not enabled: return _null_span
+	return _Span(name)
+
+def record(name: str, duration: float)->None:
+	"""
+	Record that phase *name* took *duration* seconds.
+	"""
+	if not enabled: return
+	try:
+		durations=_durations[name]
+	except KeyError:
+		durations=_durations[name]=collections.deque(maxlen=window_size)
+	durations.append(duration)
+	_current[name]=_current.get(name, 0.)+duration
+
+def finish_cell()->None:
+	"""
+	Mark the end of a cell: the durations recorded since the previous call are written to :data:`log_path`.
+	"""
+	if not _current: return
+	if log_path is not None:
+		with open(log_path, "a") as f:
+			f.write(json.dumps({"time": time.time(), "phases": _current})+"\n")
+	_current.clear()
+
+def reset()->None:
+	_durations.clear()
+	_current.clear()
+
+def _percentile(sorted_values: list[float], p: float)->float:
+	return sorted_values[min(len(sorted_values)-1, int(len(sorted_values)*p))]
+
+def _histogram(sorted_values: list[float], num_buckets: int=8, width: int=20)->str:
+	"""
+	Histogram with logarithmically spaced buckets, as a single line.
+	"""
+	lo, hi=max(sorted_values[0], 1e-6), max(sorted_values[-1], 1e-6)
+	ratio=(hi/lo)**(1/num_buckets) if hi>lo else 2.
+	counts=[0]*num_buckets
+	for value in sorted_values:
+		bucket=0
+		bound=lo*ratio
+		while value>bound and bucket<num_buckets-1:
+			bucket+=1
+			bound*=ratio
+		counts[bucket]+=1
+	blocks=" ▁▂▃▄▅▆▇█"
+	return "".join(blocks[round(c*(len(blocks)-1)/max(counts))] for c in counts)
+
+def summary()->str:
+	"""
+	Return a table with count, p50, p95 and a histogram of the durations of each phase.
+	"""
+	lines=[f"{'phase':<16}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}  histogram"]
+	for name, durations in _durations.items():
+		if not durations: continue
+		values=sorted(durations)
+		lines.append(f"{name:<16}{len(values):>7}"
+				f"{_percentile(values, .5)*1000:>10.2f}{_percentile(values, .95)*1000:>10.2f}{values[-1]*1000:>10.2f}"
+				f"  {_histogram(values)}")
+	return "\n".join(lines)
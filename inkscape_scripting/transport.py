@@ -0,0 +1,109 @@
+"""
+How the output document is transferred from the daemon to the client.
+
+The value sent over the connection is either
+
+* a bytes object, the document itself,
+* ``("zlib", compressed)``, the document compressed with zlib,
+* ``("file", path, length)``, the document was written to the file *path*
+  (by default in ``/dev/shm``, i.e. in memory), which the client copies to its stdout with ``os.sendfile``
+  and then deletes, or
+* ``("patch", ...)``, see :mod:`inkscape_scripting.patch`.
+
+On the wire, these values are encoded by :func:`.framing.encode_message`.
+
+This module is imported by the client, so it must not import anything expensive at top level (not even ``typing``).
+"""
+from __future__	import annotations
+
+import os
+
+TYPE_CHECKING=False
+if TYPE_CHECKING:
+	from typing import Any, BinaryIO, Optional
+
+mode: str="auto"
+"""
+One of ``"socket"``, ``"zlib"``, ``"file"``, or ``"auto"``
+(which means ``"file"`` for documents of at least :data:`file_threshold` bytes and ``"socket"`` otherwise).
+"""
+
+file_threshold: int=1<<20
+
+zlib_level: int=1
+
+file_directory: Optional[str]="/dev/shm" if os.path.isdir("/dev/shm") else None
+"""
+Directory of the files for the ``"file"`` mode. ``None`` means the default temporary directory.
+"""
+
+_last_files: dict[str, str]={}
+"""
+The file sent in the last run of each slot (daemon session). Normally the client deletes it,
+but if the client dies it is deleted at the next run of the same slot.
+"""
+
+def encode(data: bytes, slot: str="")->Any:
+	"""
+	Return the value to be sent to the client for document *data*. Used by the daemon.
+
+	Runs with different *slot* may be in progress at the same time.
+	"""
+	last_file=_last_files.pop(slot, None)
+	if last_file is not None:
+		try: os.unlink(last_file)
+		except FileNotFoundError: pass
+	chosen=mode
+	if chosen=="auto":
+		chosen="file" if len(data)>=file_threshold else "socket"
+	if chosen=="socket":
+		return data
+	if chosen=="zlib":
+		import zlib
+		return ("zlib", zlib.compress(data, zlib_level))
+	if chosen=="file":
+		import tempfile
+		fd, path=tempfile.mkstemp(prefix="inkscape_scripting_", suffix=".svg", dir=file_directory)
+		with open(fd, "wb") as f:
+			f.write(data)
+		_last_files[slot]=path
+		return ("file", path, len(data))
+	raise ValueError(f"Unknown transport mode: {mode}")
+
+def _copy_file(path: str, length: int, stream: BinaryIO)->None:
+	with open(path, "rb") as f:
+		stream.flush()
+		offset=0
+		try:
+			while offset<length:
+				sent=os.sendfile(stream.fileno(), f.fileno(), offset, length-offset)
+				if sent==0: break
+				offset+=sent
+		except (OSError, AttributeError, ValueError):
+			# sendfile is not supported for this kind of stream or platform
+			f.seek(offset)
+			while True:
+				chunk=f.read(1<<20)
+				if not chunk: break
+				stream.write(chunk)
+
+def write(message: Any, stream: BinaryIO)->None:
+	"""
+	Inverse of :func:`encode` (and :func:`.patch.make_output`): write the document to *stream*. Used by the client.
+	"""
+	if not isinstance(message, tuple):
+		stream.write(message)
+		return
+	tag=message[0]
+	if tag=="zlib":
+		import zlib
+		stream.write(zlib.decompress(message[1]))
+	elif tag=="file":
+		_, path, length=message
+		try:
+			_copy_file(path, length, stream)
+		finally:
+			os.unlink(path)
+	else:
+		from .patch import write_output
+		write_output(message, stream.write)
@@ -0,0 +1,183 @@
+"""
+Background warm-up of the daemon, so that the IPython prompt appears right away.
+
+Importing inkex, SimpInkScr and :mod:`inkscape_scripting.object_repr` (which builds an ``SvgToPythonScript``)
+takes a while, so :func:`start` does it in a background thread, together with :func:`.daemon.warm_up`.
+The names of ``from simpinkscr import *`` and ``from inkscape_scripting.ipython_export import *``
+are put into the IPython namespace before the first cell that is executed after the warm-up finishes.
+
+A cell that is executed before that only waits for the warm-up if it may need it,
+that is if it uses a name that is not defined yet, or imports one of :data:`.cell_classifier.document_modules`.
+"""
+from __future__	import annotations
+
+import ast
+import builtins
+import importlib
+import threading
+import time
+from typing import Any, Optional
+
+from . import cell_classifier
+
+modules: list[str]=["inkscape_scripting.daemon", "inkscape_scripting.object_repr", "inkscape_scripting.ipython_export"]
+"""
+Modules imported by the warm-up, in order. (The daemon imports lxml, inkex and SimpInkScr.)
+"""
+
+namespace_modules: list[str]=["simpinkscr", "inkscape_scripting.ipython_export"]
+"""
+Modules whose names are put into the IPython namespace, as with ``from ... import *``.
+"""
+
+startup_times: dict[str, float]={}
+"""
+Durations in seconds, measured from :func:`start` unless stated otherwise:
+``prompt`` (when :func:`mark_prompt` is called), ``warm-up`` (when the background thread finishes),
+``first cell`` (when the first cell finishes, including waiting), ``first cell wait`` (time the first cell waited),
+and ``import <module>`` (duration of each import).
+"""
+
+_start_time: Optional[float]=None
+_thread: Optional[threading.Thread]=None
+_finished=threading.Event()
+_error: Optional[BaseException]=None
+_names: dict[str, Any]={}
+_injected: bool=False
+_cell_start_time: Optional[float]=None
+_first_cell_wait: float=0.
+
+def _star_names(module: Any)->dict[str, Any]:
+	names=getattr(module, "__all__", None)
+	if names is None:
+		names=[name for name in vars(module) if not name.startswith("_")]
+	return {name: getattr(module, name) for name in names}
+
+def _run()->None:
+	global _error
+	try:
+		for module in modules:
+			import_start=time.perf_counter()
+			importlib.import_module(module)
+			startup_times[f"import {module}"]=time.perf_counter()-import_start
+		from . import daemon
+		daemon.warm_up()
+		names: dict[str, Any]={}
+		for module in namespace_modules:
+			names.update(_star_names(importlib.import_module(module)))
+		_names.update(names)
+	except BaseException as e:
+		_error=e
+	finally:
+		assert _start_time is not None
+		startup_times["warm-up"]=time.perf_counter()-_start_time
+		_finished.set()
+
+def start()->None:
+	"""
+	Start the warm-up in a background thread. Does nothing if it is already started.
+	"""
+	global _thread, _start_time
+	if _thread is not None: return
+	_start_time=time.perf_counter()
+	_thread=threading.Thread(target=_run, name="inkscape_scripting warm-up", daemon=True)
+	_thread.start()
+
+def mark_prompt()->None:
+	"""
+	Record the time to prompt. Called at the end of the IPython setup.
+	"""
+	if _start_time is not None:
+		startup_times["prompt"]=time.perf_counter()-_start_time
+
+def is_done()->bool:
+	"""
+	Return whether the warm-up finished successfully.
+	"""
+	return _finished.is_set() and _error is None
+
+def wait()->None:
+	"""
+	Block until the warm-up finishes. Raise an exception if it failed.
+	"""
+	start()
+	_finished.wait()
+	if _error is not None:
+		raise RuntimeError("Cannot load inkex or SimpInkScr") from _error
+
+def needs_warm_up(source: Optional[str], user_ns: dict)->bool:
+	"""
+	Return whether the cell with (transformed) source *source* may need the warm-up to be finished.
+
+	Examples::
+
+		>>> needs_warm_up("x=1\\nprint(x+1)", {})
+		False
+		>>> needs_warm_up("circle((0, 0), 5)", {})
+		True
+		>>> needs_warm_up("import inkex", {})
+		True
+	"""
+	if source is None: return False  # IPython will report the error
+	try:
+		tree=ast.parse(source)
+	except SyntaxError:
+		return False
+	bound: set[str]=set()
+	loaded: set[str]=set()
+	for node in ast.walk(tree):
+		if isinstance(node, ast.Name):
+			(loaded if isinstance(node.ctx, ast.Load) else bound).add(node.id)
+		elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+			bound.add(node.name)
+		elif isinstance(node, ast.arg):
+			bound.add(node.arg)
+		elif isinstance(node, ast.ExceptHandler) and node.name is not None:
+			bound.add(node.name)
+		elif isinstance(node, ast.Import):
+			if any(cell_classifier._in_document_modules(alias.name) for alias in node.names): return True
+			bound.update(alias.asname or alias.name.partition(".")[0] for alias in node.names)
+		elif isinstance(node, ast.ImportFrom):
+			if cell_classifier._in_document_modules(node.module): return True
+			bound.update(alias.asname or alias.name for alias in node.names)
+	# names bound in the cell itself are not looked up in the namespace (this ignores the order, which is fine)
+	return any(name not in user_ns and not hasattr(builtins, name) for name in loaded-bound)
+
+def namespace_names()->dict[str, Any]:
+	"""
+	Return the names that are put into the IPython namespace. Wait for the warm-up if needed.
+	"""
+	wait()
+	return dict(_names)
+
+def prepare_cell(source: Optional[str], ip: Any, force: bool=False)->None:
+	"""
+	Called before each cell: wait for the warm-up if needed (or if *force*),
+	and once it finished, put the names into the namespace of *ip* (the result of ``get_ipython()``)
+	and set up the pretty-printing.
+	"""
+	global _injected, _cell_start_time, _first_cell_wait
+	if _cell_start_time is None:
+		_cell_start_time=time.perf_counter()
+	if _injected: return
+	if not force and not _finished.is_set() and not needs_warm_up(source, ip.user_ns): return
+	wait_start=time.perf_counter()
+	wait()
+	_first_cell_wait+=time.perf_counter()-wait_start
+	for name, value in _names.items():
+		# the user may already have defined some of them
+		ip.user_ns.setdefault(name, value)
+	from .object_repr import formatter_setup
+	formatter_setup(ip)
+	_injected=True
+
+def cell_finished()->None:
+	"""
+	Called after each cell. Records the time to the first cell.
+	"""
+	if "first cell" in startup_times or _cell_start_time is None or _start_time is None: return
+	startup_times["first cell"]=time.perf_counter()-_start_time
+	startup_times["first cell wait"]=_first_cell_wait
+
+def summary()->str:
+	return "\n".join(f"{name:<40}{duration*1000:>10.1f}ms" for name, duration in startup_times.items())
@@ -0,0 +1,41 @@
+"""
+Running scripts on files without Inkscape, see :mod:`inkscape_scripting.batch`.
+"""
+from __future__	import annotations
+
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("inkex")
+pytest.importorskip("simpinkscr")
+
+from inkscape_scripting import batch
+
+_document=b'<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"><rect id="rect1"/></svg>'
+
+def test_run_script(tmp_path: Path)->None:
+	path=tmp_path/"drawing.svg"
+	path.write_bytes(_document)
+	output=batch.run_script("svg_root.set('width', '5')", path, path)
+	assert output is not None and b'width="5"' in output
+	assert path.read_bytes()==output
+
+def test_failing_script_leaves_input_untouched(tmp_path: Path)->None:
+	path=tmp_path/"drawing.svg"
+	path.write_bytes(_document)
+	with pytest.raises(ValueError):
+		batch.run_script("svg_root.set('width', '5')\nraise ValueError", path, path)
+	assert path.read_bytes()==_document
+
+def test_failing_job_in_place(tmp_path: Path)->None:
+	good, bad=tmp_path/"good.svg", tmp_path/"bad.svg"
+	good.write_bytes(_document)
+	bad_document=_document.replace(b"<svg ", b'<svg id="bad" ')
+	bad.write_bytes(bad_document)
+	script="svg_root.set('width', '5')\nif svg_root.get('id')=='bad': raise ValueError('bad document')"
+	results={Path(result.input).name: result for result in batch.run_batch(script, batch.in_place_jobs([good, bad]), processes=1)}
+	assert results["good.svg"].error is None
+	assert b'width="5"' in good.read_bytes()
+	assert "bad document" in (results["bad.svg"].error or "")
+	assert bad.read_bytes()==bad_document
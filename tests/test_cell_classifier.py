@@ -0,0 +1,96 @@
+"""
+Cells that must be classified correctly by :func:`inkscape_scripting.cell_classifier.cell_needs_document`.
+
+The objects of SimpInkScr are stood in for by a class that claims to be defined in its module,
+so that the tests run without inkex and SimpInkScr.
+"""
+from __future__	import annotations
+
+import collections
+import datetime
+import doctest
+import functools
+import math
+import sys
+import types
+
+import pytest
+
+from inkscape_scripting import cell_classifier
+from inkscape_scripting.cell_classifier import cell_needs_document
+
+class SimpleObject:
+	def translate(self, offset)->None: pass
+
+SimpleObject.__module__="simpinkscr.simple_inkscape_scripting"
+
+def circle(center, radius)->SimpleObject:
+	return SimpleObject()
+
+circle.__module__="simpinkscr.simple_inkscape_scripting"
+
+def _helper_module()->types.ModuleType:
+	"""
+	A helper module of the user, whose functions call SimpInkScr.
+	"""
+	module=types.ModuleType("mylib")
+	exec("def draw_grid():\n\tfor i in range(3): circle((i, 0), 1)\nclass Grid:\n\tpass", vars(module))
+	module.circle=circle  # type: ignore
+	return module
+
+mylib=_helper_module()
+
+def test_doctests()->None:
+	assert doctest.testmod(cell_classifier).failed==0
+
+@pytest.mark.parametrize("cell, user_ns", [
+	("print(1+1)", {}),
+	("import numpy as np\nnp.zeros(3)", {}),
+	("x=math.sqrt(2)", {"math": math}),
+	("f(3)", {"f": functools.partial(math.pow, 2)}),
+	("len(s)", {"s": "abc"}),
+	("d.isoformat()", {"d": datetime.date(2020, 1, 1)}),
+	("import json\njson.dumps([1])", {}),
+	("from collections import abc", {}),
+	("# inkscape: local\nshapes.append(1)", {"shapes": []}),
+	])
+def test_local(cell: str, user_ns: dict)->None:
+	assert not cell_needs_document(cell, user_ns)
+
+@pytest.mark.parametrize("cell, user_ns", [
+	("svg_root", {}),
+	("guides.append(1)", {}),
+	("svg_index.by_id('a')", {}),
+	("from simpinkscr import *", {}),
+	("import inkex", {}),
+	("circle((0, 0), 1)", {"circle": circle}),
+	("shapes.append(1)", {"shapes": []}),
+	("shapes[0].translate((1, 1))", {"shapes": collections.deque([SimpleObject()])}),
+	("shapes['a'].translate((1, 1))", {"shapes": collections.OrderedDict(a=SimpleObject())}),
+	("shapes['a'].translate((1, 1))", {"shapes": collections.defaultdict(list, a=SimpleObject())}),
+	("c((0, 0))", {"c": functools.partial(circle, radius=1)}),
+	("p(2)", {"p": functools.partial(math.pow, SimpleObject())}),
+	("move((1, 1))", {"move": SimpleObject().translate}),
+	("add(1)", {"add": [].append}),
+	("eval('svg_root')", {}),
+	("__builtins__.eval('svg_root')", {"__builtins__": __builtins__}),
+	("b.eval('svg_root')", {"b": __import__("builtins")}),
+	("sys.modules['__main__'].svg_root", {"sys": sys}),
+	("get_ipython().user_ns['svg_root']", {}),
+	("def f():\n\tglobal svg_root", {}),
+	("# inkscape: document\nprint(1)", {}),
+	("draw_grid()", {"draw_grid": mylib.draw_grid}),
+	("mylib.draw_grid()", {"mylib": mylib}),
+	("g=Grid()", {"Grid": mylib.Grid}),
+	("g", {"g": mylib.Grid()}),
+	("import mylib\nmylib.draw_grid()", {}),
+	("from mylib import draw_grid", {}),
+	("from . import helpers", {}),
+	])
+def test_document(cell: str, user_ns: dict)->None:
+	assert cell_needs_document(cell, user_ns)
+
+def test_numpy_arrays()->None:
+	np=pytest.importorskip("numpy")
+	assert not cell_needs_document("a.sum()", {"a": np.zeros(3)})
+	assert cell_needs_document("a[0].translate((1, 1))", {"a": np.array([SimpleObject()], dtype=object)})
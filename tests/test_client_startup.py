@@ -0,0 +1,26 @@
+"""
+The client is started by Inkscape for every run, so it must not import heavy modules,
+see ``benchmarks/bench_client_startup.py``.
+"""
+from __future__	import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.bench_client_startup import forbidden_modules
+
+_root=Path(__file__).resolve().parent.parent
+
+def test_client_imports()->None:
+	code=(
+			"import sys, json\n"
+			"before=set(sys.modules)\n"
+			"import inkscape_scripting.client\n"
+			"print(json.dumps(sorted(set(sys.modules)-before)))\n")
+	process=subprocess.run([sys.executable, "-c", code], stdout=subprocess.PIPE, check=True,
+			cwd=_root, env=dict(os.environ, PYTHONPATH=str(_root)))
+	imported={name.partition(".")[0] for name in json.loads(process.stdout)}
+	assert not imported & {*forbidden_modules, "IPython", "simpinkscr", "numpy"}
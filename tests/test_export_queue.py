@@ -0,0 +1,86 @@
+"""
+:class:`inkscape_scripting.shell.ExportQueue`, with the stand-in ``inkscape`` executable of the benchmark.
+"""
+from __future__	import annotations
+
+import ast
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("inkex")
+pytest.importorskip("simpinkscr")
+
+from benchmarks.bench_export_queue import _make_fake_inkscape
+from inkscape_scripting.shell import ExportQueue
+
+@pytest.fixture
+def executable(tmp_path: Path, monkeypatch)->str:
+	for name in ("STARTUP", "COMMAND", "EXPORT"):
+		monkeypatch.setenv(f"FAKE_INKSCAPE_{name}_DELAY", "0")
+	directory=tmp_path/"bin"
+	directory.mkdir()
+	return str(_make_fake_inkscape(directory))
+
+@pytest.fixture
+def document(tmp_path: Path)->Path:
+	path=tmp_path/"drawing.svg"
+	path.write_text('<svg xmlns="http://www.w3.org/2000/svg"><rect id="rect0"/><rect id="rect1"/></svg>')
+	return path
+
+def _options(path: Path)->dict[str, str]:
+	"""
+	The export options that the stand-in executable used for the file *path*.
+	"""
+	return dict(ast.literal_eval(path.read_text()))
+
+def test_order_and_options(executable: str, document: Path, tmp_path: Path)->None:
+	done: list[str]=[]
+	with ExportQueue(processes=1, batch_size=2, executable=executable,
+			progress=lambda job, count, total: done.append(Path(job.filename).name)) as queue:
+		futures=[
+				queue.export(document, tmp_path/"a.png", id="rect0", id_only=True, dpi=300),
+				queue.export(document, tmp_path/"b.png", id="rect1"),
+				queue.export(document, tmp_path/"c.pdf"),
+				]
+		report=queue.wait()
+	assert done==["a.png", "b.png", "c.pdf"]
+	assert [future.result() for future in futures]==[tmp_path/"a.png", tmp_path/"b.png", tmp_path/"c.pdf"]
+	a, b, c=(_options(tmp_path/name) for name in ("a.png", "b.png", "c.pdf"))
+	assert (a["export-id"], a["export-id-only"], a["export-dpi"], a["export-type"])==("rect0", "true", "300", "png")
+	# the options of the previous export are reset
+	assert (b["export-id"], b["export-id-only"], b["export-dpi"])==("rect1", "false", "96")
+	assert (c["export-id"], c["export-type"])==("", "pdf")
+	assert (report.jobs, report.failed, report.commands, report.processes)==(3, 0, 2, 1)
+	assert "3 exports (0 failed)" in str(report)
+
+def test_bytes_document(executable: str, document: Path, tmp_path: Path)->None:
+	with ExportQueue(processes=2, executable=executable) as queue:
+		futures=[queue.export(document.read_bytes(), tmp_path/f"{i}.png") for i in range(4)]
+	assert all(future.result().exists() for future in futures)
+	assert queue.report().failed==0
+
+def test_failures(executable: str, document: Path, tmp_path: Path)->None:
+	with ExportQueue(processes=2, executable=executable) as queue:
+		missing=queue.export(tmp_path/"missing.svg", tmp_path/"missing.png")
+		good=queue.export(document, tmp_path/"good.png")
+		report=queue.wait()
+	with pytest.raises(RuntimeError, match="did not write"):
+		missing.result()
+	assert good.result()==tmp_path/"good.png"
+	assert (report.jobs, report.failed)==(2, 1)
+	assert "2 exports (1 failed)" in str(report)
+
+def test_executable_fails(document: Path, tmp_path: Path)->None:
+	with ExportQueue(processes=1, executable=str(tmp_path/"no-such-inkscape")) as queue:
+		future=queue.export(document, tmp_path/"a.png")
+		report=queue.wait()
+	with pytest.raises(OSError):
+		future.result()
+	assert (report.jobs, report.failed)==(1, 1)
+
+def test_closed_queue(executable: str, document: Path, tmp_path: Path)->None:
+	queue=ExportQueue(executable=executable)
+	queue.close()
+	with pytest.raises(RuntimeError):
+		queue.export(document, tmp_path/"a.png")
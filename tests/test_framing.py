@@ -0,0 +1,56 @@
+"""
+The wire format of :mod:`inkscape_scripting.framing`.
+"""
+from __future__	import annotations
+
+import socket
+
+import pytest
+
+from inkscape_scripting import framing
+
+class _ClosingPeer:
+	"""
+	A socket whose peer closes the connection as soon as it has received a whole frame.
+	"""
+	def __init__(self)->None:
+		self.received=bytearray()
+
+	def sendall(self, data: bytes)->None:
+		header=self.received[:framing._header_size]
+		if len(header)==framing._header_size and len(self.received)==len(header)+int.from_bytes(header, "big"):
+			raise BrokenPipeError
+		self.received+=data
+
+def test_empty_trailing_part_is_not_sent()->None:
+	sock=_ClosingPeer()
+	framing.send_frame(sock, b"D", b"data", b"")  # type: ignore
+	assert sock.received==(5).to_bytes(8, "big")+b"Ddata"
+
+def test_empty_frame()->None:
+	sock=_ClosingPeer()
+	framing.send_frame(sock)  # type: ignore
+	assert sock.received==bytes(8)
+
+@pytest.mark.parametrize("message", [
+	b"",
+	b"<svg/>",
+	("zlib", b"x\x9c"),
+	("file", "/tmp/output.svg", 123),
+	("patch", "/tmp/input.svg", 10, [(0, 4), b"new", (7, 3), b""]),
+	])
+def test_message_round_trip(message)->None:
+	a, b=socket.socketpair()
+	with a, b:
+		framing.send_frame(a, *framing.encode_message(message))
+		decoded=framing.decode_message(framing.recv_frame(b))
+	if isinstance(message, bytes):
+		assert bytes(decoded)==message
+	elif message[0]=="zlib":
+		assert decoded[0]=="zlib" and bytes(decoded[1])==message[1]
+	else:
+		assert decoded==message
+
+def test_argv_round_trip()->None:
+	argv=["--id=rect1", "", "/tmp/drawing é.svg"]
+	assert framing.decode_argv(framing.encode_argv(argv))==argv
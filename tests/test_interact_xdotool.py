@@ -0,0 +1,45 @@
+"""
+Retrying of the actions on a cached window id in :mod:`inkscape_scripting.interact_xdotool`.
+"""
+from __future__	import annotations
+
+import subprocess
+
+import pytest
+
+from inkscape_scripting import interact_xdotool
+
+@pytest.fixture
+def windows(monkeypatch)->set[int]:
+	"""
+	The ids of the existing windows.
+	"""
+	result={2}
+	monkeypatch.setattr(interact_xdotool, "_window_id_cache", {"dialog": 1})
+	monkeypatch.setattr(interact_xdotool, "_window_exists", lambda win: win in result)
+	return result
+
+def _find()->int:
+	interact_xdotool._window_id_cache["dialog"]=2
+	return 2
+
+def _action(windows: set[int], sent: list[int], fail_after_sending: bool=False):
+	def action(win: int)->None:
+		if win not in windows: raise subprocess.CalledProcessError(1, "windowfocus")
+		sent.append(win)
+		if fail_after_sending: raise subprocess.CalledProcessError(1, "windowfocus %1")
+	return action
+
+def test_retry_on_stale_window(windows)->None:
+	sent: list[int]=[]
+	interact_xdotool._with_window("dialog", lambda: interact_xdotool._window_id_cache.get("dialog") or _find(), _action(windows, sent))
+	assert sent==[2]
+	assert interact_xdotool._window_id_cache=={"dialog": 2}
+
+def test_no_retry_after_keys_are_sent(windows)->None:
+	sent: list[int]=[]
+	interact_xdotool._window_id_cache["dialog"]=2
+	with pytest.raises(subprocess.CalledProcessError):
+		interact_xdotool._with_window("dialog", lambda: interact_xdotool._window_id_cache.get("dialog") or _find(),
+				_action(windows, sent, fail_after_sending=True))
+	assert sent==[2]
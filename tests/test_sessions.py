@@ -0,0 +1,32 @@
+"""
+Switching between the namespaces of the sessions with ``%inksession``.
+"""
+from __future__	import annotations
+
+import pytest
+
+pytest.importorskip("IPython")
+pytest.importorskip("inkex")
+pytest.importorskip("simpinkscr")
+
+from IPython.core.interactiveshell import InteractiveShell
+
+from inkscape_scripting import ipython
+
+@pytest.fixture(scope="module")
+def ip()->InteractiveShell:
+	shell=InteractiveShell.instance()
+	ipython.setup(shell)
+	return shell
+
+def test_new_session_namespace(ip)->None:
+	builtins=ip.user_ns["__builtins__"]
+	ip.run_cell("x=1", store_history=True)
+	ip.run_cell("%inksession test_other", store_history=True)
+	assert "x" not in ip.user_ns
+	assert ip.user_ns["__name__"]=="__main__"
+	assert ip.user_ns["__builtins__"] is builtins
+	ip.run_cell("class A: pass", store_history=True).raise_error()
+	assert ip.user_ns["A"].__module__=="__main__"
+	ip.run_cell("%inksession default", store_history=True)
+	assert ip.user_ns["x"]==1
@@ -0,0 +1,33 @@
+"""
+:class:`inkscape_scripting.shell.InkscapeShell`, with the stand-in ``inkscape`` executable of the export benchmark.
+"""
+from __future__	import annotations
+
+import asyncio
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+
+import pytest
+
+pytest.importorskip("inkex")
+pytest.importorskip("simpinkscr")
+
+from benchmarks.bench_export_queue import _make_fake_inkscape
+from inkscape_scripting import shell
+
+def test_send_command_async_pauses_in_calling_thread(tmp_path: Path, monkeypatch)->None:
+	for name in ("STARTUP", "COMMAND", "EXPORT"):
+		monkeypatch.setenv(f"FAKE_INKSCAPE_{name}_DELAY", "0")
+	pause_threads: list[threading.Thread]=[]
+	@contextmanager
+	def pause_extension_run():
+		pause_threads.append(threading.current_thread())
+		yield
+		pause_threads.append(threading.current_thread())
+	monkeypatch.setattr(shell, "pause_extension_run", pause_extension_run)
+	with shell.InkscapeShell(executable=str(_make_fake_inkscape(tmp_path))) as inkscape:
+		pause_threads.clear()
+		result=asyncio.run(inkscape.send_command_async(["file-close", "file-close"]))
+	assert result==["", ""]
+	assert pause_threads==[threading.main_thread()]*2
@@ -0,0 +1,34 @@
+"""
+Reuse of the processes of :class:`inkscape_scripting.shell.InkscapeShellPool`.
+"""
+from __future__	import annotations
+
+import pytest
+
+pytest.importorskip("inkex")
+pytest.importorskip("simpinkscr")
+
+from inkscape_scripting import daemon, shell
+
+class _FakeShell:
+	def __enter__(self)->_FakeShell:
+		return self
+
+	def is_healthy(self)->bool:
+		return True
+
+	def kill(self)->None: pass
+
+	def _stop_shell(self)->None: pass
+
+def test_reused_only_in_the_same_session(monkeypatch)->None:
+	monkeypatch.setattr(shell, "InkscapeShell", _FakeShell)
+	pool=shell.InkscapeShellPool(max_size=2, idle_timeout=None)
+	first, second=daemon.Session("first"), daemon.Session("second")
+	with pool.shell(first) as a: pass
+	with pool.shell(second) as b: pass
+	assert a is not b
+	with pool.shell(first) as c: pass
+	with pool.shell(second) as d: pass
+	assert (c, d)==(a, b)
+	pool.close()